@@ -16,7 +16,9 @@
 import time
 
 from tempest import clients
+from tempest.common import server_pool
 from tempest.common.utils import data_utils
+from tempest.common.utils import parallel
 from tempest import config
 from tempest import exceptions
 from tempest.openstack.common import excutils
@@ -57,6 +59,8 @@ class BaseComputeTest(tempest.test.BaseTestCase):
         cls.image_ssh_user = CONF.compute.image_ssh_user
         cls.image_ssh_password = CONF.compute.image_ssh_password
         cls.servers = []
+        cls.pooled_servers = []
+        cls.dirty_servers = set()
         cls.images = []
         cls.multi_user = cls.get_multi_user()
         cls.security_groups = []
@@ -141,23 +145,53 @@ class BaseComputeTest(tempest.test.BaseTestCase):
         return multi_user
 
     @classmethod
-    def clear_servers(cls):
-        for server in cls.servers:
-            try:
-                cls.servers_client.delete_server(server['id'])
-            except exceptions.NotFound:
-                # Something else already cleaned up the server, nothing to be
-                # worried about
-                pass
-            except Exception:
-                LOG.exception('Deleting server %s failed' % server['id'])
+    def _delete_server(cls, server_id):
+        try:
+            cls.servers_client.delete_server(server_id)
+        except exceptions.NotFound:
+            # Something else already cleaned up the server, nothing to be
+            # worried about
+            return
+        cls.servers_client.wait_for_server_termination(server_id)
 
+    @classmethod
+    def _schedule_servers(cls, scheduler, level=0):
         for server in cls.servers:
-            try:
-                cls.servers_client.wait_for_server_termination(server['id'])
-            except Exception:
-                LOG.exception('Waiting for deletion of server %s failed'
-                              % server['id'])
+            scheduler.add(level, 'server %s' % server['id'],
+                          cls._delete_server, server['id'])
+
+    @classmethod
+    def _schedule_images(cls, scheduler, level=0):
+        for image_id in cls.images:
+            scheduler.add(level, 'image %s' % image_id,
+                          cls.images_client.delete_image, image_id)
+
+    @classmethod
+    def _schedule_security_groups(cls, scheduler, level=0):
+        for sg in cls.security_groups:
+            scheduler.add(level, 'security group %s' % sg['id'],
+                          cls.security_groups_client.delete_security_group,
+                          sg['id'])
+
+    @classmethod
+    def _schedule_server_groups(cls, scheduler, level=0):
+        for server_group_id in cls.server_groups:
+            scheduler.add(level, 'server-group %s' % server_group_id,
+                          cls.servers_client.delete_server_group,
+                          server_group_id)
+
+    @staticmethod
+    def _run_teardown(scheduler):
+        for outcome in scheduler.run():
+            if outcome.error is not None:
+                LOG.error('Deleting %s failed: %s' % (outcome.name,
+                                                      outcome.error))
+
+    @classmethod
+    def clear_servers(cls):
+        scheduler = parallel.TeardownScheduler()
+        cls._schedule_servers(scheduler)
+        cls._run_teardown(scheduler)
 
     @classmethod
     def server_check_teardown(cls):
@@ -174,6 +208,7 @@ class BaseComputeTest(tempest.test.BaseTestCase):
                                                           'ACTIVE')
             except Exception as exc:
                 LOG.exception(exc)
+                cls.mark_server_dirty(cls.server_id)
                 cls.servers_client.delete_server(cls.server_id)
                 cls.servers_client.wait_for_server_termination(cls.server_id)
                 cls.server_id = None
@@ -181,47 +216,40 @@ class BaseComputeTest(tempest.test.BaseTestCase):
 
     @classmethod
     def clear_images(cls):
-        for image_id in cls.images:
-            try:
-                cls.images_client.delete_image(image_id)
-            except exceptions.NotFound:
-                # The image may have already been deleted which is OK.
-                pass
-            except Exception:
-                LOG.exception('Exception raised deleting image %s' % image_id)
+        scheduler = parallel.TeardownScheduler()
+        cls._schedule_images(scheduler)
+        cls._run_teardown(scheduler)
 
     @classmethod
     def clear_security_groups(cls):
-        for sg in cls.security_groups:
-            try:
-                resp, body =\
-                    cls.security_groups_client.delete_security_group(sg['id'])
-            except exceptions.NotFound:
-                # The security group may have already been deleted which is OK.
-                pass
-            except Exception as exc:
-                LOG.info('Exception raised deleting security group %s',
-                         sg['id'])
-                LOG.exception(exc)
+        scheduler = parallel.TeardownScheduler()
+        cls._schedule_security_groups(scheduler)
+        cls._run_teardown(scheduler)
 
     @classmethod
     def clear_server_groups(cls):
-        for server_group_id in cls.server_groups:
-            try:
-                cls.client.delete_server_group(server_group_id)
-            except exceptions.NotFound:
-                # The server-group may have already been deleted which is OK.
-                pass
-            except Exception:
-                LOG.exception('Exception raised deleting server-group %s',
-                              server_group_id)
+        scheduler = parallel.TeardownScheduler()
+        cls._schedule_server_groups(scheduler)
+        cls._run_teardown(scheduler)
+
+    @classmethod
+    def release_pooled_servers(cls):
+        broker = server_pool.get_broker()
+        while cls.pooled_servers:
+            server_id = cls.pooled_servers.pop()
+            broker.release(server_id, dirty=server_id in cls.dirty_servers)
 
     @classmethod
     def resource_cleanup(cls):
-        cls.clear_images()
-        cls.clear_servers()
-        cls.clear_security_groups()
-        cls.clear_server_groups()
+        cls.release_pooled_servers()
+        # Servers and images are deleted concurrently first, security groups
+        # and server groups can only go once the servers using them are gone
+        scheduler = parallel.TeardownScheduler()
+        cls._schedule_images(scheduler, level=0)
+        cls._schedule_servers(scheduler, level=0)
+        cls._schedule_security_groups(scheduler, level=1)
+        cls._schedule_server_groups(scheduler, level=1)
+        cls._run_teardown(scheduler)
         super(BaseComputeTest, cls).resource_cleanup()
 
     @classmethod
@@ -263,6 +291,42 @@ class BaseComputeTest(tempest.test.BaseTestCase):
 
         return resp, body
 
+    @classmethod
+    def _server_pool_usable(cls):
+        # The pool is per tenant, isolated tenants don't outlive the class
+        return not (CONF.compute.allow_tenant_isolation or
+                    cls.force_tenant_isolation)
+
+    @classmethod
+    def get_pooled_server(cls, image_id=None, flavor=None, network=None):
+        """Returns an ACTIVE server for tests only querying it.
+
+        When the server pool is enabled the server comes from it and is
+        given back at class teardown, tests changing more than its metadata
+        must call mark_server_dirty. Otherwise a test server is created.
+        """
+        image_id = image_id or cls.image_ref
+        flavor = flavor or cls.flavor_ref
+        broker = server_pool.get_broker()
+        if broker is None or not cls._server_pool_usable():
+            kwargs = {}
+            if network is not None:
+                kwargs['networks'] = [{'uuid': network}]
+            resp, server = cls.create_test_server(image_id=image_id,
+                                                  flavor=flavor,
+                                                  wait_until='ACTIVE',
+                                                  **kwargs)
+            return server
+        server = broker.acquire(cls.servers_client, image_id, flavor,
+                                network)
+        cls.pooled_servers.append(server['id'])
+        return server
+
+    @classmethod
+    def mark_server_dirty(cls, server_id):
+        """Deletes the pooled server on release instead of recycling it."""
+        cls.dirty_servers.add(server_id)
+
     @classmethod
     def create_security_group(cls, name=None, description=None):
         if name is None:
@@ -385,6 +449,7 @@ class BaseV3ComputeTest(BaseComputeTest):
 
 class BaseComputeAdminTest(BaseComputeTest):
     """Base test case class for Compute Admin API tests."""
+    credential_types = ['primary', 'admin']
     _interface = "json"
 
     @classmethod
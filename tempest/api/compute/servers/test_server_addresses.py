@@ -29,7 +29,7 @@ class ServerAddressesTestJSON(base.BaseV2ComputeTest):
         super(ServerAddressesTestJSON, cls).resource_setup()
         cls.client = cls.servers_client
 
-        resp, cls.server = cls.create_test_server(wait_until='ACTIVE')
+        cls.server = cls.get_pooled_server()
 
     @test.skip_because(bug="1210483",
                        condition=CONF.service_available.neutron)
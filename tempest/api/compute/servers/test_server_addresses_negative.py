@@ -26,7 +26,7 @@ class ServerAddressesNegativeTestJSON(base.BaseV2ComputeTest):
         super(ServerAddressesNegativeTestJSON, cls).resource_setup()
         cls.client = cls.servers_client
 
-        resp, cls.server = cls.create_test_server(wait_until='ACTIVE')
+        cls.server = cls.get_pooled_server()
 
     @test.attr(type=['negative', 'gate'])
     @test.services('network')
@@ -29,6 +29,7 @@ CONF = config.CONF
 
 
 class ServersNegativeTestJSON(base.BaseV2ComputeTest):
+    credential_types = ['primary', 'alt']
 
     def setUp(self):
         super(ServersNegativeTestJSON, self).setUp()
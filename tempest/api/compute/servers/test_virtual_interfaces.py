@@ -30,8 +30,7 @@ class VirtualInterfacesTestJSON(base.BaseV2ComputeTest):
         cls.set_network_resources(network=True, subnet=True)
         super(VirtualInterfacesTestJSON, cls).resource_setup()
         cls.client = cls.servers_client
-        resp, server = cls.create_test_server(wait_until='ACTIVE')
-        cls.server_id = server['id']
+        cls.server_id = cls.get_pooled_server()['id']
 
     @test.skip_because(bug="1183436",
                        condition=CONF.service_available.neutron)
@@ -29,6 +29,8 @@ LOG = logging.getLogger(__name__)
 
 
 class AuthorizationTestJSON(base.BaseV2ComputeTest):
+    credential_types = ['primary', 'alt']
+
     @classmethod
     def resource_setup(cls):
         if not CONF.service_available.glance:
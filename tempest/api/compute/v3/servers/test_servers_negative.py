@@ -29,6 +29,7 @@ CONF = config.CONF
 
 
 class ServersNegativeV3Test(base.BaseV3ComputeTest):
+    credential_types = ['primary', 'alt']
 
     def setUp(self):
         super(ServersNegativeV3Test, self).setUp()
@@ -15,7 +15,7 @@
 import cStringIO as StringIO
 
 from tempest import clients
-from tempest.common import isolated_creds
+from tempest.common import account_pool
 from tempest.common.utils import data_utils
 from tempest import config
 from tempest import exceptions
@@ -36,12 +36,13 @@ class BaseImageTest(tempest.test.BaseTestCase):
         super(BaseImageTest, cls).resource_setup()
         cls.created_images = []
         cls._interface = 'json'
-        cls.isolated_creds = isolated_creds.IsolatedCreds(
+        cls.isolated_creds = account_pool.get_isolated_creds(
             cls.__name__, network_resources=cls.network_resources)
         if not CONF.service_available.glance:
             skip_msg = ("%s skipped as glance is not available" % cls.__name__)
             raise cls.skipException(skip_msg)
         if CONF.compute.allow_tenant_isolation:
+            cls.isolated_creds.prepare_credentials(cls.credential_types)
             cls.os = clients.Manager(cls.isolated_creds.get_primary_creds())
         else:
             cls.os = clients.Manager()
@@ -88,6 +89,8 @@ class BaseV1ImageTest(BaseImageTest):
 
 
 class BaseV1ImageMembersTest(BaseV1ImageTest):
+    credential_types = ['primary', 'alt']
+
     @classmethod
     def resource_setup(cls):
         super(BaseV1ImageMembersTest, cls).resource_setup()
@@ -122,6 +125,7 @@ class BaseV2ImageTest(BaseImageTest):
 
 
 class BaseV2MemberImageTest(BaseV2ImageTest):
+    credential_types = ['primary', 'alt']
 
     @classmethod
     def resource_setup(cls):
@@ -22,6 +22,7 @@ CONF = config.CONF
 
 
 class FloatingIPAdminTestJSON(base.BaseAdminNetworkTest):
+    credential_types = ['primary', 'admin', 'alt']
     _interface = 'json'
     force_tenant_isolation = True
 
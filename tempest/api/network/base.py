@@ -17,6 +17,7 @@ import netaddr
 
 from tempest import clients
 from tempest.common.utils import data_utils
+from tempest.common.utils import parallel
 from tempest import config
 from tempest import exceptions
 from tempest.openstack.common import log as logging
@@ -88,56 +89,46 @@ class BaseNetworkTest(tempest.test.BaseTestCase):
     @classmethod
     def resource_cleanup(cls):
         if CONF.service_available.neutron:
-            # Clean up ipsec policies
-            for ipsecpolicy in cls.ipsecpolicies:
-                cls.client.delete_ipsecpolicy(ipsecpolicy['id'])
-            # Clean up firewall policies
-            for fw_policy in cls.fw_policies:
-                cls.client.delete_firewall_policy(fw_policy['id'])
-            # Clean up firewall rules
-            for fw_rule in cls.fw_rules:
-                cls.client.delete_firewall_rule(fw_rule['id'])
-            # Clean up ike policies
-            for ikepolicy in cls.ikepolicies:
-                cls.client.delete_ikepolicy(ikepolicy['id'])
-            # Clean up vpn services
-            for vpnservice in cls.vpnservices:
-                cls.client.delete_vpnservice(vpnservice['id'])
-            # Clean up floating IPs
-            for floating_ip in cls.floating_ips:
-                cls.client.delete_floatingip(floating_ip['id'])
-            # Clean up routers
-            for router in cls.routers:
-                cls.delete_router(router)
-
-            # Clean up health monitors
-            for health_monitor in cls.health_monitors:
-                cls.client.delete_health_monitor(health_monitor['id'])
-            # Clean up members
-            for member in cls.members:
-                cls.client.delete_member(member['id'])
-            # Clean up vips
-            for vip in cls.vips:
-                cls.client.delete_vip(vip['id'])
-            # Clean up pools
-            for pool in cls.pools:
-                cls.client.delete_pool(pool['id'])
-            # Clean up metering label rules
-            for metering_label_rule in cls.metering_label_rules:
-                cls.admin_client.delete_metering_label_rule(
-                    metering_label_rule['id'])
-            # Clean up metering labels
-            for metering_label in cls.metering_labels:
-                cls.admin_client.delete_metering_label(metering_label['id'])
-            # Clean up ports
-            for port in cls.ports:
-                cls.client.delete_port(port['id'])
-            # Clean up subnets
-            for subnet in cls.subnets:
-                cls.client.delete_subnet(subnet['id'])
-            # Clean up networks
-            for network in cls.networks:
-                cls.client.delete_network(network['id'])
+            # Resources are deleted level by level, every level only holds
+            # resources whose dependencies were removed by the previous ones
+            scheduler = parallel.TeardownScheduler()
+            resources = [
+                (0, 'ipsecpolicy', cls.ipsecpolicies,
+                 cls.client.delete_ipsecpolicy),
+                (0, 'firewall policy', cls.fw_policies,
+                 cls.client.delete_firewall_policy),
+                (0, 'ikepolicy', cls.ikepolicies,
+                 cls.client.delete_ikepolicy),
+                (0, 'vpnservice', cls.vpnservices,
+                 cls.client.delete_vpnservice),
+                (0, 'floating IP', cls.floating_ips,
+                 cls.client.delete_floatingip),
+                (0, 'health monitor', cls.health_monitors,
+                 cls.client.delete_health_monitor),
+                (0, 'member', cls.members, cls.client.delete_member),
+                (0, 'vip', cls.vips, cls.client.delete_vip),
+                # admin_client only exists in the admin test classes
+                (0, 'metering label rule', cls.metering_label_rules,
+                 lambda rule_id: cls.admin_client.delete_metering_label_rule(
+                     rule_id)),
+                # firewall rules are still in use until their policy is gone
+                (1, 'firewall rule', cls.fw_rules,
+                 cls.client.delete_firewall_rule),
+                # routers still hold floating IPs and vpn services
+                (1, 'router', cls.routers, cls._delete_router_by_id),
+                (1, 'pool', cls.pools, cls.client.delete_pool),
+                (1, 'metering label', cls.metering_labels,
+                 lambda label_id: cls.admin_client.delete_metering_label(
+                     label_id)),
+                (2, 'port', cls.ports, cls.client.delete_port),
+                (3, 'subnet', cls.subnets, cls.client.delete_subnet),
+                (4, 'network', cls.networks, cls.client.delete_network),
+            ]
+            for level, kind, items, delete in resources:
+                for item in items:
+                    scheduler.add(level, '%s %s' % (kind, item['id']),
+                                  delete, item['id'])
+            scheduler.run(raise_on_error=True)
             cls.clear_isolated_creds()
         super(BaseNetworkTest, cls).resource_cleanup()
 
@@ -345,12 +336,16 @@ class BaseNetworkTest(tempest.test.BaseTestCase):
 
     @classmethod
     def delete_router(cls, router):
-        resp, body = cls.client.list_router_interfaces(router['id'])
+        cls._delete_router_by_id(router['id'])
+
+    @classmethod
+    def _delete_router_by_id(cls, router_id):
+        resp, body = cls.client.list_router_interfaces(router_id)
         interfaces = body['ports']
         for i in interfaces:
             cls.client.remove_router_interface_with_subnet_id(
-                router['id'], i['fixed_ips'][0]['subnet_id'])
-        cls.client.delete_router(router['id'])
+                router_id, i['fixed_ips'][0]['subnet_id'])
+        cls.client.delete_router(router_id)
 
     @classmethod
     def create_ipsecpolicy(cls, name):
@@ -362,6 +357,7 @@ class BaseNetworkTest(tempest.test.BaseTestCase):
 
 
 class BaseAdminNetworkTest(BaseNetworkTest):
+    credential_types = ['primary', 'admin']
 
     @classmethod
     def resource_setup(cls):
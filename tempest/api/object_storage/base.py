@@ -16,8 +16,8 @@
 
 from tempest.api.identity import base
 from tempest import clients
+from tempest.common import account_pool
 from tempest.common import custom_matchers
-from tempest.common import isolated_creds
 from tempest import config
 from tempest import exceptions
 import tempest.test
@@ -26,6 +26,7 @@ CONF = config.CONF
 
 
 class BaseObjectTest(tempest.test.BaseTestCase):
+    credential_types = ['primary', 'admin', 'alt']
 
     @classmethod
     def resource_setup(cls):
@@ -34,9 +35,10 @@ class BaseObjectTest(tempest.test.BaseTestCase):
         if not CONF.service_available.swift:
             skip_msg = ("%s skipped as swift is not available" % cls.__name__)
             raise cls.skipException(skip_msg)
-        cls.isolated_creds = isolated_creds.IsolatedCreds(
+        cls.isolated_creds = account_pool.get_isolated_creds(
             cls.__name__, network_resources=cls.network_resources)
         if CONF.compute.allow_tenant_isolation:
+            cls.isolated_creds.prepare_credentials(cls.credential_types)
             # Get isolated creds for normal user
             cls.os = clients.Manager(cls.isolated_creds.get_primary_creds())
             # Get isolated creds for admin user
@@ -151,6 +151,8 @@ class BaseVolumeV1Test(BaseVolumeTest):
 
 class BaseVolumeAdminTest(BaseVolumeTest):
     """Base test case class for all Volume Admin API tests."""
+    credential_types = ['primary', 'admin']
+
     @classmethod
     def resource_setup(cls):
         super(BaseVolumeAdminTest, cls).resource_setup()
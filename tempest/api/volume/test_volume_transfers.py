@@ -24,6 +24,7 @@ CONF = config.CONF
 
 
 class VolumesV2TransfersTest(base.BaseVolumeTest):
+    credential_types = ['primary', 'alt', 'admin']
 
     @classmethod
     def resource_setup(cls):
@@ -0,0 +1,282 @@
+# Copyright 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Fill and scrub the credential pool
+
+Keeps --size user and --admin-size admin credential sets in the directory
+set by credential_pool_dir in the [auth] section of tempest.conf. Tests
+running with tenant isolation take their credentials from there instead of
+creating them, and give them back once done. The sets given back are
+scrubbed and handed out again: the resources created in their tenant are
+deleted, except the network resources of the set, the user and tenant are
+renamed and enabled again, the user password and roles are restored and
+the quotas of the tenant are reset to the defaults. Other changes (e.g. the
+user email or the roles on other tenants) are not undone, tests making them
+must not take their credentials from the pool.
+
+Run it in the background for the whole test run. With --once it fills the
+pool before the run and exits, the sets used during the run are then not
+scrubbed and the test classes create their own credentials once the pool is
+exhausted. --drain deletes the sets not in use.
+"""
+
+import argparse
+import sys
+import time
+
+from tempest import auth
+from tempest import clients
+from tempest.cmd import cleanup_service
+from tempest.common import account_pool
+from tempest.common import isolated_creds
+from tempest.common.utils import parallel
+from tempest import config
+from tempest import exceptions
+from tempest.openstack.common import log as logging
+
+CONF = config.CONF
+LOG = logging.getLogger(__name__)
+
+CREDENTIAL_ATTRIBUTES = ('username', 'user_id', 'tenant_name', 'tenant_id',
+                         'password')
+
+
+class PoolManager(object):
+
+    def __init__(self, pool, size, admin_size,
+                 workers=parallel.DEFAULT_WORKERS):
+        self.pool = pool
+        self.sizes = {False: size, True: admin_size}
+        self.workers = workers
+        self.creator = isolated_creds.IsolatedCreds('account-pool')
+        self.admin_manager = clients.AdminManager(interface='json')
+        self.with_network = (CONF.service_available.neutron and
+                             not CONF.baremetal.driver_enabled)
+        cleanup_service.init_conf()
+        self.tenant_services = cleanup_service.get_tenant_cleanup_services()
+
+    def _create(self, admin):
+        creds = self.creator._create_creds(admin=admin)
+        _, roles = self.creator.identity_admin_client.list_user_roles(
+            creds.tenant_id, creds.user_id)
+        entry = {'admin': admin,
+                 'credentials': dict((attr, getattr(creds, attr))
+                                     for attr in CREDENTIAL_ATTRIBUTES),
+                 'roles': [role['id'] for role in roles]}
+        if self.with_network:
+            try:
+                entry['network'], entry['subnet'], entry['router'] = (
+                    self.creator._create_network_resources(creds.tenant_id))
+            except Exception:
+                self._delete(entry)
+                raise
+        return self.pool.add(entry)
+
+    def _delete(self, entry):
+        creator = self.creator
+        network = entry.get('network')
+        subnet = entry.get('subnet')
+        router = entry.get('router')
+        if router:
+            try:
+                creator.network_admin_client.\
+                    remove_router_interface_with_subnet_id(router['id'],
+                                                           subnet['id'])
+            except exceptions.NotFound:
+                pass
+            creator._clear_isolated_router(router['id'], router['name'])
+        if subnet:
+            creator._clear_isolated_subnet(subnet['id'], subnet['name'],
+                                           subnet.get('cidr'))
+        if network:
+            creator._clear_isolated_network(network['id'], network['name'])
+        credentials = entry['credentials']
+        for delete, resource_id in (
+                (creator._delete_user, credentials['user_id']),
+                (creator._delete_tenant, credentials['tenant_id'])):
+            try:
+                delete(resource_id)
+            except exceptions.NotFound:
+                pass
+
+    def _preserved_ids(self, entry):
+        """Ids of the resources of the set itself, kept by the scrub."""
+        resources = [entry.get(key) for key in ('network', 'subnet',
+                                                'router')]
+        preserved = set(resource['id'] for resource in resources
+                        if resource)
+        if entry.get('network'):
+            # the router interface and the DHCP ports of the set network
+            _, body = self.creator.network_admin_client.list_ports(
+                network_id=entry['network']['id'])
+            preserved.update(port['id'] for port in body['ports']
+                             if port['device_owner'].startswith('network:'))
+        return frozenset(preserved)
+
+    def _reset_identity(self, entry):
+        """Undo the changes of the tests to the user and tenant."""
+        client = self.creator.identity_admin_client
+        credentials = entry['credentials']
+        tenant_id = credentials['tenant_id']
+        user_id = credentials['user_id']
+        client.update_tenant(tenant_id, name=credentials['tenant_name'],
+                             enabled=True)
+        client.update_user(user_id, name=credentials['username'],
+                           enabled=True)
+        client.update_user_password(user_id, credentials['password'])
+        if 'roles' not in entry:
+            return
+        _, roles = client.list_user_roles(tenant_id, user_id)
+        role_ids = set(role['id'] for role in roles)
+        for role_id in role_ids - set(entry['roles']):
+            client.remove_user_role(tenant_id, user_id, role_id)
+        for role_id in set(entry['roles']) - role_ids:
+            client.assign_user_role(tenant_id, user_id, role_id)
+
+    def _reset_quotas(self, entry):
+        tenant_id = entry['credentials']['tenant_id']
+        if CONF.service_available.nova:
+            self.admin_manager.quotas_client.delete_quota_set(tenant_id)
+        if CONF.service_available.cinder:
+            self.admin_manager.volume_quotas_client.delete_quota_set(
+                tenant_id)
+        if CONF.service_available.neutron:
+            self.creator.network_admin_client.reset_quotas(tenant_id)
+
+    def _scrub(self, entry):
+        # NOTE: the user could be disabled or its password changed, its
+        # credentials are needed to list its resources
+        self._reset_identity(entry)
+        self._reset_quotas(entry)
+        credentials = entry['credentials']
+        manager = clients.Manager(credentials=auth.get_credentials(
+            fill_in=False, **credentials))
+        kwargs = {'data': None,
+                  'is_dry_run': False,
+                  'saved_state_json': None,
+                  'is_preserve': True,
+                  'is_save_state': False,
+                  'tenant_id': credentials['tenant_id'],
+                  'preserved_ids': self._preserved_ids(entry)}
+        cleanup_service.run_services(self.tenant_services, manager, **kwargs)
+
+    def _scrub_and_recycle(self, entry_id):
+        self._scrub(self.pool.load(entry_id))
+        self.pool.recycle(entry_id)
+
+    def _scrub_and_delete(self, entry_id):
+        entry = self.pool.load(entry_id)
+        if self.pool.is_used(entry_id):
+            self._scrub(entry)
+        self._delete(entry)
+        self.pool.remove(entry_id)
+
+    def _run(self, calls):
+        outcomes = parallel.run_concurrently(calls, workers=self.workers)
+        for outcome in outcomes:
+            if outcome.error is not None:
+                LOG.error("Failed to %s: %s" % (outcome.name, outcome.error))
+        return len([o for o in outcomes if o.error is None])
+
+    def fill(self):
+        """Create the sets missing in the pool, return how many were."""
+        calls = []
+        for admin, size in self.sizes.items():
+            missing = size - len(self.pool.entries(admin=admin))
+            name = 'create %s credentials' % (
+                account_pool.credential_kind(admin))
+            calls.extend((name, self._create, (admin,), None)
+                         for _ in range(missing))
+        return self._run(calls)
+
+    def scrub(self):
+        """Scrub the sets given back, return how many were recycled."""
+        entry_ids = self.pool.claim_used()
+        recycled = self._run([('scrub %s' % entry_id,
+                               self._scrub_and_recycle, (entry_id,), None)
+                              for entry_id in entry_ids])
+        # the sets failing to be scrubbed are unlocked, still used, and
+        # scrubbed again next time
+        for entry_id in entry_ids:
+            self.pool.release(entry_id)
+        return recycled
+
+    def drain(self):
+        """Delete the sets not in use, return how many were."""
+        entry_ids = [entry_id for entry_id in self.pool.entries()
+                     if self.pool.lock(entry_id)]
+        deleted = self._run([('delete %s' % entry_id,
+                              self._scrub_and_delete, (entry_id,), None)
+                             for entry_id in entry_ids])
+        for entry_id in entry_ids:
+            self.pool.release(entry_id)
+        return deleted
+
+    def run(self, interval, once=False):
+        while True:
+            recycled = self.scrub()
+            created = self.fill()
+            if recycled or created:
+                LOG.info("Credential pool: %s sets recycled, %s created" %
+                         (recycled, created))
+            if once:
+                return
+            time.sleep(interval)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Fill and scrub the credential pool')
+    parser.add_argument('--size', type=int, default=10,
+                        help="Number of user credential sets to keep")
+    parser.add_argument('--admin-size', type=int, default=0,
+                        help="Number of admin credential sets to keep")
+    parser.add_argument('--workers', type=int,
+                        default=parallel.DEFAULT_WORKERS,
+                        help="Number of sets created or scrubbed at the "
+                             "same time")
+    parser.add_argument('--interval', type=int, default=5,
+                        help="Seconds between two scrub and fill rounds")
+    parser.add_argument('--once', action='store_true',
+                        help="Scrub and fill the pool once and exit")
+    parser.add_argument('--drain', action='store_true',
+                        help="Delete the credential sets not in use and exit")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if not CONF.auth.credential_pool_dir:
+        LOG.error("credential_pool_dir is not set in the [auth] section")
+        return 1
+    pool = account_pool.CredentialPool(CONF.auth.credential_pool_dir)
+    if not (args.drain or args.once) and not pool.hold_daemon_lock():
+        LOG.error("tempest-account-pool is already running on %s" %
+                  CONF.auth.credential_pool_dir)
+        return 1
+    manager = PoolManager(pool, args.size, args.admin_size, args.workers)
+    if args.drain:
+        LOG.info("Deleted %s credential sets" % manager.drain())
+    else:
+        manager.run(args.interval, once=args.once)
+    return 0
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        sys.exit(0)
@@ -49,20 +49,40 @@ found in saved_state.json and based on the
 By default the tempest and alternate tempest users and tenants are not
 deleted and the admin user specified in tempest.conf is never deleted.
 
+Object types are cleaned up following their dependencies (e.g. ports
+before subnets before networks), independent types concurrently.
+--workers sets how many tenants are cleaned up at the same time and
+--delete-concurrency limits how many objects of the same type are deleted
+at the same time. Servers are waited for until they are terminated.
+Deletions failing because of a dependency are retried a few times once
+everything else ran.
+
+Planned and completed deletions are appended to cleanup_journal.json and
+the deletion rate per object type is logged every --progress-interval
+seconds. If cleanup is interrupted, the next run skips the listing of the
+object types it had fully listed and only deletes what is still pending.
+The journal is removed once a cleanup completes, --ignore-journal starts
+over regardless.
+
 Please run with --help to see full list of options.
 """
 import argparse
 import json
+import os
 import sys
+import threading
 
 from tempest import auth
 from tempest import clients
+from tempest.cmd import cleanup_journal
 from tempest.cmd import cleanup_service
+from tempest.common.utils import parallel
 from tempest import config
 from tempest.openstack.common import log as logging
 
 SAVED_STATE_JSON = "saved_state.json"
 DRY_RUN_JSON = "dry_run.json"
+JOURNAL_JSON = "cleanup_journal.json"
 LOG = logging.getLogger(__name__)
 CONF = config.CONF
 
@@ -81,6 +101,10 @@ class Cleanup(object):
         self._init_admin_ids()
 
         self.admin_role_added = []
+        self.journal = None
+        self.progress = None
+        # Protects the data shared by the tenant workers
+        self._lock = threading.Lock()
 
         # available services
         self.tenant_services = cleanup_service.get_tenant_cleanup_services()
@@ -105,6 +129,13 @@ class Cleanup(object):
         if is_dry_run:
             self.dry_run_data["_tenants_to_clean"] = {}
             f = open(DRY_RUN_JSON, 'w+')
+        else:
+            if self.options.ignore_journal and os.path.exists(JOURNAL_JSON):
+                os.remove(JOURNAL_JSON)
+            self.journal = cleanup_journal.CleanupJournal(JOURNAL_JSON)
+            self.progress = cleanup_journal.CleanupProgress(
+                self.options.progress_interval)
+            self.progress.start()
 
         admin_mgr = self.admin_mgr
         # Always cleanup tempest and alt tempest tenants unless
@@ -118,24 +149,34 @@ class Cleanup(object):
         tenants = tenant_service.list()
         LOG.debug("Process %s tenants" % len(tenants))
 
-        # Loop through list of tenants and clean them up.
-        for tenant in tenants:
-            self._add_admin(tenant['id'])
-            self._clean_tenant(tenant)
+        # Clean up the tenants concurrently, each one with its own manager
+        calls = [("tenant %s" % tenant['name'], self._process_tenant,
+                  (tenant,), None) for tenant in tenants]
+        for outcome in parallel.run_concurrently(calls,
+                                                 workers=self.options.workers):
+            if outcome.error is not None:
+                LOG.error("Cleaning %s failed: %s" % (outcome.name,
+                                                      outcome.error))
 
         kwargs = {'data': self.dry_run_data,
                   'is_dry_run': is_dry_run,
                   'saved_state_json': self.json_data,
                   'is_preserve': is_preserve,
-                  'is_save_state': is_save_state}
-        for service in self.global_services:
-            svc = service(admin_mgr, **kwargs)
-            svc.run()
+                  'is_save_state': is_save_state,
+                  'workers': self.options.delete_concurrency,
+                  'journal': self.journal,
+                  'progress': self.progress}
+        cleanup_service.run_services(self.global_services, admin_mgr,
+                                     **kwargs)
 
         if is_dry_run:
             f.write(json.dumps(self.dry_run_data, sort_keys=True,
                                indent=2, separators=(',', ': ')))
             f.close()
+        else:
+            self.progress.stop()
+            # The cleanup went through, the next one starts from scratch
+            self.journal.close(remove=True)
 
         self._remove_admin_user_roles()
 
@@ -143,8 +184,13 @@ class Cleanup(object):
         tenant_ids = self.admin_role_added
         LOG.debug("Removing admin user roles where needed for tenants: %s"
                   % tenant_ids)
-        for tenant_id in tenant_ids:
-            self._remove_admin_role(tenant_id)
+        calls = [("tenant %s" % tenant_id, self._remove_admin_role,
+                  (tenant_id,), None) for tenant_id in tenant_ids]
+        parallel.run_concurrently(calls, workers=self.options.workers)
+
+    def _process_tenant(self, tenant):
+        self._add_admin(tenant['id'])
+        self._clean_tenant(tenant)
 
     def _clean_tenant(self, tenant):
         LOG.debug("Cleaning tenant:  %s " % tenant['name'])
@@ -155,8 +201,9 @@ class Cleanup(object):
         tenant_name = tenant['name']
         tenant_data = None
         if is_dry_run:
-            tenant_data = dry_run_data["_tenants_to_clean"][tenant_id] = {}
-            tenant_data['name'] = tenant_name
+            tenant_data = {'name': tenant_name}
+            with self._lock:
+                dry_run_data["_tenants_to_clean"][tenant_id] = tenant_data
 
         kwargs = {"username": CONF.identity.admin_username,
                   "password": CONF.identity.admin_password,
@@ -167,10 +214,11 @@ class Cleanup(object):
                   'saved_state_json': None,
                   'is_preserve': is_preserve,
                   'is_save_state': False,
-                  'tenant_id': tenant_id}
-        for service in self.tenant_services:
-            svc = service(mgr, **kwargs)
-            svc.run()
+                  'tenant_id': tenant_id,
+                  'workers': self.options.delete_concurrency,
+                  'journal': self.journal,
+                  'progress': self.progress}
+        cleanup_service.run_services(self.tenant_services, mgr, **kwargs)
 
     def _init_admin_ids(self):
         id_cl = self.admin_mgr.identity_client
@@ -218,6 +266,26 @@ class Cleanup(object):
                             help="Generate JSON file:" + DRY_RUN_JSON +
                             ", that reports the objects that would have "
                             "been deleted had a full cleanup been run.")
+        parser.add_argument('--workers', type=int, dest='workers',
+                            default=1,
+                            help="Number of tenants cleaned up at the "
+                            "same time, each one with its own clients.")
+        parser.add_argument('--ignore-journal', action="store_true",
+                            dest='ignore_journal', default=False,
+                            help="Do not resume an interrupted cleanup "
+                            "from " + JOURNAL_JSON + ", list everything "
+                            "again.")
+        parser.add_argument('--progress-interval', type=int,
+                            dest='progress_interval', default=10,
+                            help="Seconds between two reports of the "
+                            "deletion throughput per object type.")
+        parser.add_argument('--delete-concurrency', type=int,
+                            dest='delete_concurrency',
+                            default=cleanup_service.BaseService.workers,
+                            help="Maximum number of objects of the same "
+                            "type deleted at the same time. Independent "
+                            "object types are always cleaned up "
+                            "concurrently.")
 
         self.options = parser.parse_args()
 
@@ -233,7 +301,8 @@ class Cleanup(object):
             LOG.debug("Adding admin priviledge for : %s" % tenant_id)
             id_cl.assign_user_role(tenant_id, self.admin_id,
                                    self.admin_role_id)
-            self.admin_role_added.append(tenant_id)
+            with self._lock:
+                self.admin_role_added.append(tenant_id)
 
     def _remove_admin_role(self, tenant_id):
         LOG.debug("Remove admin user role for tenant: %s" % tenant_id)
@@ -267,9 +336,8 @@ class Cleanup(object):
                   'saved_state_json': data,
                   'is_preserve': False,
                   'is_save_state': True}
-        for service in self.global_services:
-            svc = service(admin_mgr, **kwargs)
-            svc.run()
+        cleanup_service.run_services(self.global_services, admin_mgr,
+                                     **kwargs)
 
         f = open(SAVED_STATE_JSON, 'w+')
         f.write(json.dumps(data,
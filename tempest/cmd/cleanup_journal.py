@@ -0,0 +1,152 @@
+# Copyright 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Progress bookkeeping of tempest-cleanup
+
+The journal is an append-only file of JSON lines recording, for every
+(tenant, resource type), the items planned for deletion, the end of their
+listing and every completed deletion. When cleanup is interrupted, the next
+run replays it: types whose listing completed are not listed again, only
+their pending items are deleted.
+"""
+
+import collections
+import json
+import os
+import threading
+import time
+
+from tempest.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+PLANNED = 'planned'
+LISTED = 'listed'
+DONE = 'done'
+
+
+class CleanupJournal(object):
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._planned = collections.defaultdict(collections.OrderedDict)
+        self._listed = set()
+        self._done = collections.defaultdict(set)
+        self._load()
+        self._file = open(path, 'a')
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path) as journal:
+            for line in journal:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # the last line is truncated if cleanup was killed
+                    LOG.warning("Skipping invalid journal line: %s" % line)
+                    continue
+                self._apply(entry)
+        LOG.info("Resuming cleanup from journal %s" % self.path)
+
+    def _apply(self, entry):
+        key = tuple(entry['key'])
+        if entry['event'] == PLANNED:
+            self._planned[key][entry['id']] = entry['item']
+        elif entry['event'] == LISTED:
+            self._listed.add(key)
+        elif entry['event'] == DONE:
+            self._done[key].add(entry['id'])
+
+    def _write(self, entry):
+        with self._lock:
+            self._apply(entry)
+            self._file.write(json.dumps(entry) + '\n')
+            self._file.flush()
+
+    def pending(self, key):
+        """Items of a completely listed key not deleted yet, else None."""
+        key = tuple(key)
+        with self._lock:
+            if key not in self._listed:
+                return None
+            done = self._done[key]
+            return [item for item_id, item in self._planned[key].items()
+                    if item_id not in done]
+
+    def plan(self, key, items, item_id):
+        """Record the items while they are generated.
+
+        The listing is marked complete once the generator is exhausted.
+        """
+        key = list(key)
+        for item in items:
+            self._write({'key': key, 'event': PLANNED,
+                         'id': item_id(item), 'item': item})
+            yield item
+        self._write({'key': key, 'event': LISTED})
+
+    def done(self, key, item_id):
+        self._write({'key': list(key), 'event': DONE, 'id': item_id})
+
+    def close(self, remove=False):
+        with self._lock:
+            self._file.close()
+        if remove:
+            os.remove(self.path)
+
+
+class CleanupProgress(object):
+    """Periodically logs deletion throughput per resource type."""
+
+    def __init__(self, interval=10):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._counts = collections.defaultdict(int)
+        self._started = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def count(self, resource_type):
+        with self._lock:
+            self._started.setdefault(resource_type, time.time())
+            self._counts[resource_type] += 1
+
+    def report(self):
+        now = time.time()
+        with self._lock:
+            rates = ["%s: %d deleted (%.1f/s)" % (
+                resource_type, count,
+                count / max(now - self._started[resource_type], 1))
+                for resource_type, count in sorted(self._counts.items())]
+        if rates:
+            LOG.info("Cleanup progress: %s" % ', '.join(rates))
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.report()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.report()
@@ -18,7 +18,11 @@ Created on Sep 3, 2014
 
 @author: David_Paterson
 '''
+import time
+
+from tempest.common.utils import parallel
 from tempest import config
+from tempest import exceptions
 from tempest.openstack.common import log as logging
 from tempest import test
 
@@ -40,6 +44,12 @@ IS_HEAT = None
 IS_NEUTRON = None
 IS_NOVA = None
 
+# Errors returned when deleting a resource something else still uses
+DEPENDENCY_ERRORS = (exceptions.Conflict, exceptions.BadRequest)
+# How many times deletions failing on dependencies are retried
+DEPENDENCY_RETRIES = 3
+DEPENDENCY_RETRY_INTERVAL = 5
+
 
 def init_conf():
     global CONF_USERS
@@ -77,31 +87,123 @@ def init_conf():
 
 
 class BaseService(object):
+    workers = parallel.DEFAULT_WORKERS
+    page_size = 500
+    journal = None
+    progress = None
+    # ids of the items which must not be deleted
+    preserved_ids = frozenset()
+
     def __init__(self, kwargs):
         self.client = None
         for key, value in kwargs.items():
             setattr(self, key, value)
 
-    def _filter_by_tenant_id(self, item_list):
-        if (item_list is None
-                or len(item_list) == 0
-                or not hasattr(self, 'tenant_id')
-                or self.tenant_id is None
-                or 'tenant_id' not in item_list[0]):
-            return item_list
-
-        _filtered_list = []
-        for item in item_list:
-            if item['tenant_id'] == self.tenant_id:
-                _filtered_list.append(item)
-        return _filtered_list
+    def _filter_by_tenant_id(self, items):
+        tenant_id = getattr(self, 'tenant_id', None)
+        for item in items:
+            if tenant_id is None or item.get('tenant_id',
+                                             tenant_id) == tenant_id:
+                yield item
+
+    def _paginate(self, list_page, params=None):
+        """Generate the items of a listing, one page at a time.
+
+        :param list_page: callable getting the query parameters and
+            returning the list of items of one page
+        """
+        params = dict(params or {}, limit=self.page_size)
+        seen = set()
+        page = list_page(dict(params))
+        while page is not None:
+            new_items = [item for item in page if item['id'] not in seen]
+            next_page = None
+            # NOTE: a service without pagination support ignores limit and
+            # marker and returns everything on every request
+            if len(page) >= self.page_size and new_items:
+                # NOTE: the next page is fetched before the items of this
+                # one are handed out, they may get deleted meanwhile and
+                # services return NotFound for a deleted marker
+                params['marker'] = page[-1]['id']
+                next_page = list_page(dict(params))
+            for item in new_items:
+                seen.add(item['id'])
+                yield item
+            page = next_page
 
     def list(self):
         pass
 
-    def delete(self):
+    def delete_item(self, item):
         pass
 
+    def _item_name(self, item):
+        return item['id']
+
+    def _journal_key(self):
+        return (getattr(self, 'tenant_id', None) or '',
+                self.__class__.__name__)
+
+    def _list_unpreserved(self):
+        if not self.preserved_ids:
+            return self.list()
+        return (item for item in self.list()
+                if self._item_name(item) not in self.preserved_ids)
+
+    def delete(self):
+        if self.journal is None:
+            return self.delete_items(self._list_unpreserved())
+        key = self._journal_key()
+        pending = self.journal.pending(key)
+        if pending is not None:
+            LOG.debug("%s already listed, %s deletions pending" %
+                      (self.__class__.__name__, len(pending)))
+            return self.delete_items(pending)
+        return self.delete_items(self.journal.plan(
+            key, self._list_unpreserved(), self._item_name))
+
+    def _delete_and_record(self, item):
+        try:
+            self.delete_item(item)
+        except exceptions.NotFound:
+            pass
+        if self.journal is not None:
+            self.journal.done(self._journal_key(), self._item_name(item))
+        if self.progress is not None:
+            self.progress.count(self.__class__.__name__)
+
+    def delete_items(self, items):
+        """Delete items concurrently, at most `workers` at the same time.
+
+        Deletions failing because something still depends on the item
+        (e.g. a subnet which still has ports) are not errors, those items
+        are returned so they can be retried once the dependencies are gone.
+        Items already gone are not errors either.
+        """
+        name = self.__class__.__name__
+        scheduled = []
+
+        def _calls():
+            # items can be a generator still listing, deleting the first
+            # items doesn't wait for the whole listing
+            for item in items:
+                scheduled.append(item)
+                yield ("%s %s" % (name, self._item_name(item)),
+                       self._delete_and_record, (item,), None)
+
+        outcomes = parallel.run_concurrently(_calls(), workers=self.workers)
+        LOG.debug("Deleted %s: %s items" % (name, len(outcomes)))
+        retry = []
+        for item, outcome in zip(scheduled, outcomes):
+            if isinstance(outcome.error, DEPENDENCY_ERRORS):
+                LOG.debug("Deferring delete of %s: %s" %
+                          (outcome.name, outcome.error))
+                retry.append(item)
+            elif outcome.error is not None:
+                LOG.error("Delete %s exception: %s" % (outcome.name,
+                                                       outcome.error))
+        return retry
+
     def dry_run(self):
         pass
 
@@ -109,12 +211,14 @@ class BaseService(object):
         pass
 
     def run(self):
+        """Run the service, return the items to retry the delete of."""
         if self.is_dry_run:
             self.dry_run()
         elif self.is_save_state:
             self.save_state()
         else:
-            self.delete()
+            return self.delete()
+        return []
 
 
 class SnapshotService(BaseService):
@@ -124,23 +228,16 @@ class SnapshotService(BaseService):
         self.client = manager.snapshots_client
 
     def list(self):
-        client = self.client
-        __, snaps = client.list_snapshots()
-        LOG.debug("List count, %s Snapshots" % len(snaps))
-        return snaps
+        def _list_page(params):
+            __, snaps = self.client.list_snapshots(params)
+            return snaps
+        return self._paginate(_list_page)
 
-    def delete(self):
-        snaps = self.list()
-        client = self.client
-        for snap in snaps:
-            try:
-                client.delete_snapshot(snap['id'])
-            except Exception as e:
-                LOG.exception("Delete Snapshot exception: %s" % e)
-                pass
+    def delete_item(self, snap):
+        self.client.delete_snapshot(snap['id'])
 
     def dry_run(self):
-        snaps = self.list()
+        snaps = list(self.list())
         self.data['snapshots'] = snaps
 
 
@@ -150,24 +247,20 @@ class ServerService(BaseService):
         self.client = manager.servers_client
 
     def list(self):
-        client = self.client
-        _, servers_body = client.list_servers()
-        servers = servers_body['servers']
-        LOG.debug("List count, %s Servers" % len(servers))
-        return servers
+        def _list_page(params):
+            _, servers_body = self.client.list_servers(params)
+            return servers_body['servers']
+        return self._paginate(_list_page)
 
-    def delete(self):
-        client = self.client
-        servers = self.list()
-        for server in servers:
-            try:
-                client.delete_server(server['id'])
-            except Exception as e:
-                LOG.exception("Delete Server exception: %s" % e)
-                pass
+    def delete_item(self, server):
+        self.client.delete_server(server['id'])
+        # NOTE: servers are deleted asynchronously, the resources they use
+        # are only released once they are gone
+        self.client.wait_for_server_termination(server['id'],
+                                                ignore_error=True)
 
     def dry_run(self):
-        servers = self.list()
+        servers = list(self.list())
         self.data['servers'] = servers
 
 
@@ -179,18 +272,11 @@ class ServerGroupService(ServerService):
         LOG.debug("List count, %s Server Groups" % len(sgs))
         return sgs
 
-    def delete(self):
-        client = self.client
-        sgs = self.list()
-        for sg in sgs:
-            try:
-                client.delete_server_group(sg['id'])
-            except Exception as e:
-                LOG.exception("Delete Server Group exception: %s" % e)
-                pass
+    def delete_item(self, sg):
+        self.client.delete_server_group(sg['id'])
 
     def dry_run(self):
-        sgs = self.list()
+        sgs = list(self.list())
         self.data['server_groups'] = sgs
 
 
@@ -205,18 +291,11 @@ class StackService(BaseService):
         LOG.debug("List count, %s Stacks" % len(stacks))
         return stacks
 
-    def delete(self):
-        client = self.client
-        stacks = self.list()
-        for stack in stacks:
-            try:
-                client.delete_stack(stack['id'])
-            except Exception as e:
-                LOG.exception("Delete Stack exception: %s " % e)
-                pass
+    def delete_item(self, stack):
+        self.client.delete_stack(stack['id'])
 
     def dry_run(self):
-        stacks = self.list()
+        stacks = list(self.list())
         self.data['stacks'] = stacks
 
 
@@ -231,19 +310,14 @@ class KeyPairService(BaseService):
         LOG.debug("List count, %s Keypairs" % len(keypairs))
         return keypairs
 
-    def delete(self):
-        client = self.client
-        keypairs = self.list()
-        for k in keypairs:
-            try:
-                name = k['keypair']['name']
-                client.delete_keypair(name)
-            except Exception as e:
-                LOG.exception("Delete Keypairs exception: %s" % e)
-                pass
+    def delete_item(self, k):
+        self.client.delete_keypair(k['keypair']['name'])
+
+    def _item_name(self, k):
+        return k['keypair']['name']
 
     def dry_run(self):
-        keypairs = self.list()
+        keypairs = list(self.list())
         self.data['keypairs'] = keypairs
 
 
@@ -259,17 +333,11 @@ class SecurityGroupService(BaseService):
         LOG.debug("List count, %s Security Groups" % len(secgrp_del))
         return secgrp_del
 
-    def delete(self):
-        client = self.client
-        secgrp_del = self.list()
-        for g in secgrp_del:
-            try:
-                client.delete_security_group(g['id'])
-            except Exception as e:
-                LOG.exception("Delete Security Groups exception: %s" % e)
+    def delete_item(self, g):
+        self.client.delete_security_group(g['id'])
 
     def dry_run(self):
-        secgrp_del = self.list()
+        secgrp_del = list(self.list())
         self.data['security_groups'] = secgrp_del
 
 
@@ -284,18 +352,11 @@ class FloatingIpService(BaseService):
         LOG.debug("List count, %s Floating IPs" % len(floating_ips))
         return floating_ips
 
-    def delete(self):
-        client = self.client
-        floating_ips = self.list()
-        for f in floating_ips:
-            try:
-                client.delete_floating_ip(f['id'])
-            except Exception as e:
-                LOG.exception("Delete Floating IPs exception: %s" % e)
-                pass
+    def delete_item(self, f):
+        self.client.delete_floating_ip(f['id'])
 
     def dry_run(self):
-        floating_ips = self.list()
+        floating_ips = list(self.list())
         self.data['floating_ips'] = floating_ips
 
 
@@ -305,441 +366,270 @@ class VolumeService(BaseService):
         self.client = manager.volumes_client
 
     def list(self):
-        client = self.client
-        _, vols = client.list_volumes()
-        LOG.debug("List count, %s Volumes" % len(vols))
-        return vols
+        def _list_page(params):
+            _, vols = self.client.list_volumes(params)
+            return vols
+        return self._paginate(_list_page)
 
-    def delete(self):
-        client = self.client
-        vols = self.list()
-        for v in vols:
-            try:
-                client.delete_volume(v['id'])
-            except Exception as e:
-                LOG.exception("Delete Volume exception: %s" % e)
-                pass
+    def delete_item(self, v):
+        self.client.delete_volume(v['id'])
 
     def dry_run(self):
-        vols = self.list()
+        vols = list(self.list())
         self.data['volumes'] = vols
 
 
 # Begin network service classes
 class NetworkService(BaseService):
+    # Only what cleanup needs is requested from neutron
+    fields = ('id', 'name', 'tenant_id')
+
     def __init__(self, manager, **kwargs):
         super(NetworkService, self).__init__(kwargs)
         self.client = manager.network_client
 
+    def _list_resources(self, list_method, plural_name):
+        """Generate the tenant's resources, filtered by neutron."""
+        filters = {'fields': list(self.fields)}
+        if getattr(self, 'tenant_id', None) is not None:
+            filters['tenant_id'] = self.tenant_id
+
+        def _list_page(params):
+            _, body = list_method(**dict(filters, **params))
+            return body[plural_name]
+        # NOTE: filtered again in case the filter was ignored by neutron
+        return self._filter_by_tenant_id(self._paginate(_list_page))
+
     def list(self):
-        client = self.client
-        _, networks = client.list_networks()
-        networks = self._filter_by_tenant_id(networks['networks'])
+        networks = self._list_resources(self.client.list_networks,
+                                        'networks')
         # filter out networks declared in tempest.conf
         if self.is_preserve:
-            networks = [network for network in networks
+            networks = (network for network in networks
                         if (network['name'] != CONF_PRIV_NETWORK_NAME
-                            and network['id'] != CONF_PUB_NETWORK)]
-        LOG.debug("List count, %s Networks" % networks)
+                            and network['id'] != CONF_PUB_NETWORK))
         return networks
 
-    def delete(self):
-        client = self.client
-        networks = self.list()
-        for n in networks:
-            try:
-                client.delete_network(n['id'])
-            except Exception as e:
-                LOG.exception("Delete Network exception: %s" % e)
-                pass
+    def delete_item(self, n):
+        self.client.delete_network(n['id'])
 
     def dry_run(self):
-        networks = self.list()
+        networks = list(self.list())
         self.data['networks'] = networks
 
 
 class NetworkIpSecPolicyService(NetworkService):
 
     def list(self):
-        client = self.client
-        _, ipsecpols = client.list_ipsecpolicies()
-        ipsecpols = ipsecpols['ipsecpolicies']
-        ipsecpols = self._filter_by_tenant_id(ipsecpols)
-        LOG.debug("List count, %s IP Security Policies" % len(ipsecpols))
-        return ipsecpols
+        return self._list_resources(self.client.list_ipsecpolicies,
+                                    'ipsecpolicies')
 
-    def delete(self):
-        client = self.client
-        ipsecpols = self.list()
-        for ipsecpol in ipsecpols:
-            try:
-                client.delete_ipsecpolicy(ipsecpol['id'])
-            except Exception as e:
-                LOG.exception("Delete IP Securty Policy exception: %s" % e)
-                pass
+    def delete_item(self, ipsecpol):
+        self.client.delete_ipsecpolicy(ipsecpol['id'])
 
     def dry_run(self):
-        ipsecpols = self.list()
+        ipsecpols = list(self.list())
         self.data['ip_security_policies'] = ipsecpols
 
 
 class NetworkFwPolicyService(NetworkService):
 
     def list(self):
-        client = self.client
-        _, fwpols = client.list_firewall_policies()
-        fwpols = fwpols['firewall_policies']
-        fwpols = self._filter_by_tenant_id(fwpols)
-        LOG.debug("List count, %s Firewall Policies" % len(fwpols))
-        return fwpols
+        return self._list_resources(self.client.list_firewall_policies,
+                                    'firewall_policies')
 
-    def delete(self):
-        client = self.client
-        fwpols = self.list()
-        for fwpol in fwpols:
-            try:
-                client.delete_firewall_policy(fwpol['id'])
-            except Exception as e:
-                LOG.exception("Delete Firewall Policy exception: %s" % e)
-                pass
+    def delete_item(self, fwpol):
+        self.client.delete_firewall_policy(fwpol['id'])
 
     def dry_run(self):
-        fwpols = self.list()
+        fwpols = list(self.list())
         self.data['firewall_policies'] = fwpols
 
 
 class NetworkFwRulesService(NetworkService):
 
     def list(self):
-        client = self.client
-        _, fwrules = client.list_firewall_rules()
-        fwrules = fwrules['firewall_rules']
-        fwrules = self._filter_by_tenant_id(fwrules)
-        LOG.debug("List count, %s Firewall Rules" % len(fwrules))
-        return fwrules
+        return self._list_resources(self.client.list_firewall_rules,
+                                    'firewall_rules')
 
-    def delete(self):
-        client = self.client
-        fwrules = self.list()
-        for fwrule in fwrules:
-            try:
-                client.delete_firewall_rule(fwrule['id'])
-            except Exception as e:
-                LOG.exception("Delete Firewall Rule exception: %s" % e)
-                pass
+    def delete_item(self, fwrule):
+        self.client.delete_firewall_rule(fwrule['id'])
 
     def dry_run(self):
-        fwrules = self.list()
+        fwrules = list(self.list())
         self.data['firewall_rules'] = fwrules
 
 
 class NetworkIkePolicyService(NetworkService):
 
     def list(self):
-        client = self.client
-        _, ikepols = client.list_ikepolicies()
-        ikepols = ikepols['ikepolicies']
-        ikepols = self._filter_by_tenant_id(ikepols)
-        LOG.debug("List count, %s IKE Policies" % len(ikepols))
-        return ikepols
+        return self._list_resources(self.client.list_ikepolicies,
+                                    'ikepolicies')
 
-    def delete(self):
-        client = self.client
-        ikepols = self.list()
-        for ikepol in ikepols:
-            try:
-                client.delete_firewall_rule(ikepol['id'])
-            except Exception as e:
-                LOG.exception("Delete IKE Policy exception: %s" % e)
-                pass
+    def delete_item(self, ikepol):
+        self.client.delete_ikepolicy(ikepol['id'])
 
     def dry_run(self):
-        ikepols = self.list()
+        ikepols = list(self.list())
         self.data['ike_policies'] = ikepols
 
 
 class NetworkVpnServiceService(NetworkService):
 
     def list(self):
-        client = self.client
-        _, vpnsrvs = client.list_vpnservices()
-        vpnsrvs = vpnsrvs['vpnservices']
-        vpnsrvs = self._filter_by_tenant_id(vpnsrvs)
-        LOG.debug("List count, %s VPN Services" % len(vpnsrvs))
-        return vpnsrvs
+        return self._list_resources(self.client.list_vpnservices,
+                                    'vpnservices')
 
-    def delete(self):
-        client = self.client
-        vpnsrvs = self.list()
-        for vpnsrv in vpnsrvs:
-            try:
-                client.delete_vpnservice(vpnsrv['id'])
-            except Exception as e:
-                LOG.exception("Delete VPN Service exception: %s" % e)
-                pass
+    def delete_item(self, vpnsrv):
+        self.client.delete_vpnservice(vpnsrv['id'])
 
     def dry_run(self):
-        vpnsrvs = self.list()
+        vpnsrvs = list(self.list())
         self.data['vpn_services'] = vpnsrvs
 
 
 class NetworkFloatingIpService(NetworkService):
 
     def list(self):
-        client = self.client
-        _, flips = client.list_floatingips()
-        flips = flips['floatingips']
-        flips = self._filter_by_tenant_id(flips)
-        LOG.debug("List count, %s Network Floating IPs" % len(flips))
-        return flips
+        return self._list_resources(self.client.list_floatingips,
+                                    'floatingips')
 
-    def delete(self):
-        client = self.client
-        flips = self.list()
-        for flip in flips:
-            try:
-                client.delete_floatingip(flip['id'])
-            except Exception as e:
-                LOG.exception("Delete Network Floating IP exception: %s" % e)
-                pass
+    def delete_item(self, flip):
+        self.client.delete_floatingip(flip['id'])
 
     def dry_run(self):
-        flips = self.list()
+        flips = list(self.list())
         self.data['floating_ips'] = flips
 
 
 class NetworkRouterService(NetworkService):
 
     def list(self):
-        client = self.client
-        _, routers = client.list_routers()
-        routers = routers['routers']
-        routers = self._filter_by_tenant_id(routers)
+        routers = self._list_resources(self.client.list_routers, 'routers')
         if self.is_preserve:
-            routers = [router for router in routers
-                       if router['id'] != CONF_PUB_ROUTER]
-
-        LOG.debug("List count, %s Routers" % len(routers))
+            routers = (router for router in routers
+                       if router['id'] != CONF_PUB_ROUTER)
         return routers
 
-    def delete(self):
+    def delete_item(self, router):
         client = self.client
-        routers = self.list()
-        for router in routers:
-            try:
-                rid = router['id']
-                _, ports = client.list_router_interfaces(rid)
-                ports = ports['ports']
-                for port in ports:
-                    subid = port['fixed_ips'][0]['subnet_id']
-                    client.remove_router_interface_with_subnet_id(rid, subid)
-                    client.delete_router(rid)
-            except Exception as e:
-                LOG.exception("Delete Router exception: %s" % e)
-                pass
+        rid = router['id']
+        _, ports = client.list_router_interfaces(rid)
+        ports = ports['ports']
+        for port in ports:
+            subid = port['fixed_ips'][0]['subnet_id']
+            client.remove_router_interface_with_subnet_id(rid, subid)
+        client.delete_router(rid)
 
     def dry_run(self):
-        routers = self.list()
+        routers = list(self.list())
         self.data['routers'] = routers
 
 
 class NetworkHealthMonitorService(NetworkService):
 
     def list(self):
-        client = self.client
-        _, hms = client.list_health_monitors()
-        hms = hms['health_monitors']
-        hms = self._filter_by_tenant_id(hms)
-        LOG.debug("List count, %s Health Monitors" % len(hms))
-        return hms
+        return self._list_resources(self.client.list_health_monitors,
+                                    'health_monitors')
 
-    def delete(self):
-        client = self.client
-        hms = self.list()
-        for hm in hms:
-            try:
-                client.delete_health_monitor(hm['id'])
-            except Exception as e:
-                LOG.exception("Delete Health Monitor exception: %s" % e)
-                pass
+    def delete_item(self, hm):
+        self.client.delete_health_monitor(hm['id'])
 
     def dry_run(self):
-        hms = self.list()
+        hms = list(self.list())
         self.data['health_monitors'] = hms
 
 
 class NetworkMemberService(NetworkService):
 
     def list(self):
-        client = self.client
-        _, members = client.list_members()
-        members = members['members']
-        members = self._filter_by_tenant_id(members)
-        LOG.debug("List count, %s Members" % len(members))
-        return members
+        return self._list_resources(self.client.list_members, 'members')
 
-    def delete(self):
-        client = self.client
-        members = self.list()
-        for member in members:
-            try:
-                client.delete_member(member['id'])
-            except Exception as e:
-                LOG.exception("Delete Member exception: %s" % e)
-                pass
+    def delete_item(self, member):
+        self.client.delete_member(member['id'])
 
     def dry_run(self):
-        members = self.list()
+        members = list(self.list())
         self.data['members'] = members
 
 
 class NetworkVipService(NetworkService):
 
     def list(self):
-        client = self.client
-        _, vips = client.list_vips()
-        vips = vips['vips']
-        vips = self._filter_by_tenant_id(vips)
-        LOG.debug("List count, %s VIPs" % len(vips))
-        return vips
+        return self._list_resources(self.client.list_vips, 'vips')
 
-    def delete(self):
-        client = self.client
-        vips = self.list()
-        for vip in vips:
-            try:
-                client.delete_vip(vip['id'])
-            except Exception as e:
-                LOG.exception("Delete VIP exception: %s" % e)
-                pass
+    def delete_item(self, vip):
+        self.client.delete_vip(vip['id'])
 
     def dry_run(self):
-        vips = self.list()
+        vips = list(self.list())
         self.data['vips'] = vips
 
 
 class NetworkPoolService(NetworkService):
 
     def list(self):
-        client = self.client
-        _, pools = client.list_pools()
-        pools = pools['pools']
-        pools = self._filter_by_tenant_id(pools)
-        LOG.debug("List count, %s Pools" % len(pools))
-        return pools
+        return self._list_resources(self.client.list_pools, 'pools')
 
-    def delete(self):
-        client = self.client
-        pools = self.list()
-        for pool in pools:
-            try:
-                client.delete_pool(pool['id'])
-            except Exception as e:
-                LOG.exception("Delete Pool exception: %s" % e)
-                pass
+    def delete_item(self, pool):
+        self.client.delete_pool(pool['id'])
 
     def dry_run(self):
-        pools = self.list()
+        pools = list(self.list())
         self.data['pools'] = pools
 
 
 class NetworMeteringLabelRuleService(NetworkService):
 
     def list(self):
-        client = self.client
-        _, rules = client.list_metering_label_rules()
-        rules = rules['metering_label_rules']
-        rules = self._filter_by_tenant_id(rules)
-        LOG.debug("List count, %s Metering Label Rules" % len(rules))
-        return rules
+        return self._list_resources(self.client.list_metering_label_rules,
+                                    'metering_label_rules')
 
-    def delete(self):
-        client = self.client
-        rules = self.list()
-        for rule in rules:
-            try:
-                client.delete_metering_label_rule(rule['id'])
-            except Exception as e:
-                LOG.exception("Delete Metering Label Rule exception: %s" % e)
-                pass
+    def delete_item(self, rule):
+        self.client.delete_metering_label_rule(rule['id'])
 
     def dry_run(self):
-        rules = self.list()
+        rules = list(self.list())
         self.data['rules'] = rules
 
 
 class NetworMeteringLabelService(NetworkService):
 
     def list(self):
-        client = self.client
-        _, labels = client.list_metering_labels()
-        labels = labels['metering_labels']
-        labels = self._filter_by_tenant_id(labels)
-        LOG.debug("List count, %s Metering Labels" % len(labels))
-        return labels
+        return self._list_resources(self.client.list_metering_labels,
+                                    'metering_labels')
 
-    def delete(self):
-        client = self.client
-        labels = self.list()
-        for label in labels:
-            try:
-                client.delete_metering_label(label['id'])
-            except Exception as e:
-                LOG.exception("Delete Metering Label exception: %s" % e)
-                pass
+    def delete_item(self, label):
+        self.client.delete_metering_label(label['id'])
 
     def dry_run(self):
-        labels = self.list()
+        labels = list(self.list())
         self.data['labels'] = labels
 
 
 class NetworkPortService(NetworkService):
 
     def list(self):
-        client = self.client
-        _, ports = client.list_ports()
-        ports = ports['ports']
-        ports = self._filter_by_tenant_id(ports)
-        LOG.debug("List count, %s Ports" % len(ports))
-        return ports
+        return self._list_resources(self.client.list_ports, 'ports')
 
-    def delete(self):
-        client = self.client
-        ports = self.list()
-        for port in ports:
-            try:
-                client.delete_port(port['id'])
-            except Exception as e:
-                LOG.exception("Delete Port exception: %s" % e)
-                pass
+    def delete_item(self, port):
+        self.client.delete_port(port['id'])
 
     def dry_run(self):
-        ports = self.list()
+        ports = list(self.list())
         self.data['ports'] = ports
 
 
 class NetworkSubnetService(NetworkService):
 
     def list(self):
-        client = self.client
-        _, subnets = client.list_subnets()
-        subnets = subnets['subnets']
-        subnets = self._filter_by_tenant_id(subnets)
-        LOG.debug("List count, %s Subnets" % len(subnets))
-        return subnets
+        return self._list_resources(self.client.list_subnets, 'subnets')
 
-    def delete(self):
-        client = self.client
-        subnets = self.list()
-        for subnet in subnets:
-            try:
-                client.delete_subnet(subnet['id'])
-            except Exception as e:
-                LOG.exception("Delete Subnet exception: %s" % e)
-                pass
+    def delete_item(self, subnet):
+        self.client.delete_subnet(subnet['id'])
 
     def dry_run(self):
-        subnets = self.list()
+        subnets = list(self.list())
         self.data['subnets'] = subnets
 
 
@@ -755,18 +645,11 @@ class TelemetryAlarmService(BaseService):
         LOG.debug("List count, %s Alarms" % len(alarms))
         return alarms
 
-    def delete(self):
-        client = self.client
-        alarms = self.list()
-        for alarm in alarms:
-            try:
-                client.delete_alarm(alarm['id'])
-            except Exception as e:
-                LOG.exception("Delete Alarms exception: %s" % e)
-                pass
+    def delete_item(self, alarm):
+        self.client.delete_alarm(alarm['id'])
 
     def dry_run(self):
-        alarms = self.list()
+        alarms = list(self.list())
         self.data['alarms'] = alarms
 
 
@@ -790,18 +673,11 @@ class FlavorService(BaseService):
         LOG.debug("List count, %s Flavors after reconcile" % len(flavors))
         return flavors
 
-    def delete(self):
-        client = self.client
-        flavors = self.list()
-        for flavor in flavors:
-            try:
-                client.delete_flavor(flavor['id'])
-            except Exception as e:
-                LOG.exception("Delete Flavor exception: %s" % e)
-                pass
+    def delete_item(self, flavor):
+        self.client.delete_flavor(flavor['id'])
 
     def dry_run(self):
-        flavors = self.list()
+        flavors = list(self.list())
         self.data['flavors'] = flavors
 
     def save_state(self):
@@ -828,18 +704,11 @@ class ImageService(BaseService):
         LOG.debug("List count, %s Images after reconcile" % len(images))
         return images
 
-    def delete(self):
-        client = self.client
-        images = self.list()
-        for image in images:
-            try:
-                client.delete_image(image['id'])
-            except Exception as e:
-                LOG.exception("Delete Image exception: %s" % e)
-                pass
+    def delete_item(self, image):
+        self.client.delete_image(image['id'])
 
     def dry_run(self):
-        images = self.list()
+        images = list(self.list())
         self.data['images'] = images
 
     def save_state(self):
@@ -876,18 +745,11 @@ class UserService(IdentityService):
         LOG.debug("List count, %s Users after reconcile" % len(users))
         return users
 
-    def delete(self):
-        client = self.client
-        users = self.list()
-        for user in users:
-            try:
-                client.delete_user(user['id'])
-            except Exception as e:
-                LOG.exception("Delete User exception: %s" % e)
-                pass
+    def delete_item(self, user):
+        self.client.delete_user(user['id'])
 
     def dry_run(self):
-        users = self.list()
+        users = list(self.list())
         self.data['users'] = users
 
     def save_state(self):
@@ -915,18 +777,11 @@ class RoleService(IdentityService):
             LOG.exception("Cannot retrieve Roles, exception: %s" % ex)
             return []
 
-    def delete(self):
-        client = self.client
-        roles = self.list()
-        for role in roles:
-            try:
-                client.delete_role(role['id'])
-            except Exception as e:
-                LOG.exception("Delete Role exception: %s" % e)
-                pass
+    def delete_item(self, role):
+        self.client.delete_role(role['id'])
 
     def dry_run(self):
-        roles = self.list()
+        roles = list(self.list())
         self.data['roles'] = roles
 
     def save_state(self):
@@ -953,18 +808,11 @@ class TenantService(IdentityService):
         LOG.debug("List count, %s Tenants after reconcile" % len(tenants))
         return tenants
 
-    def delete(self):
-        client = self.client
-        tenants = self.list()
-        for tenant in tenants:
-            try:
-                client.delete_tenant(tenant['id'])
-            except Exception as e:
-                LOG.exception("Delete Tenant exception: %s" % e)
-                pass
+    def delete_item(self, tenant):
+        self.client.delete_tenant(tenant['id'])
 
     def dry_run(self):
-        tenants = self.list()
+        tenants = list(self.list())
         self.data['tenants'] = tenants
 
     def save_state(self):
@@ -990,19 +838,12 @@ class DomainService(BaseService):
         LOG.debug("List count, %s Domains after reconcile" % len(domains))
         return domains
 
-    def delete(self):
-        client = self.client
-        domains = self.list()
-        for domain in domains:
-            try:
-                client.update_domain(domain['id'], enabled=False)
-                client.delete_domain(domain['id'])
-            except Exception as e:
-                LOG.exception("Delete Domain exception: %s" % e)
-                pass
+    def delete_item(self, domain):
+        self.client.update_domain(domain['id'], enabled=False)
+        self.client.delete_domain(domain['id'])
 
     def dry_run(self):
-        domains = self.list()
+        domains = list(self.list())
         self.data['domains'] = domains
 
     def save_state(self):
@@ -1064,3 +905,97 @@ def get_global_cleanup_services():
     global_services.append(DomainService)
     global_services.append(RoleService)
     return global_services
+
+
+# Resource types which have to be deleted before the key can be deleted.
+# Only dependencies between the services actually run are considered.
+SERVICE_DEPENDENCIES = {
+    SecurityGroupService: (ServerService,),
+    ServerGroupService: (ServerService,),
+    FloatingIpService: (ServerService,),
+    NetworkIpSecPolicyService: (NetworkVpnServiceService,),
+    NetworkIkePolicyService: (NetworkVpnServiceService,),
+    NetworkFwRulesService: (NetworkFwPolicyService,),
+    NetworkPoolService: (NetworkHealthMonitorService, NetworkMemberService,
+                         NetworkVipService),
+    NetworMeteringLabelService: (NetworMeteringLabelRuleService,),
+    NetworkRouterService: (NetworkFloatingIpService,
+                           NetworkVpnServiceService),
+    NetworkPortService: (ServerService, NetworkRouterService,
+                         NetworkVipService),
+    NetworkSubnetService: (NetworkPortService, NetworkRouterService,
+                           NetworkPoolService, NetworkVpnServiceService),
+    NetworkService: (NetworkSubnetService,),
+    VolumeService: (ServerService, SnapshotService),
+    DomainService: (UserService, TenantService),
+}
+
+
+def get_service_levels(services):
+    """Sort services in levels of the dependency graph.
+
+    The services of a level only depend on services of the previous
+    levels, so they can run concurrently once those are done.
+    """
+    remaining = list(services)
+    done = set()
+    levels = []
+    while remaining:
+        level = [service for service in remaining
+                 if all(dep in done or dep not in services
+                        for dep in SERVICE_DEPENDENCIES.get(service, ()))]
+        if not level:
+            raise exceptions.InvalidStructure(
+                "Dependency cycle between %s" % remaining)
+        levels.append(level)
+        done.update(level)
+        remaining = [service for service in remaining if service not in done]
+    return levels
+
+
+def run_services(services, manager, **kwargs):
+    """Run the services following their dependency graph.
+
+    Independent resource types are processed concurrently, each one
+    deleting its items concurrently as well. Deletions which failed
+    because of a dependency are retried once everything else ran, up to
+    DEPENDENCY_RETRIES times.
+    """
+    instances = dict((service, service(manager, **kwargs))
+                     for service in services)
+    levels = get_service_levels(services)
+    retry = {}
+    for level in levels:
+        calls = [(service.__name__, instances[service].run, None, None)
+                 for service in level]
+        for service, outcome in zip(level, parallel.run_concurrently(
+                calls, workers=len(calls))):
+            if outcome.error is not None:
+                LOG.error("%s failed: %s" % (outcome.name, outcome.error))
+            elif outcome.result:
+                retry[service] = outcome.result
+
+    for attempt in range(DEPENDENCY_RETRIES):
+        if not retry:
+            break
+        time.sleep(DEPENDENCY_RETRY_INTERVAL)
+        LOG.debug("Retrying %s deletions blocked by dependencies" %
+                  sum(len(items) for items in retry.values()))
+        for level in levels:
+            blocked = dict((service, retry.pop(service))
+                           for service in level if service in retry)
+            calls = [(service.__name__, instances[service].delete_items,
+                      (items,), None) for service, items in blocked.items()]
+            for service, outcome in zip(blocked, parallel.run_concurrently(
+                    calls, workers=len(calls))):
+                if outcome.error is not None:
+                    LOG.error("%s failed: %s" % (outcome.name,
+                                                 outcome.error))
+                    # still reported as not deleted if no retry succeeds
+                    retry[service] = blocked[service]
+                elif outcome.result:
+                    retry[service] = outcome.result
+    for service, items in retry.items():
+        LOG.error("%s could not delete %s" % (
+            service.__name__,
+            [instances[service]._item_name(item) for item in items]))
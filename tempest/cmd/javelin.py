@@ -17,22 +17,33 @@
 Javelin is a tool for creating, verifying, and deleting a small set of
 resources in a declarative way.
 
+The resources are created along their dependencies (users after their
+tenant, servers after their image, ...), the independent ones concurrently.
+Only the missing ones are created. The ids of the resources are kept in a
+state file, destroy deletes them by id.
+
 """
 
 import argparse
+import collections
 import datetime
+import functools
+import json
 import os
 import sys
+import threading
 import unittest
 
 import yaml
 
 import tempest.auth
+from tempest.common.utils import parallel
 from tempest import config
 from tempest import exceptions
 from tempest.openstack.common import log as logging
 from tempest.openstack.common import timeutils
 from tempest.services.compute.json import flavors_client
+from tempest.services.compute.json import security_groups_client
 from tempest.services.compute.json import servers_client
 from tempest.services.identity.json import identity_client
 from tempest.services.image.v2.json import image_client
@@ -44,11 +55,26 @@ from tempest.services.volume.json import volumes_client
 OPTS = {}
 USERS = {}
 RES = {}
+STATE = None
+# OSClient by user name, '' is the admin
+CLIENTS = {}
+CLIENTS_LOCK = threading.Lock()
 
 LOG = None
 
 JAVELIN_START = datetime.datetime.utcnow()
 
+# How to list each resource type and the attribute holding the name
+LISTINGS = {
+    'tenants': (lambda c: c.identity.list_tenants()[1], 'name'),
+    'users': (lambda c: c.identity.get_users()[1], 'name'),
+    'images': (lambda c: c.images.image_list()[1], 'name'),
+    'servers': (lambda c: c.servers.list_servers()[1]['servers'], 'name'),
+    'flavors': (lambda c: c.flavors.list_flavors()[1], 'name'),
+    'secgroups': (lambda c: c.secgroups.list_security_groups()[1], 'name'),
+    'volumes': (lambda c: c.volumes.list_volumes()[1], 'display_name'),
+}
+
 
 class OSClient(object):
     _creds = None
@@ -56,6 +82,8 @@ class OSClient(object):
     servers = None
 
     def __init__(self, user, pw, tenant):
+        self._lock = threading.Lock()
+        self._listings = {}
         _creds = tempest.auth.KeystoneV2Credentials(
             username=user,
             password=pw,
@@ -69,6 +97,172 @@ class OSClient(object):
         self.flavors = flavors_client.FlavorsClientJSON(_auth)
         self.telemetry = telemetry_client.TelemetryClientJSON(_auth)
         self.volumes = volumes_client.VolumesClientJSON(_auth)
+        self.secgroups = security_groups_client.SecurityGroupsClientJSON(
+            _auth)
+
+    def find(self, kind, name):
+        """Look up a resource by name in the listing of its type.
+
+        The resources of a type are listed once, then the listing is
+        reused until resources of that type are created or deleted.
+        """
+        with self._lock:
+            if kind not in self._listings:
+                list_func, name_attr = LISTINGS[kind]
+                self._listings[kind] = dict(
+                    (item[name_attr], item) for item in list_func(self))
+            return self._listings[kind].get(name)
+
+    def forget(self, kind):
+        # NOTE: taking the lock waits for a listing in progress, which may
+        # have been served before the change
+        with self._lock:
+            self._listings.pop(kind, None)
+
+
+def changed(kind):
+    """Drop the listings of a resource type after creating or deleting."""
+    with CLIENTS_LOCK:
+        clients = CLIENTS.values()
+    for client in clients:
+        client.forget(kind)
+
+
+class ResourceGraph(object):
+    """Operations on resources, run along the dependencies between them.
+
+    An operation runs once the ones it depends on succeeded, operations
+    not depending on each other run concurrently. Operations depending on
+    a failed one are not run and are reported as failed too.
+    """
+
+    def __init__(self):
+        self._nodes = collections.OrderedDict()
+
+    def add(self, key, func, args=(), deps=()):
+        """Add an operation.
+
+        :param key: (resource type, name) tuple identifying the operation
+        :param deps: keys of the operations to run first, the ones which
+            are not in the graph are ignored
+        """
+        self._nodes[key] = (func, args, deps)
+
+    def _levels(self):
+        levels = {}
+
+        def _level(key):
+            if key not in levels:
+                deps = [d for d in self._nodes[key][2] if d in self._nodes]
+                levels[key] = 1 + max([_level(d) for d in deps] or [-1])
+            return levels[key]
+
+        by_level = collections.defaultdict(list)
+        for key in self._nodes:
+            by_level[_level(key)].append(key)
+        return [by_level[level] for level in sorted(by_level)]
+
+    def run(self, workers=parallel.DEFAULT_WORKERS):
+        failed = set()
+        outcomes = []
+        for keys in self._levels():
+            calls = []
+            for key in keys:
+                func, args, deps = self._nodes[key]
+                failed_deps = [' '.join(d) for d in deps if d in failed]
+                if failed_deps:
+                    failed.add(key)
+                    outcomes.append(parallel.Outcome(
+                        ' '.join(key), None, exceptions.TempestException(
+                            "not run, %s failed" % ', '.join(failed_deps))))
+                    continue
+                calls.append((key, func, args, None))
+            level_outcomes = parallel.run_concurrently(calls, workers=workers)
+            for outcome in level_outcomes:
+                if outcome.error is not None:
+                    failed.add(outcome.name)
+                outcomes.append(outcome._replace(name=' '.join(outcome.name)))
+        parallel.check_outcomes(outcomes)
+        return outcomes
+
+
+class JavelinState(object):
+    """Ids of the resources javelin manages, by resource type and name.
+
+    The file is written after every change, so that the next run knows
+    the ids even if this one fails.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._ids = {}
+        if os.path.exists(path):
+            with open(path) as state_file:
+                self._ids = json.load(state_file)
+
+    def get(self, kind, name):
+        with self._lock:
+            return self._ids.get(kind, {}).get(name)
+
+    def record(self, kind, name, resource_id):
+        with self._lock:
+            self._ids.setdefault(kind, {})[name] = resource_id
+            self._save()
+
+    def forget(self, kind, name):
+        with self._lock:
+            if self._ids.get(kind, {}).pop(name, None) is not None:
+                self._save()
+
+    def _save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as state_file:
+            json.dump(self._ids, state_file, indent=2, sort_keys=True)
+        os.rename(tmp_path, self.path)
+
+
+def _existing(client, kind, name):
+    """The id of the resource if it is in the listing, recorded as well."""
+    found = client.find(kind, name)
+    if found is None:
+        return None
+    STATE.record(kind, name, found['id'])
+    return found['id']
+
+
+def _resource_id(client, kind, name):
+    """The id of the resource in the state, else the one of the listing."""
+    resource_id = STATE.get(kind, name)
+    if resource_id is None:
+        found = client.find(kind, name)
+        resource_id = found and found['id']
+    return resource_id
+
+
+def _owner_client(kind, resource):
+    """The client of the owner of a resource to delete, if it exists."""
+    if resource['owner'] not in USERS:
+        LOG.warn("Owner of %s '%s' not found, it is not deleted" % (
+            kind, resource['name']))
+        return None
+    return client_for_user(resource['owner'])
+
+
+def _destroy(client, kind, name, delete, wait=None):
+    """Delete a resource by id, if it still exists, and forget it."""
+    resource_id = _resource_id(client, kind, name)
+    if resource_id is None:
+        LOG.info("%s '%s' does not exist" % (kind, name))
+        return
+    try:
+        delete(resource_id)
+        if wait is not None:
+            wait(resource_id)
+    except exceptions.NotFound:
+        pass
+    STATE.forget(kind, name)
+    changed(kind)
 
 
 def load_resources(fname):
@@ -76,16 +270,26 @@ def load_resources(fname):
     return yaml.load(open(fname, 'r'))
 
 
+def _cached_client(key, user, pw, tenant):
+    # the clients are reused, so is their token
+    with CLIENTS_LOCK:
+        if key not in CLIENTS:
+            CLIENTS[key] = OSClient(user, pw, tenant)
+        return CLIENTS[key]
+
+
 def keystone_admin():
-    return OSClient(OPTS.os_username, OPTS.os_password, OPTS.os_tenant_name)
+    return _cached_client('', OPTS.os_username, OPTS.os_password,
+                          OPTS.os_tenant_name)
 
 
 def client_for_user(name):
     LOG.debug("Entering client_for_user")
     if name in USERS:
         user = USERS[name]
-        LOG.debug("Created client for user %s" % user)
-        return OSClient(user['name'], user['pass'], user['tenant'])
+        LOG.debug("Client for user %s" % user)
+        return _cached_client(name, user['name'], user['pass'],
+                              user['tenant'])
     else:
         LOG.error("%s not found in USERS: %s" % (name, USERS))
 
@@ -96,26 +300,30 @@ def client_for_user(name):
 ###################
 
 
-def create_tenants(tenants):
-    """Create tenants from resource definition.
+def _get_tenant_by_name(name):
+    tenant = keystone_admin().find('tenants', name)
+    if tenant is None:
+        raise exceptions.NotFound('No such tenant %s' % name)
+    return tenant
+
 
-    Don't create the tenants if they already exist.
+def create_tenant(tenant):
+    """Create a tenant from resource definition.
+
+    Don't create the tenant if it already exists.
     """
     admin = keystone_admin()
-    _, body = admin.identity.list_tenants()
-    existing = [x['name'] for x in body]
-    for tenant in tenants:
-        if tenant not in existing:
-            admin.identity.create_tenant(tenant)
-        else:
-            LOG.warn("Tenant '%s' already exists in this environment" % tenant)
+    if _existing(admin, 'tenants', tenant):
+        LOG.info("Tenant '%s' already exists in this environment" % tenant)
+        return
+    _, body = admin.identity.create_tenant(tenant)
+    STATE.record('tenants', tenant, body['id'])
+    changed('tenants')
 
 
-def destroy_tenants(tenants):
+def destroy_tenant(tenant):
     admin = keystone_admin()
-    for tenant in tenants:
-        tenant_id = admin.identity.get_tenant_by_name(tenant)['id']
-        r, body = admin.identity.delete_tenant(tenant_id)
+    _destroy(admin, 'tenants', tenant, admin.identity.delete_tenant)
 
 ##############
 #
@@ -141,6 +349,13 @@ def _tenants_from_users(users):
     return tenants
 
 
+def _get_user_by_name(name):
+    user = keystone_admin().find('users', name)
+    if user is None:
+        raise exceptions.NotFound('No such user %s' % name)
+    return user
+
+
 def _assign_swift_role(user):
     admin = keystone_admin()
     resp, roles = admin.identity.list_roles()
@@ -156,50 +371,90 @@ def _assign_swift_role(user):
         pass
 
 
-def create_users(users):
-    """Create tenants from resource definition.
+def create_user(u):
+    """Create a user from resource definition, and collect it.
 
-    Don't create the tenants if they already exist.
+    Don't create the user if it already exists.
     """
-    global USERS
-    LOG.info("Creating users")
     admin = keystone_admin()
-    for u in users:
-        try:
-            tenant = admin.identity.get_tenant_by_name(u['tenant'])
-        except exceptions.NotFound:
-            LOG.error("Tenant: %s - not found" % u['tenant'])
-            continue
-        try:
-            admin.identity.get_user_by_username(tenant['id'], u['name'])
-            LOG.warn("User '%s' already exists in this environment"
-                     % u['name'])
-        except exceptions.NotFound:
-            admin.identity.create_user(
-                u['name'], u['pass'], tenant['id'],
-                "%s@%s" % (u['name'], tenant['id']),
-                enabled=True)
+    tenant = _get_tenant_by_name(u['tenant'])
+    if _existing(admin, 'users', u['name']):
+        LOG.info("User '%s' already exists in this environment"
+                 % u['name'])
+    else:
+        _, body = admin.identity.create_user(
+            u['name'], u['pass'], tenant['id'],
+            "%s@%s" % (u['name'], tenant['id']),
+            enabled=True)
+        STATE.record('users', u['name'], body['id'])
+        changed('users')
+    collect_user(u)
 
 
-def destroy_users(users):
+def destroy_user(user):
     admin = keystone_admin()
-    for user in users:
-        tenant_id = admin.identity.get_tenant_by_name(user['tenant'])['id']
-        user_id = admin.identity.get_user_by_username(tenant_id,
-                                                      user['name'])['id']
-        r, body = admin.identity.delete_user(user_id)
+    _destroy(admin, 'users', user['name'], admin.identity.delete_user)
+
+
+def collect_user(u):
+    u['tenant_id'] = _get_tenant_by_name(u['tenant'])['id']
+    u['id'] = _get_user_by_name(u['name'])['id']
+    USERS[u['name']] = u
 
 
-def collect_users(users):
-    global USERS
+def collect_users(users, missing_ok=False):
     LOG.info("Collecting users")
-    admin = keystone_admin()
     for u in users:
-        tenant = admin.identity.get_tenant_by_name(u['tenant'])
-        u['tenant_id'] = tenant['id']
-        USERS[u['name']] = u
-        body = admin.identity.get_user_by_username(tenant['id'], u['name'])
-        USERS[u['name']]['id'] = body['id']
+        try:
+            collect_user(u)
+        except exceptions.NotFound:
+            if not missing_ok:
+                raise
+            LOG.info("User '%s' does not exist" % u['name'])
+
+###################
+#
+# SECURITY GROUPS
+#
+###################
+
+
+def _secgroup_rule(rule):
+    """The (protocol, from port, to port, cidr) of an existing rule."""
+    return (rule['ip_protocol'], str(rule['from_port']),
+            str(rule['to_port']), rule['ip_range'].get('cidr'))
+
+
+def create_secgroup(secgroup):
+    client = client_for_user(secgroup['owner'])
+    secgroup_id = _existing(client, 'secgroups', secgroup['name'])
+    existing_rules = set()
+    if secgroup_id:
+        LOG.info("Security group '%s' already exists" % secgroup['name'])
+        # NOTE: the group may have been created by a run which failed
+        # before adding all its rules
+        _, body = client.secgroups.get_security_group(secgroup_id)
+        existing_rules.update(_secgroup_rule(rule)
+                              for rule in body['rules'])
+    else:
+        _, body = client.secgroups.create_security_group(
+            secgroup['name'], secgroup.get('description', secgroup['name']))
+        secgroup_id = body['id']
+        STATE.record('secgroups', secgroup['name'], secgroup_id)
+        changed('secgroups')
+    for rule in secgroup.get('rules') or []:
+        ip_proto, from_port, to_port, cidr = rule.split()
+        if (ip_proto, from_port, to_port, cidr) in existing_rules:
+            continue
+        client.secgroups.create_security_group_rule(
+            secgroup_id, ip_proto, from_port, to_port, cidr=cidr)
+
+
+def destroy_secgroup(secgroup):
+    client = _owner_client('secgroups', secgroup)
+    if client is not None:
+        _destroy(client, 'secgroups', secgroup['name'],
+                 client.secgroups.delete_security_group)
 
 
 class JavelinCheck(unittest.TestCase):
@@ -212,66 +467,87 @@ class JavelinCheck(unittest.TestCase):
         pass
 
     def check(self):
-        self.check_users()
-        self.check_objects()
-        self.check_servers()
-        self.check_volumes()
-        self.check_telemetry()
+        """Check every resource, concurrently.
+
+        All the failed checks are reported in a single failure.
+        """
+        calls = []
+        for check_func in (self.check_users, self.check_objects,
+                           self.check_servers, self.check_volumes,
+                           self.check_telemetry):
+            calls.extend(check_func())
+        outcomes = parallel.run_concurrently(calls, workers=OPTS.workers)
+        failures = ["%s: %s" % (o.name, o.error) for o in outcomes
+                    if o.error is not None]
+        if failures:
+            self.fail("%d of %d checks failed:\n%s" % (
+                len(failures), len(outcomes), '\n'.join(failures)))
 
     def check_users(self):
         """Check that the users we expect to exist, do.
 
         We don't use the resource list for this because we need to validate
         that things like tenantId didn't drift across versions.
+
+        :return: the calls checking each user
         """
         LOG.info("checking users")
-        for name, user in self.users.iteritems():
-            client = keystone_admin()
-            _, found = client.identity.get_user(user['id'])
-            self.assertEqual(found['name'], user['name'])
-            self.assertEqual(found['tenantId'], user['tenant_id'])
-
-            # also ensure we can auth with that user, and do something
-            # on the cloud. We don't care about the results except that it
-            # remains authorized.
-            client = client_for_user(user['name'])
-            resp, body = client.servers.list_servers()
-            self.assertEqual(resp['status'], '200')
+        return [('user %s' % name, self._check_user, (user,), None)
+                for name, user in self.users.iteritems()]
+
+    def _check_user(self, user):
+        client = keystone_admin()
+        _, found = client.identity.get_user(user['id'])
+        self.assertEqual(found['name'], user['name'])
+        self.assertEqual(found['tenantId'], user['tenant_id'])
+
+        # also ensure we can auth with that user, and do something
+        # on the cloud. We don't care about the results except that it
+        # remains authorized.
+        client = client_for_user(user['name'])
+        resp, body = client.servers.list_servers()
+        self.assertEqual(resp['status'], '200')
 
     def check_objects(self):
         """Check that the objects created are still there."""
         if not self.res.get('objects'):
-            return
+            return []
         LOG.info("checking objects")
-        for obj in self.res['objects']:
-            client = client_for_user(obj['owner'])
-            r, contents = client.objects.get_object(
-                obj['container'], obj['name'])
-            source = _file_contents(obj['file'])
-            self.assertEqual(contents, source)
+        return [('object %s' % obj['name'], self._check_object, (obj,), None)
+                for obj in self.res['objects']]
+
+    def _check_object(self, obj):
+        client = client_for_user(obj['owner'])
+        r, contents = client.objects.get_object(
+            obj['container'], obj['name'])
+        source = _file_contents(obj['file'])
+        self.assertEqual(contents, source)
 
     def check_servers(self):
         """Check that the servers are still up and running."""
         if not self.res.get('servers'):
-            return
+            return []
         LOG.info("checking servers")
-        for server in self.res['servers']:
-            client = client_for_user(server['owner'])
-            found = _get_server_by_name(client, server['name'])
-            self.assertIsNotNone(
-                found,
-                "Couldn't find expected server %s" % server['name'])
-
-            r, found = client.servers.get_server(found['id'])
-            # get the ipv4 address
-            addr = found['addresses']['private'][0]['addr']
-            for count in range(60):
-                return_code = os.system("ping -c1 " + addr)
-                if return_code is 0:
-                    break
-            self.assertNotEqual(count, 59,
-                                "Server %s is not pingable at %s" % (
-                                    server['name'], addr))
+        return [('server %s' % server['name'], self._check_server, (server,),
+                 None) for server in self.res['servers']]
+
+    def _check_server(self, server):
+        client = client_for_user(server['owner'])
+        found = _get_server_by_name(client, server['name'])
+        self.assertIsNotNone(
+            found,
+            "Couldn't find expected server %s" % server['name'])
+
+        r, found = client.servers.get_server(found['id'])
+        # get the ipv4 address
+        addr = found['addresses']['private'][0]['addr']
+        for count in range(60):
+            return_code = os.system("ping -c1 " + addr)
+            if return_code is 0:
+                break
+        self.assertNotEqual(count, 59,
+                            "Server %s is not pingable at %s" % (
+                                server['name'], addr))
 
     def check_telemetry(self):
         """Check that ceilometer provides a sane sample.
@@ -283,33 +559,42 @@ class JavelinCheck(unittest.TestCase):
         before the upgrade.
         """
         LOG.info("checking telemetry")
-        for server in self.res['servers']:
-            client = client_for_user(server['owner'])
-            response, body = client.telemetry.list_samples(
-                'instance',
-                query=('metadata.display_name', 'eq', server['name'])
-            )
-            self.assertEqual(response.status, 200)
-            self.assertTrue(len(body) >= 1, 'expecting at least one sample')
-            self._confirm_telemetry_sample(server, body[-1])
+        return [('telemetry of %s' % server['name'], self._check_telemetry,
+                 (server,), None) for server in self.res['servers']]
+
+    def _check_telemetry(self, server):
+        client = client_for_user(server['owner'])
+        response, body = client.telemetry.list_samples(
+            'instance',
+            query=('metadata.display_name', 'eq', server['name'])
+        )
+        self.assertEqual(response.status, 200)
+        self.assertTrue(len(body) >= 1, 'expecting at least one sample')
+        self._confirm_telemetry_sample(server, body[-1])
 
     def check_volumes(self):
         """Check that the volumes are still there and attached."""
         if not self.res.get('volumes'):
-            return
+            return []
         LOG.info("checking volumes")
-        for volume in self.res['volumes']:
-            client = client_for_user(volume['owner'])
-            vol_body = _get_volume_by_name(client, volume['name'])
-            self.assertIsNotNone(
-                vol_body,
-                "Couldn't find expected volume %s" % volume['name'])
-
-            # Verify that a volume's attachment retrieved
-            server_id = _get_server_by_name(client, volume['server'])['id']
-            attachment = client.volumes.get_attachment_from_volume(vol_body)
-            self.assertEqual(vol_body['id'], attachment['volume_id'])
-            self.assertEqual(server_id, attachment['server_id'])
+        return [('volume %s' % volume['name'], self._check_volume, (volume,),
+                 None) for volume in self.res['volumes']]
+
+    def _check_volume(self, volume):
+        client = client_for_user(volume['owner'])
+        volume_id = _resource_id(client, 'volumes', volume['name'])
+        self.assertIsNotNone(
+            volume_id,
+            "Couldn't find expected volume %s" % volume['name'])
+        # NOTE: the volume is fetched by id, the listing was cached before
+        # the volume got attached
+        _, vol_body = client.volumes.get_volume(volume_id)
+
+        # Verify that a volume's attachment retrieved
+        server_id = _get_server_by_name(client, volume['server'])['id']
+        attachment = client.volumes.get_attachment_from_volume(vol_body)
+        self.assertEqual(vol_body['id'], attachment['volume_id'])
+        self.assertEqual(server_id, attachment['server_id'])
 
     def _confirm_telemetry_sample(self, server, sample):
         """Check this sample matches the expected resource metadata."""
@@ -344,26 +629,36 @@ def _file_contents(fname):
         return f.read()
 
 
-def create_objects(objects):
-    if not objects:
-        return
-    LOG.info("Creating objects")
-    for obj in objects:
-        LOG.debug("Object %s" % obj)
-        _assign_swift_role(obj['owner'])
-        client = client_for_user(obj['owner'])
-        client.containers.create_container(obj['container'])
-        client.objects.create_object(
-            obj['container'], obj['name'],
-            _file_contents(obj['file']))
+def create_object(obj):
+    """Create an object, its owner has the swift role already."""
+    LOG.debug("Object %s" % obj)
+    client = client_for_user(obj['owner'])
+    client.containers.create_container(obj['container'])
+    client.objects.create_object(
+        obj['container'], obj['name'],
+        _file_contents(obj['file']))
 
 
-def destroy_objects(objects):
-    for obj in objects:
-        client = client_for_user(obj['owner'])
+def destroy_object(obj):
+    client = _owner_client('objects', obj)
+    if client is None:
+        return
+    try:
         r, body = client.objects.delete_object(obj['container'], obj['name'])
-        if not (200 <= int(r['status']) < 299):
-            raise ValueError("unable to destroy object: [%s] %s" % (r, body))
+    except exceptions.NotFound:
+        return
+    if not (200 <= int(r['status']) < 299):
+        raise ValueError("unable to destroy object: [%s] %s" % (r, body))
+
+
+def destroy_container(owner, container):
+    client = _owner_client('containers', {'owner': owner, 'name': container})
+    if client is None:
+        return
+    try:
+        client.containers.delete_container(container)
+    except exceptions.NotFound:
+        pass
 
 
 #######################
@@ -380,59 +675,57 @@ def _resolve_image(image, imgtype):
 
 
 def _get_image_by_name(client, name):
-    r, body = client.images.image_list()
-    for image in body:
-        if name == image['name']:
-            return image
-    return None
+    return client.find('images', name)
+
+
+def _image_names(image):
+    """The names of the image, and of its kernel and ramdisk if any."""
+    names = [image['name']]
+    if image['format'] == 'ami':
+        names.extend('javelin_' + image[imgtype] for imgtype in ('aki', 'ari'))
+    return names
+
+
+def _upload_image(client, name, fmt, fname, **extras):
+    # only upload a new image if the name isn't there
+    image_id = _existing(client, 'images', name)
+    if image_id:
+        LOG.info("Image '%s' already exists" % name)
+        return image_id
+    r, body = client.images.create_image(name, fmt, fmt, **extras)
+    image_id = body.get('id')
+    STATE.record('images', name, image_id)
+    client.images.store_image(image_id, open(fname, 'r'))
+    changed('images')
+    return image_id
+
+
+def create_image(image):
+    client = client_for_user(image['owner'])
+    if _existing(client, 'images', image['name']):
+        LOG.info("Image '%s' already exists" % image['name'])
+        return
 
+    # special handling for 3 part image
+    extras = {}
+    if image['format'] == 'ami':
+        name, fname = _resolve_image(image, 'aki')
+        extras['kernel_id'] = _upload_image(client, 'javelin_' + name,
+                                            'aki', fname)
+        name, fname = _resolve_image(image, 'ari')
+        extras['ramdisk_id'] = _upload_image(client, 'javelin_' + name,
+                                             'ari', fname)
 
-def create_images(images):
-    if not images:
-        return
-    LOG.info("Creating images")
-    for image in images:
-        client = client_for_user(image['owner'])
+    _, fname = _resolve_image(image, 'file')
+    _upload_image(client, image['name'], image['format'], fname, **extras)
 
-        # only upload a new image if the name isn't there
-        if _get_image_by_name(client, image['name']):
-            LOG.info("Image '%s' already exists" % image['name'])
-            continue
 
-        # special handling for 3 part image
-        extras = {}
-        if image['format'] == 'ami':
-            name, fname = _resolve_image(image, 'aki')
-            r, aki = client.images.create_image(
-                'javelin_' + name, 'aki', 'aki')
-            client.images.store_image(aki.get('id'), open(fname, 'r'))
-            extras['kernel_id'] = aki.get('id')
-
-            name, fname = _resolve_image(image, 'ari')
-            r, ari = client.images.create_image(
-                'javelin_' + name, 'ari', 'ari')
-            client.images.store_image(ari.get('id'), open(fname, 'r'))
-            extras['ramdisk_id'] = ari.get('id')
-
-        _, fname = _resolve_image(image, 'file')
-        r, body = client.images.create_image(
-            image['name'], image['format'], image['format'], **extras)
-        image_id = body.get('id')
-        client.images.store_image(image_id, open(fname, 'r'))
-
-
-def destroy_images(images):
-    if not images:
+def destroy_image(image):
+    client = _owner_client('images', image)
+    if client is None:
         return
-    LOG.info("Destroying images")
-    for image in images:
-        client = client_for_user(image['owner'])
-
-        response = _get_image_by_name(client, image['name'])
-        if not response:
-            LOG.info("Image '%s' does not exists" % image['name'])
-            continue
-        client.images.delete_image(response['id'])
+    for name in _image_names(image):
+        _destroy(client, 'images', name, client.images.delete_image)
 
 
 #######################
@@ -442,55 +735,37 @@ def destroy_images(images):
 #######################
 
 def _get_server_by_name(client, name):
-    r, body = client.servers.list_servers()
-    for server in body['servers']:
-        if name == server['name']:
-            return server
-    return None
+    return client.find('servers', name)
 
 
 def _get_flavor_by_name(client, name):
-    r, body = client.flavors.list_flavors()
-    for flavor in body:
-        if name == flavor['name']:
-            return flavor
-    return None
-
-
-def create_servers(servers):
-    if not servers:
-        return
-    LOG.info("Creating servers")
-    for server in servers:
-        client = client_for_user(server['owner'])
-
-        if _get_server_by_name(client, server['name']):
-            LOG.info("Server '%s' already exists" % server['name'])
-            continue
+    return client.find('flavors', name)
 
-        image_id = _get_image_by_name(client, server['image'])['id']
-        flavor_id = _get_flavor_by_name(client, server['flavor'])['id']
-        resp, body = client.servers.create_server(server['name'], image_id,
-                                                  flavor_id)
-        server_id = body['id']
-        client.servers.wait_for_server_status(server_id, 'ACTIVE')
 
+def create_server(server):
+    client = client_for_user(server['owner'])
 
-def destroy_servers(servers):
-    if not servers:
+    if _existing(client, 'servers', server['name']):
+        LOG.info("Server '%s' already exists" % server['name'])
         return
-    LOG.info("Destroying servers")
-    for server in servers:
-        client = client_for_user(server['owner'])
 
-        response = _get_server_by_name(client, server['name'])
-        if not response:
-            LOG.info("Server '%s' does not exist" % server['name'])
-            continue
+    image_id = _get_image_by_name(client, server['image'])['id']
+    flavor_id = _get_flavor_by_name(client, server['flavor'])['id']
+    resp, body = client.servers.create_server(server['name'], image_id,
+                                              flavor_id)
+    server_id = body['id']
+    STATE.record('servers', server['name'], server_id)
+    changed('servers')
+    client.servers.wait_for_server_status(server_id, 'ACTIVE')
 
-        client.servers.delete_server(response['id'])
-        client.servers.wait_for_server_termination(response['id'],
-                                                   ignore_error=True)
+
+def destroy_server(server):
+    client = _owner_client('servers', server)
+    if client is not None:
+        _destroy(client, 'servers', server['name'],
+                 client.servers.delete_server,
+                 functools.partial(client.servers.wait_for_server_termination,
+                                   ignore_error=True))
 
 
 #######################
@@ -500,44 +775,60 @@ def destroy_servers(servers):
 #######################
 
 def _get_volume_by_name(client, name):
-    r, body = client.volumes.list_volumes()
-    for volume in body:
-        if name == volume['display_name']:
-            return volume
-    return None
+    return client.find('volumes', name)
 
 
-def create_volumes(volumes):
-    for volume in volumes:
-        client = client_for_user(volume['owner'])
+def create_volume(volume):
+    client = client_for_user(volume['owner'])
 
-        # only create a volume if the name isn't here
-        if _get_volume_by_name(client, volume['name']):
-            LOG.info("volume '%s' already exists" % volume['name'])
-            continue
+    # only create a volume if the name isn't here
+    if _existing(client, 'volumes', volume['name']):
+        LOG.info("volume '%s' already exists" % volume['name'])
+        return
 
-        size = volume['gb']
-        v_name = volume['name']
-        resp, body = client.volumes.create_volume(size=size,
-                                                  display_name=v_name)
-        client.volumes.wait_for_volume_status(body['id'], 'available')
+    size = volume['gb']
+    v_name = volume['name']
+    resp, body = client.volumes.create_volume(size=size,
+                                              display_name=v_name)
+    STATE.record('volumes', v_name, body['id'])
+    changed('volumes')
+    client.volumes.wait_for_volume_status(body['id'], 'available')
 
 
-def destroy_volumes(volumes):
-    for volume in volumes:
-        client = client_for_user(volume['owner'])
-        volume_id = _get_volume_by_name(client, volume['name'])['id']
-        client.volumes.detach_volume(volume_id)
-        client.volumes.delete_volume(volume_id)
+def detach_volume(volume):
+    client = _owner_client('volumes', volume)
+    volume_id = client and _resource_id(client, 'volumes', volume['name'])
+    if not volume_id:
+        return
+    try:
+        _, body = client.volumes.get_volume(volume_id)
+        if body['attachments']:
+            client.volumes.detach_volume(volume_id)
+            client.volumes.wait_for_volume_status(volume_id, 'available')
+    except exceptions.NotFound:
+        pass
 
 
-def attach_volumes(volumes):
-    for volume in volumes:
-        client = client_for_user(volume['owner'])
-        server_id = _get_server_by_name(client, volume['server'])['id']
-        volume_id = _get_volume_by_name(client, volume['name'])['id']
-        device = volume['device']
-        client.volumes.attach_volume(volume_id, server_id, device)
+def destroy_volume(volume):
+    client = _owner_client('volumes', volume)
+    if client is not None:
+        _destroy(client, 'volumes', volume['name'],
+                 client.volumes.delete_volume,
+                 client.volumes.wait_for_resource_deletion)
+
+
+def attach_volume(volume):
+    client = client_for_user(volume['owner'])
+    volume_id = _resource_id(client, 'volumes', volume['name'])
+    _, found = client.volumes.get_volume(volume_id)
+    if found['attachments']:
+        LOG.info("volume '%s' is already attached" % volume['name'])
+        return
+    server_id = _get_server_by_name(client, volume['server'])['id']
+    device = volume['device']
+    client.volumes.attach_volume(volume_id, server_id, device)
+    client.volumes.wait_for_volume_status(volume_id, 'in-use')
+    changed('volumes')
 
 
 #######################
@@ -546,32 +837,95 @@ def attach_volumes(volumes):
 #
 #######################
 
+def build_resource_graph(res):
+    """The creation of the resources and the dependencies between them."""
+    graph = ResourceGraph()
+    # keystone level resources first, and we need to be admin for those.
+    for tenant in res.get('tenants') or []:
+        graph.add(('tenant', tenant), create_tenant, (tenant,))
+    for user in res.get('users') or []:
+        graph.add(('user', user['name']), create_user, (user,),
+                  deps=[('tenant', user['tenant'])])
+    for secgroup in res.get('secgroups') or []:
+        graph.add(('secgroup', secgroup['name']), create_secgroup,
+                  (secgroup,), deps=[('user', secgroup['owner'])])
+    for obj in res.get('objects') or []:
+        owner = ('user', obj['owner'])
+        graph.add(('swift role', obj['owner']), _assign_swift_role,
+                  (obj['owner'],), deps=[owner])
+        graph.add(('object', obj['name']), create_object, (obj,),
+                  deps=[('swift role', obj['owner'])])
+    for image in res.get('images') or []:
+        graph.add(('image', image['name']), create_image, (image,),
+                  deps=[('user', image['owner'])])
+    for server in res.get('servers') or []:
+        graph.add(('server', server['name']), create_server, (server,),
+                  deps=[('user', server['owner']),
+                        ('image', server['image'])])
+    for volume in res.get('volumes') or []:
+        graph.add(('volume', volume['name']), create_volume, (volume,),
+                  deps=[('user', volume['owner'])])
+        graph.add(('attachment', volume['name']), attach_volume, (volume,),
+                  deps=[('volume', volume['name']),
+                        ('server', volume['server'])])
+    return graph
+
+
 def create_resources():
     LOG.info("Creating Resources")
-    # first create keystone level resources, and we need to be admin
-    # for those.
-    create_tenants(RES['tenants'])
-    create_users(RES['users'])
-    collect_users(RES['users'])
+    build_resource_graph(RES).run(workers=OPTS.workers)
+
 
-    # next create resources in a well known order
-    create_objects(RES['objects'])
-    create_images(RES['images'])
-    create_servers(RES['servers'])
-    create_volumes(RES['volumes'])
-    attach_volumes(RES['volumes'])
+def build_destroy_graph(res):
+    """The deletion of the resources, in the inverse order of creation."""
+    graph = ResourceGraph()
+    # everything a user owns is deleted before the user
+    owned = collections.defaultdict(list)
+    volumes = res.get('volumes') or []
+    servers = res.get('servers') or []
+    for volume in volumes:
+        detachment = ('detachment', volume['name'])
+        graph.add(detachment, detach_volume, (volume,))
+        graph.add(('volume', volume['name']), destroy_volume, (volume,),
+                  deps=[detachment])
+        owned[volume['owner']].append(('volume', volume['name']))
+    for server in servers:
+        graph.add(('server', server['name']), destroy_server, (server,),
+                  deps=[('detachment', v['name']) for v in volumes
+                        if v['server'] == server['name']])
+        owned[server['owner']].append(('server', server['name']))
+    for image in res.get('images') or []:
+        graph.add(('image', image['name']), destroy_image, (image,),
+                  deps=[('server', s['name']) for s in servers
+                        if s['image'] == image['name']])
+        owned[image['owner']].append(('image', image['name']))
+    for secgroup in res.get('secgroups') or []:
+        graph.add(('secgroup', secgroup['name']), destroy_secgroup,
+                  (secgroup,), deps=[('server', s['name']) for s in servers
+                                     if s['owner'] == secgroup['owner']])
+        owned[secgroup['owner']].append(('secgroup', secgroup['name']))
+    containers = collections.defaultdict(list)
+    for obj in res.get('objects') or []:
+        graph.add(('object', obj['name']), destroy_object, (obj,))
+        containers[(obj['owner'], obj['container'])].append(
+            ('object', obj['name']))
+    for (owner, container), objects in containers.items():
+        graph.add(('container', container), destroy_container,
+                  (owner, container), deps=objects)
+        owned[owner].append(('container', container))
+    for user in res.get('users') or []:
+        graph.add(('user', user['name']), destroy_user, (user,),
+                  deps=owned[user['name']])
+    for tenant in res.get('tenants') or []:
+        graph.add(('tenant', tenant), destroy_tenant, (tenant,),
+                  deps=[('user', u['name']) for u in res.get('users') or []
+                        if u['tenant'] == tenant])
+    return graph
 
 
 def destroy_resources():
     LOG.info("Destroying Resources")
-    # Destroy in inverse order of create
-    destroy_servers(RES['servers'])
-    destroy_images(RES['images'])
-    destroy_objects(RES['objects'])
-    destroy_volumes(RES['volumes'])
-    destroy_users(RES['users'])
-    destroy_tenants(RES['tenants'])
-    LOG.warn("Destroy mode incomplete")
+    build_destroy_graph(RES).run(workers=OPTS.workers)
 
 
 def get_options():
@@ -596,6 +950,17 @@ def get_options():
         '-c', '--config-file',
         metavar='/etc/tempest.conf',
         help='path to javelin2(tempest) config file')
+    parser.add_argument(
+        '-s', '--state-file',
+        metavar='javelin_state.json',
+        help='File keeping the ids of the resources, defaults to the '
+             'name of the resources file with a .state.json extension, in '
+             'the working directory')
+    parser.add_argument(
+        '-w', '--workers',
+        type=int,
+        default=parallel.DEFAULT_WORKERS,
+        help='Number of resources created or checked at the same time')
 
     # auth bits, letting us also just source the devstack openrc
     parser.add_argument('--os-username',
@@ -618,6 +983,11 @@ def get_options():
         sys.exit(1)
     if OPTS.config_file:
         config.CONF.set_config_path(OPTS.config_file)
+    if not OPTS.state_file:
+        # NOTE: not next to the resources file, it can be in a read-only
+        # installation directory
+        OPTS.state_file = '%s.state.json' % os.path.splitext(
+            os.path.basename(OPTS.resources))[0]
 
 
 def setup_logging():
@@ -628,9 +998,11 @@ def setup_logging():
 
 def main():
     global RES
+    global STATE
     get_options()
     setup_logging()
     RES = load_resources(OPTS.resources)
+    STATE = JavelinState(OPTS.state_file)
 
     if OPTS.mode == 'create':
         create_resources()
@@ -642,7 +1014,8 @@ def main():
         checker = JavelinCheck(USERS, RES)
         checker.check()
     elif OPTS.mode == 'destroy':
-        collect_users(RES['users'])
+        # the users may be gone already if a previous destroy failed
+        collect_users(RES['users'], missing_ok=True)
         destroy_resources()
     else:
         LOG.error('Unknown mode %s' % OPTS.mode)
@@ -26,9 +26,12 @@ except ImportError:
 
 from testtools import testsuite
 
+from tempest import config
 from tempest.openstack.common import log as logging
+from tempest.stress import distributed
 from tempest.stress import driver
 
+CONF = config.CONF
 LOG = logging.getLogger(__name__)
 
 
@@ -90,6 +93,24 @@ parser.add_argument('-i', '--call-inherited', action='store_true',
                     help="Call also inherited function with stress attribute")
 group.add_argument('-t', "--tests", nargs='?',
                    help="Name of the file with test description")
+parser.add_argument('-m', '--metrics',
+                    help="Append statistics snapshots to this file, as CSV "
+                    "if its name ends with .csv, as JSON lines otherwise")
+parser.add_argument('--agents',
+                    help="Comma separated HOST:PORT of tempest-stress-agent "
+                    "processes to run the tests on, instead of running "
+                    "them locally")
+parser.add_argument('--local-agents', type=int,
+                    help="Run the tests on this number of agents started "
+                    "on the local host")
+parser.add_argument('-r', '--report',
+                    help="Append a summary of the run to this file, as HTML "
+                    "if its name ends with .html, as text otherwise")
+
+
+def _parse_address(address):
+    host, _, port = address.rpartition(':')
+    return host, int(port)
 
 
 def main():
@@ -101,12 +122,34 @@ def main():
         tests = discover_stress_tests(filter_attr=ns.type,
                                       call_inherited=ns.call_inherited)
 
+    if ns.agents or ns.local_agents:
+        if ns.agents:
+            token = CONF.stress.agent_token
+            if not token:
+                LOG.error("[stress] agent_token must be set to use agents")
+                return 1
+            addresses = [_parse_address(a) for a in ns.agents.split(',')]
+            agents = []
+        else:
+            token = distributed.new_token()
+            addresses, agents = distributed.start_local_agents(
+                ns.local_agents, token)
+        coordinator = distributed.Coordinator(addresses, token)
+        try:
+            return coordinator.run(tests, ns.duration, ns.number, ns.stop,
+                                   ns.metrics, ns.report)
+        finally:
+            for agent in agents:
+                agent.join()
+
     if ns.serial:
         for test in tests:
             step_result = driver.stress_openstack([test],
                                                   ns.duration,
                                                   ns.number,
-                                                  ns.stop)
+                                                  ns.stop,
+                                                  ns.metrics,
+                                                  ns.report)
             # NOTE(mkoderer): we just save the last result code
             if (step_result != 0):
                 result = step_result
@@ -116,7 +159,9 @@ def main():
         result = driver.stress_openstack(tests,
                                          ns.duration,
                                          ns.number,
-                                         ns.stop)
+                                         ns.stop,
+                                         ns.metrics,
+                                         ns.report)
     return result
 
 
@@ -0,0 +1,63 @@
+# Copyright 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Agent of distributed stress runs
+
+Runs the stress test workers on the host it is started on, on behalf of
+run-tempest-stress started with --agents HOST:PORT. It uses the tempest.conf
+of its host, whose [stress] agent_token must match the coordinator's one.
+"""
+
+import argparse
+import socket
+import sys
+
+from tempest import config
+from tempest.openstack.common import log as logging
+from tempest.stress import distributed
+
+CONF = config.CONF
+LOG = logging.getLogger(__name__)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Run a stress test agent')
+    parser.add_argument('--host', default='127.0.0.1',
+                        help="Address to listen on, the coordinator must "
+                        "be able to reach it")
+    parser.add_argument('--port', type=int, default=distributed.DEFAULT_PORT,
+                        help="Port to listen on")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if not CONF.stress.agent_token:
+        LOG.error("[stress] agent_token must be set to run an agent")
+        return 1
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((args.host, args.port))
+    listener.listen(1)
+    LOG.info("Stress agent listening on %s:%s" % (args.host, args.port))
+    distributed.Agent(listener, CONF.stress.agent_token).serve()
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        sys.exit(0)
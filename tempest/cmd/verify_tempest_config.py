@@ -18,18 +18,40 @@ import argparse
 import json
 import os
 import sys
+import threading
 import urlparse
 
 import httplib2
 from six import moves
 
 from tempest import clients
+from tempest.common.utils import parallel
 from tempest import config
 
 
 CONF = config.CONF
-RAW_HTTP = httplib2.Http()
 CONF_PARSER = None
+CONF_PARSER_LOCK = threading.Lock()
+# Set once the updated config file is written, see write_config
+CONF_PARSER_WRITTEN = False
+DEFAULT_PROBE_TIMEOUT = 60
+
+
+class _RawHttp(object):
+    """httplib2.Http is not thread safe, each probe thread gets its own."""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def request(self, *args, **kwargs):
+        http = getattr(self._local, 'http', None)
+        if http is None:
+            http = self._local.http = httplib2.Http()
+        return http.request(*args, **kwargs)
+
+
+RAW_HTTP = _RawHttp()
+_probe_output = threading.local()
 
 
 def _get_config_file():
@@ -44,15 +66,37 @@ def _get_config_file():
     return fd
 
 
+def _print(message):
+    """Print the message, or keep it if called by a concurrent probe."""
+    lines = getattr(_probe_output, 'lines', None)
+    if lines is None:
+        print(message)
+    else:
+        lines.append(message)
+
+
 def change_option(option, group, value):
-    if not CONF_PARSER.has_section(group):
-        CONF_PARSER.add_section(group)
-    CONF_PARSER.set(group, option, str(value))
+    with CONF_PARSER_LOCK:
+        # NOTE: a probe which timed out can still be running once the
+        # config file is written, its late changes are dropped
+        if CONF_PARSER_WRITTEN:
+            return
+        if not CONF_PARSER.has_section(group):
+            CONF_PARSER.add_section(group)
+        CONF_PARSER.set(group, option, str(value))
+
+
+def write_config(outfile):
+    """Write the updated config file, no option is changed after that."""
+    global CONF_PARSER_WRITTEN
+    with CONF_PARSER_LOCK:
+        CONF_PARSER_WRITTEN = True
+        CONF_PARSER.write(outfile)
 
 
 def print_and_or_update(option, group, value, update):
-    print('Config option %s in group %s should be changed to: %s'
-          % (option, group, value))
+    _print('Config option %s in group %s should be changed to: %s'
+           % (option, group, value))
     if update:
         change_option(option, group, value)
 
@@ -250,10 +294,14 @@ def check_service_availability(os, update):
         'messaging': 'zaqar',
         'database': 'trove'
     }
-    # Get catalog list for endpoints to use for validation
+    # Get catalog list for endpoints to use for validation, the endpoints
+    # of a service in several regions share the same service
     __, endpoints = os.endpoints_client.list_endpoints()
-    for endpoint in endpoints:
-        __, service = os.service_client.get_service(endpoint['service_id'])
+    service_ids = set(endpoint['service_id'] for endpoint in endpoints)
+    calls = [(service_id, os.service_client.get_service, (service_id,), None)
+             for service_id in service_ids]
+    for outcome in parallel.run_concurrently(calls, raise_on_error=True):
+        __, service = outcome.result
         services.append(service['type'])
     # Pull all catalog types from config file and compare against endpoint list
     for cfgname in dir(CONF._config):
@@ -267,18 +315,18 @@ def check_service_availability(os, update):
                 continue
             if catalog_type not in services:
                 if getattr(CONF.service_available, codename_match[cfgname]):
-                    print('Endpoint type %s not found either disable service '
-                          '%s or fix the catalog_type in the config file' % (
-                              catalog_type, codename_match[cfgname]))
+                    _print('Endpoint type %s not found either disable service '
+                           '%s or fix the catalog_type in the config file' % (
+                               catalog_type, codename_match[cfgname]))
                     if update:
                         change_option(codename_match[cfgname],
                                       'service_available', False)
             else:
                 if not getattr(CONF.service_available,
                                codename_match[cfgname]):
-                    print('Endpoint type %s is available, service %s should be'
-                          ' set as available in the config file.' % (
-                              catalog_type, codename_match[cfgname]))
+                    _print('Endpoint type %s is available, service %s should '
+                           'be set as available in the config file.' % (
+                               catalog_type, codename_match[cfgname]))
                     if update:
                         change_option(codename_match[cfgname],
                                       'service_available', True)
@@ -290,6 +338,39 @@ def check_service_availability(os, update):
     return avail_services
 
 
+def _capture_output(probe, *args):
+    _probe_output.lines = []
+    try:
+        return probe(*args), _probe_output.lines
+    finally:
+        del _probe_output.lines
+
+
+def run_probes(probes, timeout=DEFAULT_PROBE_TIMEOUT):
+    """Run the probes concurrently, then print their output in order.
+
+    :param probes: list of (name, callable, args) tuples
+    :param timeout: time in seconds given to each probe
+    :return: the results of the probes which succeeded by name, and the
+        names of the ones which failed
+    """
+    calls = [(name, _capture_output, (probe,) + args, None)
+             for name, probe, args in probes]
+    results = {}
+    failed = []
+    for outcome in parallel.run_concurrently(calls, workers=len(calls) or 1,
+                                             timeout=timeout):
+        if outcome.error is not None:
+            print('%s failed: %s' % (outcome.name, outcome.error))
+            failed.append(outcome.name)
+            continue
+        result, lines = outcome.result
+        for line in lines:
+            print(line)
+        results[outcome.name] = result
+    return results, failed
+
+
 def parse_args():
     parser = argparse.ArgumentParser()
     parser.add_argument('-u', '--update', action='store_true',
@@ -309,6 +390,10 @@ def parse_args():
     parser.add_argument('-r', '--replace-ext', action='store_true',
                         help="If specified the all option will be replaced "
                              "with a full list of extensions")
+    parser.add_argument('-t', '--timeout', type=int,
+                        default=DEFAULT_PROBE_TIMEOUT,
+                        help="Time in seconds given to each api query, the "
+                             "services are queried concurrently")
     args = parser.parse_args()
     return args
 
@@ -329,23 +414,37 @@ def main():
         CONF_PARSER.optionxform = str
         CONF_PARSER.readfp(conf_file)
     os = clients.ComputeAdminManager(interface='json')
-    services = check_service_availability(os, update)
-    results = {}
+    # The api versions don't depend on the available services, they are
+    # queried together with the catalog
+    probes, failed = run_probes([
+        ('services', check_service_availability, (os, update)),
+        ('keystone versions', verify_keystone_api_versions, (os, update)),
+        ('glance versions', verify_glance_api_versions, (os, update)),
+        ('nova versions', verify_nova_api_versions, (os, update)),
+        ('cinder versions', verify_cinder_api_versions, (os, update)),
+    ], timeout=opts.timeout)
+    services = probes.get('services', [])
+    extension_probes = []
     for service in ['nova', 'nova_v3', 'cinder', 'neutron', 'swift']:
         if service == 'nova_v3' and 'nova' not in services:
             continue
         elif service not in services:
             continue
-        results = verify_extensions(os, service, results)
-    verify_keystone_api_versions(os, update)
-    verify_glance_api_versions(os, update)
-    verify_nova_api_versions(os, update)
-    verify_cinder_api_versions(os, update)
+        extension_probes.append(('%s extensions' % service, verify_extensions,
+                                 (os, service, {})))
+    extensions, extensions_failed = run_probes(extension_probes,
+                                               timeout=opts.timeout)
+    failed.extend(extensions_failed)
+    results = {}
+    for service_results in extensions.values():
+        results.update(service_results)
     display_results(results, update, replace)
     if update:
         conf_file.close()
-        CONF_PARSER.write(outfile)
+        write_config(outfile)
     outfile.close()
+    if failed:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
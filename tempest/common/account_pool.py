@@ -0,0 +1,304 @@
+# Copyright 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Pool of pre-created isolated credentials
+
+tempest-account-pool creates credential sets (a tenant, a user with its
+roles and the network resources tenant isolation would create) in a pool
+directory, one JSON file per set. Test classes take a set instead of
+creating one and give it back when they are done, the pool command scrubs
+the resources they left in the tenant and the set is handed out again.
+
+A set is claimed with a non-blocking fcntl lock on its lock file, held
+until the test class releases it (or its process dies), and marked used
+when it is handed out. Used sets are only handed out again once scrubbed.
+
+The running pool command holds the lock of the daemon lock file. Without
+it no set is scrubbed, test classes finding no free set then create their
+own isolated credentials instead of waiting for one.
+"""
+
+import errno
+import json
+import os
+import random
+import time
+import uuid
+
+from tempest import auth
+from tempest.common import cred_provider
+from tempest.common import isolated_creds
+from tempest.common.utils import file_utils
+from tempest import config
+from tempest import exceptions
+from tempest.openstack.common import log as logging
+
+CONF = config.CONF
+LOG = logging.getLogger(__name__)
+
+ENTRY_SUFFIX = '.json'
+LOCK_SUFFIX = '.lock'
+USED_SUFFIX = '.used'
+DAEMON_LOCK = 'daemon.lock'
+# Seconds between two attempts to take a set from an exhausted pool
+POLL_INTERVAL = 1
+
+
+def credential_kind(admin):
+    # NOTE: the kind is part of the set id, listing the sets of a kind
+    # doesn't read them
+    return 'admin' if admin else 'user'
+
+
+class CredentialPool(object):
+    """The pool directory, shared by the test processes and the command."""
+
+    def __init__(self, pool_dir):
+        self.pool_dir = pool_dir
+        self._locks = {}
+        self._daemon_lock = None
+        if not os.path.isdir(pool_dir):
+            try:
+                os.makedirs(pool_dir)
+            except OSError as exc:
+                if exc.errno != errno.EEXIST:
+                    raise
+
+    def _path(self, entry_id, suffix):
+        return os.path.join(self.pool_dir, entry_id + suffix)
+
+    def entries(self, admin=None):
+        """Ids of the sets in the pool, only the admin ones if admin."""
+        entry_ids = [name[:-len(ENTRY_SUFFIX)]
+                     for name in os.listdir(self.pool_dir)
+                     if name.endswith(ENTRY_SUFFIX)]
+        if admin is None:
+            return entry_ids
+        prefix = credential_kind(admin) + '-'
+        return [entry_id for entry_id in entry_ids
+                if entry_id.startswith(prefix)]
+
+    def load(self, entry_id):
+        with open(self._path(entry_id, ENTRY_SUFFIX)) as entry_file:
+            return json.load(entry_file)
+
+    def add(self, entry):
+        """Add a set, it can be handed out as soon as it is written."""
+        entry_id = '%s-%s' % (credential_kind(entry.get('admin', False)),
+                              uuid.uuid4().hex)
+        path = self._path(entry_id, ENTRY_SUFFIX)
+        # NOTE: written aside and renamed, a set is never read half written
+        with open(path + '.tmp', 'w') as entry_file:
+            json.dump(entry, entry_file)
+        os.rename(path + '.tmp', path)
+        return entry_id
+
+    def remove(self, entry_id):
+        """Remove a set locked by this process from the pool."""
+        for suffix in (ENTRY_SUFFIX, USED_SUFFIX, LOCK_SUFFIX):
+            try:
+                os.remove(self._path(entry_id, suffix))
+            except OSError as exc:
+                if exc.errno != errno.ENOENT:
+                    raise
+        self.release(entry_id)
+
+    def is_used(self, entry_id):
+        return os.path.exists(self._path(entry_id, USED_SUFFIX))
+
+    def lock(self, entry_id):
+        """Lock a set without waiting, return whether it was locked."""
+        lock_file = file_utils.try_lock(self._path(entry_id, LOCK_SUFFIX))
+        if lock_file is None:
+            return False
+        self._locks[entry_id] = lock_file
+        return True
+
+    def release(self, entry_id):
+        lock_file = self._locks.pop(entry_id, None)
+        if lock_file is not None:
+            lock_file.close()
+
+    def hold_daemon_lock(self):
+        """Lock the pool as the daemon, return whether it was locked."""
+        if self._daemon_lock is None:
+            self._daemon_lock = file_utils.try_lock(
+                os.path.join(self.pool_dir, DAEMON_LOCK))
+        return self._daemon_lock is not None
+
+    def daemon_running(self):
+        """Whether a pool command scrubs the sets given back."""
+        lock_file = file_utils.try_lock(os.path.join(self.pool_dir,
+                                                     DAEMON_LOCK))
+        if lock_file is None:
+            return True
+        lock_file.close()
+        return False
+
+    def acquire(self, admin=False):
+        """Claim a scrubbed set of the requested kind.
+
+        :return: (entry id, entry) tuple, None if no set is free
+        """
+        entry_ids = self.entries(admin=admin)
+        # NOTE: starting at a random set spreads the workers over the pool
+        # instead of having all of them try the same locks first
+        random.shuffle(entry_ids)
+        for entry_id in entry_ids:
+            if self.is_used(entry_id) or not self.lock(entry_id):
+                continue
+            # checked again holding the lock, it can have been handed out
+            # and released since it was listed
+            if self.is_used(entry_id):
+                self.release(entry_id)
+                continue
+            open(self._path(entry_id, USED_SUFFIX), 'w').close()
+            return entry_id, self.load(entry_id)
+        return None
+
+    def claim_used(self):
+        """Lock the used sets given back, return their ids."""
+        return [entry_id for entry_id in self.entries()
+                if self.is_used(entry_id) and self.lock(entry_id)]
+
+    def recycle(self, entry_id):
+        """Make a scrubbed set locked by this process available again."""
+        os.remove(self._path(entry_id, USED_SUFFIX))
+        self.release(entry_id)
+
+
+class PooledCreds(cred_provider.CredentialProvider):
+    """Credential provider handing out the sets of the credential pool."""
+
+    def __init__(self, name, interface='json', password='pass',
+                 network_resources=None):
+        super(PooledCreds, self).__init__(name, interface, password,
+                                          network_resources)
+        self.interface = interface
+        self.password = password
+        self.pool = CredentialPool(CONF.auth.credential_pool_dir)
+        self.isolated_creds = {}
+        self.isolated_net_resources = {}
+        self.entry_ids = []
+        # creates the credentials the pool can't provide
+        self.fallback = None
+
+    def _acquire(self, admin):
+        """Take a set, None if none will ever be free."""
+        deadline = time.time() + CONF.auth.credential_pool_timeout
+        while True:
+            acquired = self.pool.acquire(admin=admin)
+            if acquired is not None:
+                return acquired
+            # NOTE: the sets in use are only given back once scrubbed by
+            # the pool command, without it waiting is pointless
+            if not self.pool.entries(admin=admin):
+                LOG.warning("No %s credentials in the pool %s" %
+                            (credential_kind(admin), self.pool.pool_dir))
+                return None
+            if not self.pool.daemon_running():
+                LOG.warning("tempest-account-pool is not running on %s" %
+                            self.pool.pool_dir)
+                return None
+            if time.time() > deadline:
+                raise exceptions.TimeoutException(
+                    "No free %s credentials in the pool %s after %s seconds"
+                    % (credential_kind(admin), self.pool.pool_dir,
+                       CONF.auth.credential_pool_timeout))
+            time.sleep(POLL_INTERVAL)
+
+    def _get_fallback_credentials(self, credential_type):
+        if self.fallback is None:
+            self.fallback = isolated_creds.IsolatedCreds(
+                self.name, interface=self.interface, password=self.password)
+        credentials = self.fallback.get_credentials(credential_type)
+        self.isolated_creds[credential_type] = credentials
+        if credential_type in self.fallback.isolated_net_resources:
+            self.isolated_net_resources[credential_type] = (
+                self.fallback.isolated_net_resources[credential_type])
+        return credentials
+
+    def get_credentials(self, credential_type):
+        if self.isolated_creds.get(credential_type):
+            return self.isolated_creds[credential_type]
+        acquired = self._acquire(admin=(credential_type == 'admin'))
+        if acquired is None:
+            return self._get_fallback_credentials(credential_type)
+        entry_id, entry = acquired
+        self.entry_ids.append(entry_id)
+        credentials = auth.get_credentials(fill_in=False,
+                                           **entry['credentials'])
+        self.isolated_creds[credential_type] = credentials
+        self.isolated_net_resources[credential_type] = (
+            entry.get('network'), entry.get('subnet'), entry.get('router'))
+        LOG.info("Acquired pooled creds:\n credentials: %s" % credentials)
+        return credentials
+
+    def get_primary_creds(self):
+        return self.get_credentials('primary')
+
+    def get_admin_creds(self):
+        return self.get_credentials('admin')
+
+    def get_alt_creds(self):
+        return self.get_credentials('alt')
+
+    def get_primary_network(self):
+        return self.isolated_net_resources.get('primary')[0]
+
+    def get_primary_subnet(self):
+        return self.isolated_net_resources.get('primary')[1]
+
+    def get_primary_router(self):
+        return self.isolated_net_resources.get('primary')[2]
+
+    def get_admin_network(self):
+        return self.isolated_net_resources.get('admin')[0]
+
+    def get_admin_subnet(self):
+        return self.isolated_net_resources.get('admin')[1]
+
+    def get_admin_router(self):
+        return self.isolated_net_resources.get('admin')[2]
+
+    def get_alt_network(self):
+        return self.isolated_net_resources.get('alt')[0]
+
+    def get_alt_subnet(self):
+        return self.isolated_net_resources.get('alt')[1]
+
+    def get_alt_router(self):
+        return self.isolated_net_resources.get('alt')[2]
+
+    def clear_isolated_creds(self):
+        # the sets stay marked used until tempest-account-pool scrubs them
+        for entry_id in self.entry_ids:
+            self.pool.release(entry_id)
+        self.entry_ids = []
+        if self.fallback is not None:
+            self.fallback.clear_isolated_creds()
+            self.fallback = None
+        self.isolated_creds = {}
+        self.isolated_net_resources = {}
+
+
+def get_isolated_creds(name, network_resources=None):
+    """The pooled credentials if there is a pool, else new isolated ones."""
+    # NOTE: the pooled sets come with the default network resources
+    if CONF.auth.credential_pool_dir and network_resources is None:
+        return PooledCreds(name)
+    return isolated_creds.IsolatedCreds(name,
+                                        network_resources=network_resources)
@@ -12,16 +12,18 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import errno
 import hashlib
 import os
+import random
 
 import yaml
 
 from tempest import auth
 from tempest.common import cred_provider
+from tempest.common.utils import file_utils
 from tempest import config
 from tempest import exceptions
-from tempest.openstack.common import lockutils
 from tempest.openstack.common import log as logging
 
 CONF = config.CONF
@@ -34,6 +36,55 @@ def read_accounts_yaml(path):
     return accounts
 
 
+class AccountLocks(object):
+    """Locks of the accounts in use, one lock file per account.
+
+    An account is in use while the fcntl lock on its lock file is held.
+    It is held for the lifetime of the test class which took the account
+    and dropped by the kernel if its process dies, so there is no global
+    lock to take and a crashed worker doesn't leak its accounts.
+    """
+
+    def __init__(self, locks_dir):
+        self.locks_dir = locks_dir
+        self._locks = {}
+
+    def _ensure_locks_dir(self):
+        if not os.path.isdir(self.locks_dir):
+            try:
+                os.makedirs(self.locks_dir)
+            except OSError as exc:
+                if exc.errno != errno.EEXIST:
+                    raise
+
+    def acquire(self, hashes):
+        """Lock a free account, return its hash or None if none is free."""
+        if not hashes:
+            return None
+        self._ensure_locks_dir()
+        # NOTE: trying the accounts from a random one, the workers don't
+        # all contend on the first accounts and one finds a free account
+        # in a few attempts as long as there are enough accounts
+        start = random.randrange(len(hashes))
+        for _hash in hashes[start:] + hashes[:start]:
+            lock_file = file_utils.try_lock(os.path.join(self.locks_dir,
+                                                         _hash))
+            if lock_file is not None:
+                self._locks[_hash] = lock_file
+                return _hash
+        return None
+
+    def release(self, hash_string):
+        """Unlock an account, return whether this process had locked it."""
+        lock_file = self._locks.pop(hash_string, None)
+        if lock_file is None:
+            return False
+        # NOTE: the lock file is kept, removing it would let another
+        # process lock a new file while a third one holds the removed one
+        lock_file.close()
+        return True
+
+
 class Accounts(cred_provider.CredentialProvider):
 
     def __init__(self, name):
@@ -46,6 +97,7 @@ class Accounts(cred_provider.CredentialProvider):
             self.use_default_creds = True
         self.hash_dict = self.get_hash_dict(accounts)
         self.accounts_dir = os.path.join(CONF.lock_path, 'test_accounts')
+        self.account_locks = AccountLocks(self.accounts_dir)
         self.isolated_creds = {}
 
     @classmethod
@@ -60,26 +112,12 @@ class Accounts(cred_provider.CredentialProvider):
     def is_multi_user(self):
         return len(self.hash_dict) > 1
 
-    def _create_hash_file(self, hash_string):
-        path = os.path.join(os.path.join(self.accounts_dir, hash_string))
-        if not os.path.isfile(path):
-            open(path, 'w').close()
-            return True
-        return False
-
-    @lockutils.synchronized('test_accounts_io', external=True)
     def _get_free_hash(self, hashes):
-        if not os.path.isdir(self.accounts_dir):
-            os.mkdir(self.accounts_dir)
-            # Create File from first hash (since none are in use)
-            self._create_hash_file(hashes[0])
-            return hashes[0]
-        for _hash in hashes:
-            res = self._create_hash_file(_hash)
-            if res:
-                return _hash
-        msg = 'Insufficient number of users provided'
-        raise exceptions.InvalidConfiguration(msg)
+        free_hash = self.account_locks.acquire(list(hashes))
+        if free_hash is None:
+            msg = 'Insufficient number of users provided'
+            raise exceptions.InvalidConfiguration(msg)
+        return free_hash
 
     def _get_creds(self):
         if self.use_default_creds:
@@ -88,16 +126,10 @@ class Accounts(cred_provider.CredentialProvider):
         free_hash = self._get_free_hash(self.hash_dict.keys())
         return self.hash_dict[free_hash]
 
-    @lockutils.synchronized('test_accounts_io', external=True)
     def remove_hash(self, hash_string):
-        hash_path = os.path.join(self.accounts_dir, hash_string)
-        if not os.path.isfile(hash_path):
-            LOG.warning('Expected an account lock file %s to remove, but '
-                        'one did not exist')
-        else:
-            os.remove(hash_path)
-            if not os.listdir(self.accounts_dir):
-                os.rmdir(self.accounts_dir)
+        if not self.account_locks.release(hash_string):
+            LOG.warning('Expected to hold the lock of the account %s, but '
+                        'it was not held' % hash_string)
 
     def get_hash(self, creds):
         for _hash in self.hash_dict:
@@ -18,6 +18,7 @@ import httplib2
 import json
 import urlparse
 
+from tempest.common.utils import parallel
 from tempest.openstack.common import log as logging
 
 LOG = logging.getLogger(__name__)
@@ -124,6 +125,41 @@ def get_service_class(service_name):
     return service_dict.get(service_name, Service)
 
 
+def _probe(name, url, token):
+    service = get_service_class(name)(name, url, token)
+    return {'url': url,
+            'extensions': service.get_extensions(),
+            'versions': service.get_versions()}
+
+
+def discover_endpoints(token, endpoints, workers=parallel.DEFAULT_WORKERS,
+                       timeout=None, keep_failed=False):
+    """
+    Returns a dict with the apis discovered on the given endpoints.
+    The services are queried concurrently, the ones which can't be queried
+    are logged and left out of the result.
+    :param token: A token valid for the endpoints
+    :param endpoints: A dict with the url of each service type
+    :param keep_failed: Keep the services which can't be queried in the
+        result, with None as entry
+    :return: A dict with an entry for the type of each discovered service.
+        Each entry has keys for 'url', 'extensions' and 'versions'.
+    """
+    calls = [(name, _probe, (name, url, token), None)
+             for name, url in endpoints.iteritems()]
+    services = {}
+    for outcome in parallel.run_concurrently(calls, workers=workers,
+                                             timeout=timeout):
+        if outcome.error is not None:
+            LOG.warning("Discovery of service '%s' failed: %s" %
+                        (outcome.name, outcome.error))
+            if keep_failed:
+                services[outcome.name] = None
+            continue
+        services[outcome.name] = outcome.result
+    return services
+
+
 def discover(identity_client):
     """
     Returns a dict with discovered apis.
@@ -133,13 +169,6 @@ def discover(identity_client):
     """
     token = identity_client.auth_token
     endpoints = identity_client.service_catalog.get_endpoints()
-    services = {}
-    for (name, descriptor) in endpoints.iteritems():
-        services[name] = dict()
-        services[name]['url'] = descriptor[0]['publicURL']
-
-        service_class = get_service_class(name)
-        service = service_class(name, services[name]['url'], token)
-        services[name]['extensions'] = service.get_extensions()
-        services[name]['versions'] = service.get_versions()
-    return services
+    return discover_endpoints(
+        token, dict((name, descriptor[0]['publicURL'])
+                    for name, descriptor in endpoints.iteritems()))
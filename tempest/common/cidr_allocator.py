@@ -0,0 +1,214 @@
+# Copyright 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import contextlib
+import fcntl
+import json
+import os
+import threading
+import time
+
+import netaddr
+
+from tempest import config
+from tempest import exceptions
+from tempest.openstack.common import log as logging
+
+CONF = config.CONF
+LOG = logging.getLogger(__name__)
+
+STATE_FILE = 'tenant_network_cidrs.json'
+# Seconds after which the state is replaced with the subnets listed again
+STATE_TTL = 600
+
+
+def shared_state_path():
+    """The state file shared by the test workers, if there is a lock_path."""
+    if CONF.lock_path:
+        return os.path.join(CONF.lock_path, STATE_FILE)
+    return None
+
+
+class CidrAllocator(object):
+    """Hands out the tenant network blocks no subnet uses.
+
+    The CIDRs in use are listed once, then kept up to date locally: the
+    blocks handed out are added and the ones given back are removed.
+    Blocks are handed out round robin, the search for a free one starts
+    after the last one handed out.
+
+    With a state_path, the blocks in use and the next one to try are kept
+    in that file, under an fcntl lock, so that all the test workers share
+    them. Otherwise they are only shared by the threads of the process.
+
+    The state can miss subnets created by something else, the callers
+    refresh it when the block they got turns out to be in use. Once all
+    the blocks are used, or once the last listing is older than STATE_TTL,
+    the state is replaced with the subnets listed again. This reclaims the
+    blocks of subnets deleted by someone else or never given back, e.g. by
+    a run which crashed.
+    """
+
+    def __init__(self, list_cidrs, base_cidr=None, mask_bits=None,
+                 state_path=None):
+        """
+        :param list_cidrs: callable returning the CIDRs of the existing
+            subnets
+        """
+        self.list_cidrs = list_cidrs
+        self.base_cidr = netaddr.IPNetwork(
+            base_cidr or CONF.network.tenant_network_cidr)
+        self.mask_bits = mask_bits or CONF.network.tenant_network_mask_bits
+        self.state_path = state_path
+        self._lock = threading.Lock()
+        self._used = None
+        self._next = 0
+        self._listed_at = 0
+
+    @contextlib.contextmanager
+    def _state(self):
+        """Hold the state, loaded from and saved to the state file."""
+        with self._lock:
+            if self.state_path is None:
+                yield
+                return
+            state_dir = os.path.dirname(self.state_path)
+            if state_dir and not os.path.isdir(state_dir):
+                os.makedirs(state_dir)
+            fd = os.open(self.state_path, os.O_RDWR | os.O_CREAT, 0o644)
+            with os.fdopen(fd, 'r+') as state_file:
+                fcntl.flock(state_file, fcntl.LOCK_EX)
+                content = state_file.read()
+                if content:
+                    state = json.loads(content)
+                    self._used = netaddr.IPSet(state['used'])
+                    self._next = state['next']
+                    self._listed_at = state.get('listed_at', 0)
+                else:
+                    self._used = None
+                yield
+                if self._used is not None:
+                    state_file.seek(0)
+                    state_file.truncate()
+                    json.dump({'used': [str(cidr) for cidr
+                                        in self._used.iter_cidrs()],
+                               'next': self._next,
+                               'listed_at': self._listed_at}, state_file)
+
+    def _load(self, merge=False):
+        listed = netaddr.IPSet(self.list_cidrs())
+        if merge and self._used is not None:
+            self._used = self._used | listed
+        else:
+            self._used = listed
+            self._listed_at = time.time()
+
+    def _expired(self):
+        return time.time() - self._listed_at > STATE_TTL
+
+    def _block_count(self):
+        return 2 ** (self.mask_bits - self.base_cidr.prefixlen)
+
+    def _block_size(self):
+        return self.base_cidr.size // self._block_count()
+
+    def _block(self, index):
+        return netaddr.IPNetwork('%s/%s' % (
+            netaddr.IPAddress(self.base_cidr.first +
+                              index * self._block_size()),
+            self.mask_bits))
+
+    def _find_free(self):
+        """Reserve the first free block from the next one to try.
+
+        Only the free ranges are walked, not the blocks in use: a free
+        range of at least a block holds the blocks from its first address
+        to its end.
+        """
+        size = self._block_size()
+        free = netaddr.IPSet([self.base_cidr]) - self._used
+        after_next = None
+        first = None
+        for cidr in free.iter_cidrs():
+            if cidr.prefixlen > self.mask_bits:
+                continue
+            start = (cidr.first - self.base_cidr.first) // size
+            end = start + cidr.size // size
+            if first is None or start < first:
+                first = start
+            if end > self._next:
+                candidate = max(start, self._next)
+                if after_next is None or candidate < after_next:
+                    after_next = candidate
+        index = first if after_next is None else after_next
+        if index is None:
+            return None
+        block = self._block(index)
+        self._used.add(block)
+        self._next = (index + 1) % self._block_count()
+        return str(block)
+
+    def allocate(self, refresh=False):
+        """Reserve a free block, return its CIDR.
+
+        :param refresh: add the subnets listed again to the blocks known
+            to be in use first, after the previous block turned out to be
+            in use
+        """
+        with self._state():
+            if self._used is None or self._expired():
+                self._load()
+            elif refresh:
+                self._load(merge=True)
+            cidr = self._find_free()
+            if cidr is None:
+                self._load()
+                cidr = self._find_free()
+        if cidr is None:
+            e = exceptions.BuildErrorException()
+            e.message = 'Available CIDR for subnet creation could not be found'
+            raise e
+        return cidr
+
+    def release(self, cidr):
+        """Give back the block of a deleted subnet."""
+        with self._state():
+            if self._used is not None:
+                self._used.remove(netaddr.IPNetwork(cidr))
+
+
+# The allocator of the process, see get_allocator
+_allocator = None
+_allocator_lock = threading.Lock()
+
+
+def get_allocator(list_cidrs):
+    """The allocator shared by all the subnet creators of the process.
+
+    Created on first use, with the state shared through the lock_path if
+    there is one.
+
+    :param list_cidrs: callable returning the CIDRs of the subnets of all
+        the tenants. It replaces the one of the previous caller, whose
+        credentials may be gone by now.
+    """
+    global _allocator
+    with _allocator_lock:
+        if _allocator is None:
+            _allocator = CidrAllocator(list_cidrs,
+                                       state_path=shared_state_path())
+        else:
+            _allocator.list_cidrs = list_cidrs
+        return _allocator
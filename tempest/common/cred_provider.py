@@ -43,3 +43,8 @@ class CredentialProvider(object):
     @abc.abstractmethod
     def clear_isolated_creds(self):
         return
+
+    def prepare_credentials(self, credential_types):
+        """Get the credentials of the given types ahead of their use."""
+        for credential_type in credential_types:
+            getattr(self, 'get_%s_creds' % credential_type)()
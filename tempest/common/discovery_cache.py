@@ -0,0 +1,227 @@
+# Copyright 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Cache of the apis deployed in the cloud, used for skip decisions
+
+The versions and extensions of the services in the catalog are queried
+once, concurrently, and stored in a JSON file keyed by the identity
+endpoint and a hash of the catalog, so that all the test workers of a run
+share them. The entries expire after CONF.discovery.cache_ttl seconds.
+"""
+
+import contextlib
+import fcntl
+import hashlib
+import json
+import os
+import threading
+import time
+
+from tempest.common import api_discovery
+from tempest import config
+from tempest import exceptions
+from tempest import manager
+from tempest.openstack.common import log as logging
+
+CONF = config.CONF
+LOG = logging.getLogger(__name__)
+
+# Services of the test.services decorator which don't need an endpoint:
+# nova-network provides networking when neutron is missing, keystone is
+# always required and horizon is not in the catalog.
+UNCHECKED_SERVICES = frozenset(['network', 'identity', 'dashboard'])
+
+_capabilities = None
+_capabilities_lock = threading.Lock()
+
+
+def _service_catalog_types():
+    return {
+        'compute': CONF.compute.catalog_type,
+        'image': CONF.image.catalog_type,
+        'baremetal': CONF.baremetal.catalog_type,
+        'volume': CONF.volume.catalog_type,
+        'orchestration': CONF.orchestration.catalog_type,
+        'object_storage': CONF.object_storage.catalog_type,
+        'telemetry': CONF.telemetry.catalog_type,
+        'data_processing': CONF.data_processing.catalog_type,
+    }
+
+
+def _extension_catalog_types():
+    # NOTE: the v3 compute extensions are not discovered, the ones of
+    # 'compute_v3' are only checked against the configuration.
+    return {
+        'compute': CONF.compute.catalog_type,
+        'volume': CONF.volume.catalog_type,
+        'network': CONF.network.catalog_type,
+        'object': CONF.object_storage.catalog_type,
+    }
+
+
+class Capabilities(object):
+    """The discovered apis, as sets of the names used by the tests.
+
+    A service is deployed when its catalog type has an endpoint. Extensions
+    which could not be discovered are considered available, the
+    configuration alone decides for them. This is the case of everything
+    when catalog is None.
+
+    :param catalog: the catalog types with an endpoint
+    :param services: the discovered apis by catalog type, the entry of a
+        service which could not be queried is None
+    """
+
+    def __init__(self, catalog, services=None):
+        self.services = None
+        self.extensions = {}
+        if catalog is None:
+            return
+        catalog_types = frozenset(catalog)
+        self.services = frozenset(
+            name for name, catalog_type in _service_catalog_types().items()
+            if catalog_type in catalog_types)
+        services = services or {}
+        for name, catalog_type in _extension_catalog_types().items():
+            extensions = (services.get(catalog_type) or {}).get('extensions')
+            if extensions:
+                self.extensions[name] = frozenset(extensions)
+
+    def is_service_available(self, service):
+        return (self.services is None or service in UNCHECKED_SERVICES or
+                service in self.services)
+
+    def is_extension_available(self, extension, service):
+        extensions = self.extensions.get(service)
+        return extensions is None or extension in extensions
+
+
+class DiscoveryCache(object):
+    """The discovered apis of every catalog, in a JSON file."""
+
+    def __init__(self, path, ttl):
+        self.path = path
+        self.ttl = ttl
+
+    @contextlib.contextmanager
+    def _locked(self):
+        with open(self.path + '.lock', 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+    def _read(self):
+        try:
+            with open(self.path) as cache_file:
+                return json.load(cache_file)
+        except IOError:
+            return {}
+        except ValueError:
+            LOG.warning("Ignoring invalid discovery cache %s" % self.path)
+            return {}
+
+    def _write(self, entries):
+        tmp_path = '%s.%d.tmp' % (self.path, os.getpid())
+        with open(tmp_path, 'w') as cache_file:
+            json.dump(entries, cache_file)
+        os.rename(tmp_path, self.path)
+
+    def _is_fresh(self, entry, now):
+        return entry is not None and now - entry['time'] < self.ttl
+
+    def get(self, key, discover, complete=None):
+        """The services of the key, discovered if not cached or expired.
+
+        The file is locked meanwhile, the other workers wait for the
+        discovery instead of running their own.
+
+        :param complete: callable telling if the discovered services can
+            be cached, the next worker discovers again otherwise
+        """
+        with self._locked():
+            entries = self._read()
+            now = time.time()
+            if self._is_fresh(entries.get(key), now):
+                return entries[key]['services']
+            services = discover()
+            if complete is not None and not complete(services):
+                LOG.warning("Not caching the partial discovery of %s" % key)
+                return services
+            entries = dict((k, entry) for k, entry in entries.items()
+                           if self._is_fresh(entry, now))
+            entries[key] = {'time': now, 'services': services}
+            self._write(entries)
+            return services
+
+
+def catalog_endpoints(auth_provider):
+    """The token and the url of each service type of the catalog."""
+    token, auth_data = auth_provider.auth_data
+    catalog = auth_data.get('serviceCatalog', auth_data.get('catalog', []))
+    endpoints = {}
+    for service in catalog:
+        try:
+            endpoints[service['type']] = auth_provider.base_url(
+                filters={'service': service['type'],
+                         'region': CONF.identity.region,
+                         'endpoint_type': CONF.identity.endpoint_type},
+                auth_data=(token, auth_data))
+        except exceptions.EndpointNotFound:
+            continue
+    return token, endpoints
+
+
+def cache_key(endpoints):
+    catalog = json.dumps(sorted(endpoints.items()))
+    return '%s#%s' % (CONF.identity.uri, hashlib.sha1(catalog).hexdigest())
+
+
+def _is_complete(services):
+    # the failed probes are retried by the next worker, the result of a
+    # single timeout must not stay in the cache for the whole ttl
+    return None not in services.values()
+
+
+def _load_capabilities():
+    token, endpoints = catalog_endpoints(manager.Manager().auth_provider)
+    cache = DiscoveryCache(CONF.discovery.cache_file,
+                           CONF.discovery.cache_ttl)
+    services = cache.get(cache_key(endpoints),
+                         lambda: api_discovery.discover_endpoints(
+                             token, endpoints,
+                             workers=CONF.discovery.workers,
+                             keep_failed=True),
+                         complete=_is_complete)
+    return Capabilities(endpoints, services)
+
+
+def get_capabilities():
+    """The discovered apis, None if the discovery cache is not enabled.
+
+    They are loaded once per process. If the discovery fails, the skip
+    decisions are left to the configuration.
+    """
+    global _capabilities
+    if not CONF.discovery.cache_file:
+        return None
+    with _capabilities_lock:
+        if _capabilities is None:
+            try:
+                _capabilities = _load_capabilities()
+            except Exception as exc:
+                LOG.warning("API discovery failed, only the configuration "
+                            "is used to skip tests: %s" % exc)
+                _capabilities = Capabilities(None)
+    return _capabilities
@@ -14,10 +14,28 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import threading
+
 import httplib2
 
 
 class ClosingHttp(httplib2.Http):
+    def __init__(self, *args, **kwargs):
+        # NOTE: httplib2 keeps its connections in a shared dict, keep one
+        # per thread so a client can be used from several threads at once
+        self._local = threading.local()
+        super(ClosingHttp, self).__init__(*args, **kwargs)
+
+    @property
+    def connections(self):
+        if not hasattr(self._local, 'connections'):
+            self._local.connections = {}
+        return self._local.connections
+
+    @connections.setter
+    def connections(self, value):
+        self._local.connections = value
+
     def request(self, *args, **kwargs):
         original_headers = kwargs.get('headers', {})
         new_headers = dict(original_headers, connection='close')
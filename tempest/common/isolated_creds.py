@@ -12,19 +12,28 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-import netaddr
+import threading
 
 from tempest import auth
 from tempest import clients
+from tempest.common import cidr_allocator
 from tempest.common import cred_provider
 from tempest.common.utils import data_utils
+from tempest.common.utils import parallel
 from tempest import config
 from tempest import exceptions
+from tempest.openstack.common import excutils
 from tempest.openstack.common import log as logging
 
 CONF = config.CONF
 LOG = logging.getLogger(__name__)
 
+# Role ids by name, shared by all the instances of the process as roles are
+# not expected to change during a run. Looking up a role not in it refreshes
+# it.
+_role_ids = {}
+_role_ids_lock = threading.Lock()
+
 
 class IsolatedCreds(cred_provider.CredentialProvider):
 
@@ -74,16 +83,31 @@ class IsolatedCreds(cred_provider.CredentialProvider):
         _, roles = self.identity_admin_client.list_roles()
         return roles
 
+    def _get_role_id(self, role_name):
+        with _role_ids_lock:
+            if role_name not in _role_ids:
+                _role_ids.clear()
+                _role_ids.update((role['name'], role['id'])
+                                 for role in self._list_roles())
+            try:
+                return _role_ids[role_name]
+            except KeyError:
+                msg = 'No "%s" role found' % role_name
+                raise exceptions.NotFound(msg)
+
     def _assign_user_role(self, tenant, user, role_name):
-        role = None
+        role_id = self._get_role_id(role_name)
         try:
-            roles = self._list_roles()
-            role = next(r for r in roles if r['name'] == role_name)
-        except StopIteration:
-            msg = 'No "%s" role found' % role_name
-            raise exceptions.NotFound(msg)
-        self.identity_admin_client.assign_user_role(tenant['id'], user['id'],
-                                                    role['id'])
+            self.identity_admin_client.assign_user_role(tenant['id'],
+                                                        user['id'], role_id)
+        except exceptions.NotFound:
+            # the cached id is stale if the role was deleted and created
+            # again, look it up once more
+            with _role_ids_lock:
+                if _role_ids.get(role_name) == role_id:
+                    del _role_ids[role_name]
+            self.identity_admin_client.assign_user_role(
+                tenant['id'], user['id'], self._get_role_id(role_name))
 
     def _delete_user(self, user):
         self.identity_admin_client.delete_user(user)
@@ -150,63 +174,87 @@ class IsolatedCreds(cred_provider.CredentialProvider):
             elif self.network_resources['dhcp']:
                 raise exceptions.InvalidConfiguration('DHCP requires a subnet')
 
-        data_utils.rand_name_root = data_utils.rand_name(self.name)
+        # NOTE: not data_utils.rand_name_root, the credentials of several
+        # types can be created at the same time
+        name_root = data_utils.rand_name(self.name)
+        calls = []
         if not self.network_resources or self.network_resources['network']:
-            network_name = data_utils.rand_name_root + "-network"
-            network = self._create_network(network_name, tenant_id)
+            calls.append(('network', self._create_network_and_subnet,
+                          (name_root, tenant_id), None))
+        if not self.network_resources or self.network_resources['router']:
+            # the router doesn't depend on the network, both are created
+            # at the same time
+            calls.append(('router', self._create_router,
+                          (name_root + "-router", tenant_id), None))
+        outcomes = dict((o.name, o)
+                        for o in parallel.run_concurrently(calls))
+        if 'network' in outcomes:
+            network, subnet = outcomes['network'].result or (None, None)
+        if 'router' in outcomes:
+            router = outcomes['router'].result
         try:
-            if not self.network_resources or self.network_resources['subnet']:
-                subnet_name = data_utils.rand_name_root + "-subnet"
-                subnet = self._create_subnet(subnet_name, tenant_id,
-                                             network['id'])
-            if not self.network_resources or self.network_resources['router']:
-                router_name = data_utils.rand_name_root + "-router"
-                router = self._create_router(router_name, tenant_id)
+            parallel.check_outcomes(outcomes.values())
+            if router:
                 self._add_router_interface(router['id'], subnet['id'])
         except Exception:
             if router:
                 self._clear_isolated_router(router['id'], router['name'])
             if subnet:
-                self._clear_isolated_subnet(subnet['id'], subnet['name'])
+                self._clear_isolated_subnet(subnet['id'], subnet['name'],
+                                            subnet.get('cidr'))
             if network:
                 self._clear_isolated_network(network['id'], network['name'])
             raise
         return network, subnet, router
 
+    def _create_network_and_subnet(self, name_root, tenant_id):
+        network = self._create_network(name_root + "-network", tenant_id)
+        subnet = None
+        if not self.network_resources or self.network_resources['subnet']:
+            try:
+                subnet = self._create_subnet(name_root + "-subnet",
+                                             tenant_id, network['id'])
+            except Exception:
+                self._clear_isolated_network(network['id'], network['name'])
+                raise
+        return network, subnet
+
     def _create_network(self, name, tenant_id):
         _, resp_body = self.network_admin_client.create_network(
             name=name, tenant_id=tenant_id)
         return resp_body['network']
 
+    def _list_subnet_cidrs(self):
+        _, body = self.network_admin_client.list_subnets(fields=['cidr'])
+        return [subnet['cidr'] for subnet in body['subnets']]
+
+    def _get_cidr_allocator(self):
+        return cidr_allocator.get_allocator(self._list_subnet_cidrs)
+
     def _create_subnet(self, subnet_name, tenant_id, network_id):
-        base_cidr = netaddr.IPNetwork(CONF.network.tenant_network_cidr)
-        mask_bits = CONF.network.tenant_network_mask_bits
-        for subnet_cidr in base_cidr.subnet(mask_bits):
+        allocator = self._get_cidr_allocator()
+        kwargs = {}
+        if self.network_resources:
+            kwargs['enable_dhcp'] = self.network_resources['dhcp']
+        refresh = False
+        while True:
+            # raises once every block is known to be used
+            subnet_cidr = allocator.allocate(refresh=refresh)
             try:
-                if self.network_resources:
-                    _, resp_body = self.network_admin_client.\
-                        create_subnet(
-                            network_id=network_id, cidr=str(subnet_cidr),
-                            name=subnet_name,
-                            tenant_id=tenant_id,
-                            enable_dhcp=self.network_resources['dhcp'],
-                            ip_version=4)
-                else:
-                    _, resp_body = self.network_admin_client.\
-                        create_subnet(network_id=network_id,
-                                      cidr=str(subnet_cidr),
-                                      name=subnet_name,
-                                      tenant_id=tenant_id,
-                                      ip_version=4)
-                break
-            except exceptions.BadRequest as e:
-                if 'overlaps with another subnet' not in str(e):
-                    raise
-        else:
-            e = exceptions.BuildErrorException()
-            e.message = 'Available CIDR for subnet creation could not be found'
-            raise e
-        return resp_body['subnet']
+                _, resp_body = self.network_admin_client.create_subnet(
+                    network_id=network_id, cidr=subnet_cidr,
+                    name=subnet_name, tenant_id=tenant_id, ip_version=4,
+                    **kwargs)
+                return resp_body['subnet']
+            except Exception as e:
+                if not (isinstance(e, exceptions.BadRequest) and
+                        'overlaps with another subnet' in str(e)):
+                    with excutils.save_and_reraise_exception():
+                        allocator.release(subnet_cidr)
+                # created by someone else, the allocator keeps it as used
+                # and refreshes its state before handing out the next one
+                LOG.debug("CIDR %s is already in use" % subnet_cidr)
+                refresh = True
 
     def _create_router(self, router_name, tenant_id):
         external_net_id = dict(
@@ -268,6 +316,13 @@ class IsolatedCreds(cred_provider.CredentialProvider):
                          + " credentials: %s" % credentials)
         return credentials
 
+    def prepare_credentials(self, credential_types):
+        """Create the missing credentials of the given types at once."""
+        calls = [(credential_type, self.get_credentials, (credential_type,),
+                  None) for credential_type in credential_types
+                 if not self.isolated_creds.get(credential_type)]
+        parallel.run_concurrently(calls, raise_on_error=True)
+
     def get_primary_creds(self):
         return self.get_credentials('primary')
 
@@ -285,13 +340,15 @@ class IsolatedCreds(cred_provider.CredentialProvider):
             LOG.warn('router with name: %s not found for delete' %
                      router_name)
 
-    def _clear_isolated_subnet(self, subnet_id, subnet_name):
+    def _clear_isolated_subnet(self, subnet_id, subnet_name, cidr=None):
         net_client = self.network_admin_client
         try:
             net_client.delete_subnet(subnet_id)
         except exceptions.NotFound:
             LOG.warn('subnet with name: %s not found for delete' %
                      subnet_name)
+        if cidr:
+            self._get_cidr_allocator().release(cidr)
 
     def _clear_isolated_network(self, network_id, network_name):
         net_client = self.network_admin_client
@@ -313,41 +370,65 @@ class IsolatedCreds(cred_provider.CredentialProvider):
                 LOG.warn('Security group %s, id %s not found for clean-up' %
                          (secgroup['name'], secgroup['id']))
 
-    def _clear_isolated_net_resources(self):
-        net_client = self.network_admin_client
+    def _remove_router_interface(self, router, subnet):
+        try:
+            self.network_admin_client.remove_router_interface_with_subnet_id(
+                router['id'], subnet['id'])
+        except exceptions.NotFound:
+            LOG.warn('router with name: %s not found for delete' %
+                     router['name'])
+
+    def _schedule_net_resources_teardown(self, scheduler):
         for cred in self.isolated_net_resources:
             network, subnet, router = self.isolated_net_resources.get(cred)
             LOG.debug("Clearing network: %(network)s, "
                       "subnet: %(subnet)s, router: %(router)s",
                       {'network': network, 'subnet': subnet, 'router': router})
+            # the interface goes first, then the router and the subnet it
+            # was on, then the network of the subnet
             if (not self.network_resources or
                 self.network_resources.get('router')):
-                try:
-                    net_client.remove_router_interface_with_subnet_id(
-                        router['id'], subnet['id'])
-                except exceptions.NotFound:
-                    LOG.warn('router with name: %s not found for delete' %
-                             router['name'])
-                self._clear_isolated_router(router['id'], router['name'])
+                scheduler.add(0, 'router interface %s' % router['name'],
+                              self._remove_router_interface, router, subnet)
+                scheduler.add(1, 'router %s' % router['name'],
+                              self._clear_isolated_router, router['id'],
+                              router['name'])
             if (not self.network_resources or
                 self.network_resources.get('subnet')):
-                self._clear_isolated_subnet(subnet['id'], subnet['name'])
+                scheduler.add(1, 'subnet %s' % subnet['name'],
+                              self._clear_isolated_subnet, subnet['id'],
+                              subnet['name'], subnet.get('cidr'))
             if (not self.network_resources or
                 self.network_resources.get('network')):
-                self._clear_isolated_network(network['id'], network['name'])
+                scheduler.add(2, 'network %s' % network['name'],
+                              self._clear_isolated_network, network['id'],
+                              network['name'])
+
+    def _clear_isolated_net_resources(self):
+        scheduler = parallel.TeardownScheduler()
+        self._schedule_net_resources_teardown(scheduler)
+        scheduler.run(raise_on_error=True)
+
+    def _delete_creds(self, creds):
+        try:
+            self._delete_user(creds.user_id)
+        except exceptions.NotFound:
+            LOG.warn("user with name: %s not found for delete" %
+                     creds.username)
+        try:
+            self._delete_tenant(creds.tenant_id)
+        except exceptions.NotFound:
+            LOG.warn("tenant with name: %s not found for delete" %
+                     creds.tenant_name)
 
     def clear_isolated_creds(self):
         if not self.isolated_creds:
             return
-        self._clear_isolated_net_resources()
-        for creds in self.isolated_creds.itervalues():
-            try:
-                self._delete_user(creds.user_id)
-            except exceptions.NotFound:
-                LOG.warn("user with name: %s not found for delete" %
-                         creds.username)
-            try:
-                self._delete_tenant(creds.tenant_id)
-            except exceptions.NotFound:
-                LOG.warn("tenant with name: %s not found for delete" %
-                         creds.tenant_name)
+        # NOTE: the users and tenants don't depend on the network resources,
+        # they are deleted along with the first ones
+        scheduler = parallel.TeardownScheduler()
+        self._schedule_net_resources_teardown(scheduler)
+        for credential_type, creds in self.isolated_creds.items():
+            scheduler.add(0, '%s credentials' % credential_type,
+                          self._delete_creds, creds)
+        scheduler.run(raise_on_error=True)
@@ -0,0 +1,253 @@
+# Copyright 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Pool of pre-booted servers shared by the compute API test classes
+
+Many test classes only need a generic ACTIVE server to query. For every
+server signature (tenant, image, flavor, network) the broker keeps up to
+CONF.compute.server_pool_size servers, booted ahead of demand by background
+threads. A released server goes back to the pool when it is still ACTIVE,
+once its metadata is reset; servers marked dirty and the ones failing that
+check are deleted and replaced.
+"""
+
+import atexit
+import collections
+from multiprocessing import pool as mp_pool
+import threading
+
+from tempest.common.utils import data_utils
+from tempest.common.utils import parallel
+from tempest import config
+from tempest import exceptions
+from tempest.openstack.common import log as logging
+
+CONF = config.CONF
+LOG = logging.getLogger(__name__)
+
+Signature = collections.namedtuple('Signature',
+                                   ['tenant_id', 'image', 'flavor',
+                                    'network'])
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+class ServerBroker(object):
+    """Hands out ACTIVE servers and recycles them once released.
+
+    `size` is the number of servers kept per signature, whether ready,
+    booting or in use. When they are all in use an extra server is booted
+    for the caller and deleted once released.
+    """
+
+    def __init__(self, size, workers=parallel.DEFAULT_WORKERS):
+        self.size = size
+        self.workers = workers
+        self._cond = threading.Condition()
+        self._clients = {}
+        self._ready = collections.defaultdict(list)
+        self._booting = collections.defaultdict(int)
+        self._total = collections.defaultdict(int)
+        self._acquired = {}
+        self._pending = 0
+        self._closed = False
+        self._thread_pool = None
+
+    def _submit(self, func, *args):
+        # NOTE: called with the lock held
+        if self._thread_pool is None:
+            self._thread_pool = mp_pool.ThreadPool(processes=self.workers)
+        self._pending += 1
+        self._thread_pool.apply_async(self._run, (func,) + args)
+
+    def _run(self, func, *args):
+        try:
+            func(*args)
+        finally:
+            with self._cond:
+                self._pending -= 1
+                self._cond.notify_all()
+
+    def join(self):
+        """Wait for the background boots and recycling to finish."""
+        with self._cond:
+            while self._pending:
+                self._cond.wait()
+
+    def _refill(self, key):
+        # NOTE: called with the lock held
+        while not self._closed and self._total[key] < self.size:
+            self._total[key] += 1
+            self._booting[key] += 1
+            self._submit(self._boot_ahead, key)
+
+    def _boot(self, key):
+        client = self._clients[key]
+        kwargs = {}
+        if key.network is not None:
+            kwargs['networks'] = [{'uuid': key.network}]
+        _, server = client.create_server(data_utils.rand_name('pooled'),
+                                         key.image, key.flavor, **kwargs)
+        try:
+            client.wait_for_server_status(server['id'], 'ACTIVE')
+            _, server = client.get_server(server['id'])
+        except Exception:
+            self._delete(key, server['id'])
+            raise
+        return server
+
+    def _boot_ahead(self, key):
+        try:
+            server = self._boot(key)
+        except Exception as exc:
+            LOG.error("Booting a pooled server for %s failed: %s" %
+                      (key, exc))
+            server = None
+        with self._cond:
+            self._booting[key] -= 1
+            if server is None:
+                self._total[key] -= 1
+            else:
+                self._ready[key].append(server)
+            self._cond.notify_all()
+
+    def _delete(self, key, server_id):
+        client = self._clients[key]
+        try:
+            client.delete_server(server_id)
+            client.wait_for_server_termination(server_id)
+        except exceptions.NotFound:
+            pass
+
+    def _discard(self, key, server_id):
+        """Delete a server of the pool and boot its replacement."""
+        try:
+            self._delete(key, server_id)
+        except Exception as exc:
+            LOG.error("Deleting pooled server %s failed: %s" %
+                      (server_id, exc))
+        with self._cond:
+            self._total[key] -= 1
+            self._refill(key)
+
+    def _is_active(self, key, server_id):
+        try:
+            _, server = self._clients[key].get_server(server_id)
+        except exceptions.NotFound:
+            return False
+        return server['status'] == 'ACTIVE'
+
+    def acquire(self, client, image, flavor, network=None):
+        """An ACTIVE server of the signature, booted if none is ready.
+
+        :param client: servers client of the tenant owning the server, the
+            broker keeps using the first one given for a signature
+        :return: the server details
+        """
+        key = Signature(client.tenant_id, image, flavor, network)
+        while True:
+            with self._cond:
+                self._clients.setdefault(key, client)
+                self._refill(key)
+                while not self._ready[key] and self._booting[key]:
+                    self._cond.wait()
+                if self._ready[key]:
+                    server = self._ready[key].pop(0)
+                else:
+                    # every server of the signature is in use
+                    server = None
+                    self._total[key] += 1
+            if server is None:
+                try:
+                    server = self._boot(key)
+                except Exception:
+                    with self._cond:
+                        self._total[key] -= 1
+                    raise
+            elif not self._is_active(key, server['id']):
+                LOG.warning("Pooled server %s is not ACTIVE anymore" %
+                            server['id'])
+                self._discard(key, server['id'])
+                continue
+            with self._cond:
+                self._acquired[server['id']] = key
+            return server
+
+    def release(self, server_id, dirty=False):
+        """Give back an acquired server, deleting it when dirty.
+
+        The server is checked and recycled in the background.
+        """
+        with self._cond:
+            key = self._acquired.pop(server_id, None)
+            if key is None:
+                LOG.warning("Server %s was not acquired from the pool" %
+                            server_id)
+                return
+            self._submit(self._recycle, key, server_id, dirty)
+
+    def _recycle(self, key, server_id, dirty):
+        if not dirty:
+            client = self._clients[key]
+            try:
+                client.wait_for_server_status(server_id, 'ACTIVE')
+                client.set_server_metadata(server_id, {})
+                _, server = client.get_server(server_id)
+            except Exception as exc:
+                LOG.warning("Pooled server %s can't be recycled: %s" %
+                            (server_id, exc))
+                dirty = True
+        with self._cond:
+            if not dirty and self._total[key] <= self.size:
+                self._ready[key].append(server)
+                self._cond.notify_all()
+                return
+        self._discard(key, server_id)
+
+    def shutdown(self):
+        """Wait for the background work, then delete every server."""
+        with self._cond:
+            self._closed = True
+        self.join()
+        if self._thread_pool is not None:
+            self._thread_pool.close()
+        scheduler = parallel.TeardownScheduler(workers=self.workers)
+        servers = [(key, server['id'])
+                   for key, ready in self._ready.items() for server in ready]
+        servers.extend((key, server_id)
+                       for server_id, key in self._acquired.items())
+        for key, server_id in servers:
+            scheduler.add(0, 'pooled server %s' % server_id, self._delete,
+                          key, server_id)
+        for outcome in scheduler.run():
+            if outcome.error is not None:
+                LOG.error("Deleting %s failed: %s" % (outcome.name,
+                                                      outcome.error))
+        self._ready.clear()
+        self._acquired.clear()
+
+
+def get_broker():
+    """The broker of the process, None when the server pool is disabled."""
+    global _broker
+    if CONF.compute.server_pool_size <= 0:
+        return None
+    with _broker_lock:
+        if _broker is None:
+            _broker = ServerBroker(CONF.compute.server_pool_size)
+            atexit.register(_broker.shutdown)
+    return _broker
@@ -13,6 +13,9 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import errno
+import fcntl
+
 
 def have_effective_read_access(path):
     try:
@@ -21,3 +24,22 @@ def have_effective_read_access(path):
         return False
     fh.close()
     return True
+
+
+def try_lock(path):
+    """Take an exclusive lock on path without waiting.
+
+    The lock is held until the returned file is closed, or the process
+    exits.
+
+    :return: the locked file, None if the lock is held by someone else
+    """
+    lock_file = open(path, 'a')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except IOError as exc:
+        lock_file.close()
+        if exc.errno in (errno.EACCES, errno.EAGAIN):
+            return None
+        raise
+    return lock_file
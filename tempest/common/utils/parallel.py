@@ -0,0 +1,137 @@
+# Copyright 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+import multiprocessing
+from multiprocessing import pool as mp_pool
+import time
+
+from tempest import exceptions
+from tempest.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 8
+
+Outcome = collections.namedtuple('Outcome', ['name', 'result', 'error'])
+
+
+def run_concurrently(calls, workers=DEFAULT_WORKERS, timeout=None,
+                     raise_on_error=False):
+    """Run callables on a bounded thread pool with a shared deadline.
+
+    The calls are I/O bound (REST calls and status polling), so threads
+    are used and at most `workers` of them run at the same time.
+
+    :param calls: iterable of (name, callable, args, kwargs) tuples, the
+        name is only used to report the outcome. It can be a generator,
+        calls are started while it is still being consumed.
+    :param workers: maximum number of calls running at the same time
+    :param timeout: deadline in seconds shared by all the calls, calls
+        still running when it expires are reported as timed out
+    :param raise_on_error: raise ConcurrentOperationsFailed listing every
+        failed call instead of returning the outcomes
+    :return: list of Outcome tuples, in the order of `calls`
+    """
+    if hasattr(calls, '__len__'):
+        workers = min(workers, len(calls))
+    thread_pool = None
+    pending = []
+    try:
+        for name, func, args, kwargs in calls:
+            if thread_pool is None:
+                thread_pool = mp_pool.ThreadPool(processes=max(1, workers))
+            pending.append((name, thread_pool.apply_async(func, args or (),
+                                                          kwargs or {})))
+    finally:
+        # NOTE: close() instead of terminate(), running calls can't be
+        # interrupted and terminate() would join them ignoring the deadline
+        if thread_pool is not None:
+            thread_pool.close()
+
+    deadline = None if timeout is None else time.time() + timeout
+    outcomes = []
+    for name, async_result in pending:
+        remaining = None
+        if deadline is not None:
+            remaining = max(deadline - time.time(), 0)
+        try:
+            outcomes.append(Outcome(name, async_result.get(remaining), None))
+        except multiprocessing.TimeoutError:
+            error = exceptions.TimeoutException(
+                "%s did not finish within %s seconds" % (name, timeout))
+            outcomes.append(Outcome(name, None, error))
+        except Exception as exc:
+            outcomes.append(Outcome(name, None, exc))
+
+    if raise_on_error:
+        check_outcomes(outcomes)
+    return outcomes
+
+
+def check_outcomes(outcomes):
+    """Raise a single exception listing every failed outcome."""
+    failed = [o for o in outcomes if o.error is not None]
+    if failed:
+        details = ["%s: %s" % (o.name, o.error) for o in failed]
+        raise exceptions.ConcurrentOperationsFailed(*details,
+                                                    failed=len(failed),
+                                                    total=len(outcomes))
+
+
+class TeardownScheduler(object):
+    """Deletes recorded resources respecting their dependency order.
+
+    Every deletion is registered with a level. Levels are processed in
+    ascending order and the deletions of a level run concurrently, so a
+    resource must be registered at a higher level than everything which
+    has to be gone before it can be deleted (e.g. ports at a lower level
+    than their subnets, subnets at a lower level than their networks).
+    Resources already gone (NotFound) are not considered failures.
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, timeout=None):
+        self.workers = workers
+        self.timeout = timeout
+        self._levels = collections.defaultdict(list)
+
+    def add(self, level, name, delete_callable, *args, **kwargs):
+        self._levels[level].append((name, self._ignore_not_found,
+                                    (delete_callable,) + args, kwargs))
+
+    @staticmethod
+    def _ignore_not_found(delete_callable, *args, **kwargs):
+        try:
+            return delete_callable(*args, **kwargs)
+        except exceptions.NotFound:
+            # If the resource is already missing, mission accomplished.
+            pass
+
+    def run(self, raise_on_error=False):
+        """Run every registered deletion, level after level.
+
+        A failed deletion doesn't stop the following levels, the ones
+        depending on it are expected to fail as well and are reported too.
+
+        :return: list of Outcome tuples of all the deletions
+        """
+        outcomes = []
+        for level in sorted(self._levels):
+            outcomes.extend(run_concurrently(self._levels.pop(level),
+                                             workers=self.workers,
+                                             timeout=self.timeout))
+        if raise_on_error:
+            check_outcomes(outcomes)
+        return outcomes
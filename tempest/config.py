@@ -17,6 +17,7 @@ from __future__ import print_function
 
 import logging as std_logging
 import os
+import threading
 
 from oslo.config import cfg
 
@@ -38,6 +39,16 @@ AuthGroup = [
                default='etc/accounts.yaml',
                help="Path to the yaml file that contains the list of "
                     "credentials to use for running tests"),
+    cfg.StrOpt('credential_pool_dir',
+               default=None,
+               help="Directory of the credential pool filled by "
+                    "tempest-account-pool. When set, tests running with "
+                    "tenant isolation take pre-created credentials from "
+                    "the pool instead of creating their own."),
+    cfg.IntOpt('credential_pool_timeout',
+               default=300,
+               help="Time in seconds to wait for free credentials in the "
+                    "credential pool"),
 ]
 
 
@@ -168,6 +179,13 @@ ComputeGroup = [
     cfg.IntOpt('build_timeout',
                default=300,
                help="Timeout in seconds to wait for an instance to build."),
+    cfg.IntOpt('server_pool_size',
+               default=0,
+               help="Number of servers per image, flavor and network kept "
+                    "ACTIVE by each test worker and shared by the test "
+                    "classes only querying a server. They are booted ahead "
+                    "of demand and recycled between classes. Only used "
+                    "without tenant isolation, 0 disables the pool."),
     cfg.BoolOpt('run_ssh',
                 default=False,
                 help="Should the tests ssh to instances?"),
@@ -813,9 +831,19 @@ StressGroup = [
     cfg.IntOpt('log_check_interval',
                default=60,
                help='time (in seconds) between log file error checks.'),
+    cfg.IntOpt('slo_check_interval',
+               default=10,
+               help='time (in seconds) between two evaluations of the '
+                    'service level objectives of the stress actions.'),
     cfg.IntOpt('default_thread_number_per_action',
                default=4,
                help='The number of threads created while stress test.'),
+    cfg.StrOpt('agent_token',
+               secret=True,
+               help='Secret shared by run-tempest-stress and the '
+                    'tempest-stress-agent processes. The agents only run '
+                    'the tests of a coordinator sending it, and refuse to '
+                    'start without it.'),
     cfg.BoolOpt('leave_dirty_stack',
                 default=False,
                 help='Prevent the cleaning (tearDownClass()) between'
@@ -861,7 +889,11 @@ ScenarioGroup = [
         'large_ops_number',
         default=0,
         help="specifies how many resources to request at once. Used "
-        "for large operations testing.")
+        "for large operations testing."),
+    cfg.IntOpt('cleanup_wait_workers',
+               default=8,
+               help="Maximum number of resource deletions waited on "
+                    "concurrently while cleaning up after a scenario test.")
 ]
 
 
@@ -907,6 +939,26 @@ ServiceAvailableGroup = [
                 help="Whether or not Zaqar is expected to be available"),
 ]
 
+discovery_group = cfg.OptGroup(name="discovery",
+                               title="API Discovery Options")
+
+DiscoveryGroup = [
+    cfg.StrOpt('cache_file',
+               default=None,
+               help="Path of the API discovery cache. When set, the "
+                    "versions and extensions of the services in the catalog "
+                    "are discovered once for all the test workers, and tests "
+                    "requiring a service or an extension which is not "
+                    "deployed are skipped before their class setup."),
+    cfg.IntOpt('cache_ttl',
+               default=3600,
+               help="Time in seconds after which the discovered apis are "
+                    "queried again"),
+    cfg.IntOpt('workers',
+               default=8,
+               help="Number of services queried at the same time"),
+]
+
 debug_group = cfg.OptGroup(name="debug",
                            title="Debug System")
 
@@ -1053,6 +1105,7 @@ def register_opts():
     register_opt_group(cfg.CONF, scenario_group, ScenarioGroup)
     register_opt_group(cfg.CONF, service_available_group,
                        ServiceAvailableGroup)
+    register_opt_group(cfg.CONF, discovery_group, DiscoveryGroup)
     register_opt_group(cfg.CONF, debug_group, DebugGroup)
     register_opt_group(cfg.CONF, baremetal_group, BaremetalGroup)
     register_opt_group(cfg.CONF, input_scenario_group, InputScenarioGroup)
@@ -1100,6 +1153,7 @@ class TempestConfigPrivate(object):
         self.stress = cfg.CONF.stress
         self.scenario = cfg.CONF.scenario
         self.service_available = cfg.CONF.service_available
+        self.discovery = cfg.CONF.discovery
         self.debug = cfg.CONF.debug
         self.baremetal = cfg.CONF.baremetal
         self.input_scenario = cfg.CONF['input-scenario']
@@ -1157,6 +1211,7 @@ class TempestConfigPrivate(object):
 class TempestConfigProxy(object):
     _config = None
     _path = None
+    _lock = threading.Lock()
 
     _extra_log_defaults = [
         'keystoneclient.session=INFO',
@@ -1172,8 +1227,12 @@ class TempestConfigProxy(object):
 
     def __getattr__(self, attr):
         if not self._config:
-            self._fix_log_levels()
-            self._config = TempestConfigPrivate(config_path=self._path)
+            # NOTE: the first access may come from several threads at once
+            with self._lock:
+                if not self._config:
+                    self._fix_log_levels()
+                    self._config = TempestConfigPrivate(
+                        config_path=self._path)
 
         return getattr(self._config, attr)
 
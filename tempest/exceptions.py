@@ -183,6 +183,10 @@ class TearDownException(TempestException):
     message = "%(num)d cleanUp operation failed"
 
 
+class ConcurrentOperationsFailed(TempestException):
+    message = "%(failed)d of %(total)d concurrent operations failed"
+
+
 class ResponseWithNonEmptyBody(RFCViolation):
     message = ("RFC Violation! Response with %(status)d HTTP Status Code "
                "MUST NOT have a body")
@@ -18,17 +18,19 @@ import logging
 import os
 import subprocess
 
-import netaddr
 import six
 
 from tempest import auth
 from tempest import clients
+from tempest.common import account_pool
+from tempest.common import cidr_allocator
 from tempest.common import debug
-from tempest.common import isolated_creds
 from tempest.common.utils import data_utils
 from tempest.common.utils.linux import remote_client
+from tempest.common.utils import parallel
 from tempest import config
 from tempest import exceptions
+from tempest.openstack.common import excutils
 from tempest.openstack.common import log
 from tempest.services.network import resources as net_resources
 import tempest.test
@@ -47,13 +49,16 @@ LOG_cinder_client.addHandler(log.NullHandler())
 
 class ScenarioTest(tempest.test.BaseTestCase):
     """Base class for scenario tests. Uses tempest own clients. """
+    credential_types = ['primary', 'admin']
 
     @classmethod
     def resource_setup(cls):
         super(ScenarioTest, cls).resource_setup()
         # Using tempest client for isolated credentials as well
-        cls.isolated_creds = isolated_creds.IsolatedCreds(
+        cls.isolated_creds = account_pool.get_isolated_creds(
             cls.__name__, network_resources=cls.network_resources)
+        if CONF.compute.allow_tenant_isolation:
+            cls.isolated_creds.prepare_credentials(cls.credential_types)
         cls.manager = clients.Manager(
             credentials=cls.credentials()
         )
@@ -161,10 +166,25 @@ class ScenarioTest(tempest.test.BaseTestCase):
         successful. This is the same basic approach used in the api tests to
         limit cleanup execution time except here it is multi-resource,
         because of the nature of the scenario tests.
+
+        The resources are independent of each other, so the waits run
+        concurrently and share a single deadline. Every wait that failed
+        or timed out is reported in one exception.
         """
+        calls = []
         for wait in self.cleanup_waits:
             waiter_callable = wait.pop('waiter_callable')
-            waiter_callable(**wait)
+            name = "%s(%s)" % (getattr(waiter_callable, '__name__',
+                                       waiter_callable),
+                               ', '.join('%s=%s' % item
+                                         for item in sorted(wait.items())))
+            calls.append((name, waiter_callable, None, wait))
+        timeout = max(CONF.compute.build_timeout,
+                      CONF.volume.build_timeout,
+                      CONF.network.build_timeout)
+        parallel.run_concurrently(calls,
+                                  workers=CONF.scenario.cleanup_wait_workers,
+                                  timeout=timeout, raise_on_error=True)
 
     # ## Test functions library
     #
@@ -526,24 +546,19 @@ class NetworkScenarioTest(ScenarioTest):
         if not client:
             client = self.network_client
 
-        def cidr_in_use(cidr, tenant_id):
-            """
-            :return True if subnet with cidr already exist in tenant
-                False else
-            """
-            cidr_in_use = self._list_subnets(tenant_id=tenant_id, cidr=cidr)
-            return len(cidr_in_use) != 0
+        def list_cidrs():
+            return [subnet['cidr'] for subnet
+                    in self._list_subnets(fields=['cidr'])]
 
-        tenant_cidr = netaddr.IPNetwork(CONF.network.tenant_network_cidr)
+        # NOTE: shared with the isolated credentials, the subnets of every
+        # tenant are avoided
+        allocator = cidr_allocator.get_allocator(list_cidrs)
         result = None
-        # Repeatedly attempt subnet creation with sequential cidr
-        # blocks until an unallocated block is found.
-        for subnet_cidr in tenant_cidr.subnet(
-                CONF.network.tenant_network_mask_bits):
-            str_cidr = str(subnet_cidr)
-            if cidr_in_use(str_cidr, tenant_id=network.tenant_id):
-                continue
-
+        refresh = False
+        # The allocator knows the blocks in use, a block can only be in use
+        # if something else created a subnet meanwhile.
+        while result is None:
+            str_cidr = allocator.allocate(refresh=refresh)
             subnet = dict(
                 name=data_utils.rand_name(namestart),
                 ip_version=4,
@@ -554,16 +569,24 @@ class NetworkScenarioTest(ScenarioTest):
             )
             try:
                 _, result = client.create_subnet(**subnet)
-                break
-            except exceptions.Conflict as e:
-                is_overlapping_cidr = 'overlaps with another subnet' in str(e)
+            except Exception as e:
+                is_overlapping_cidr = (
+                    isinstance(e, exceptions.Conflict) and
+                    'overlaps with another subnet' in str(e))
                 if not is_overlapping_cidr:
-                    raise
-        self.assertIsNotNone(result, 'Unable to allocate tenant network')
+                    with excutils.save_and_reraise_exception():
+                        allocator.release(str_cidr)
+                refresh = True
         subnet = net_resources.DeletableSubnet(client=client,
                                                **result['subnet'])
         self.assertEqual(subnet.cidr, str_cidr)
-        self.addCleanup(self.delete_wrapper, subnet.delete)
+
+        def _delete_subnet():
+            self.delete_wrapper(subnet.delete)
+            # the block is only given back once the subnet is gone
+            allocator.release(str_cidr)
+
+        self.addCleanup(_delete_subnet)
         return subnet
 
     def _create_port(self, network, client=None, namestart='port-quotatest'):
@@ -27,6 +27,7 @@ LOG = logging.getLogger(__name__)
 
 
 class TestSecurityGroupsBasicOps(manager.NetworkScenarioTest):
+    credential_types = ['primary', 'admin', 'alt']
 
     """
     This test suite assumes that Nova has been configured to
@@ -0,0 +1,85 @@
+# Copyright 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Arrival schedules of open-loop stress actions
+
+A schedule is an iterator of offsets in seconds, relative to the start of
+the worker, at which the action is intended to be run. Offsets are generated
+lazily, so the random state of Poisson arrivals is set up in the worker
+process and every worker gets its own sequence.
+"""
+
+import itertools
+import random
+
+from tempest import exceptions
+
+ARRIVALS = ('fixed', 'poisson')
+
+
+def fixed_arrivals(rate):
+    """Evenly spaced arrivals, `rate` per second."""
+    for index in itertools.count():
+        yield index / float(rate)
+
+
+def poisson_arrivals(rate):
+    """Arrivals of a Poisson process, `rate` per second on average."""
+    generator = random.Random()
+    offset = 0.0
+    while True:
+        offset += generator.expovariate(rate)
+        yield offset
+
+
+def trace_arrivals(path, start=0, step=1):
+    """Replay the offsets of a trace file, one offset in seconds per line.
+
+    Only every `step`-th line beginning at `start` is used, so that the
+    processes of an action share the trace.
+    """
+    with open(path) as trace:
+        offsets = [float(line) for line in trace if line.strip()]
+    for offset in sorted(offsets)[start::step]:
+        yield offset
+
+
+def from_descriptor(test, threads, p_number):
+    """Build the schedule of a process from a stress test descriptor.
+
+    The `rate` field is the number of runs per second of the whole action,
+    it is split evenly between its `threads` processes. `arrival` selects
+    the distribution of the arrivals (fixed by default). A `trace` file
+    replaces both.
+
+    :return: a schedule, or None for the closed-loop mode
+    """
+    if 'trace' in test:
+        return trace_arrivals(test['trace'], p_number, threads)
+    if 'rate' not in test:
+        return None
+    arrival = test.get('arrival', 'fixed')
+    if arrival not in ARRIVALS:
+        raise exceptions.InvalidConfiguration(
+            "Unknown arrival %s of %s, use one of %s" %
+            (arrival, test['action'], ', '.join(ARRIVALS)))
+    rate = float(test['rate']) / threads
+    if rate <= 0:
+        raise exceptions.InvalidConfiguration(
+            "The rate of %s must be positive" % test['action'])
+    if arrival == 'poisson':
+        return poisson_arrivals(rate)
+    return fixed_arrivals(rate)
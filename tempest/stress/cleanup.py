@@ -14,99 +14,158 @@
 #    See the License for the specific language governing permissions and
 #    limitations under the License.
 
+import time
+
 from tempest import clients
+from tempest.common.utils import parallel
+from tempest import config
 from tempest.openstack.common import log as logging
 
+CONF = config.CONF
+
 LOG = logging.getLogger(__name__)
 
+WORKERS = parallel.DEFAULT_WORKERS
 
-def cleanup():
-    admin_manager = clients.AdminManager()
 
-    _, body = admin_manager.servers_client.list_servers({"all_tenants": True})
-    LOG.info("Cleanup::remove %s servers" % len(body['servers']))
-    for s in body['servers']:
-        try:
-            admin_manager.servers_client.delete_server(s['id'])
-        except Exception:
-            pass
+def _delete_all(resource, items, delete, name=lambda item: item['id']):
+    """Delete items concurrently, errors are logged but not raised."""
+    LOG.info("Cleanup::remove %s %s" % (len(items), resource))
+    outcomes = parallel.run_concurrently(
+        [("%s %s" % (resource, name(item)), delete, (item,), None)
+         for item in items], workers=WORKERS)
+    for outcome in outcomes:
+        if outcome.error is not None:
+            LOG.debug("Cleanup::%s failed: %s" % (outcome.name,
+                                                  outcome.error))
 
-    for s in body['servers']:
-        try:
-            admin_manager.servers_client.wait_for_server_termination(s['id'])
-        except Exception:
-            pass
 
-    _, keypairs = admin_manager.keypairs_client.list_keypairs()
-    LOG.info("Cleanup::remove %s keypairs" % len(keypairs))
-    for k in keypairs:
-        try:
-            admin_manager.keypairs_client.delete_keypair(k['name'])
-        except Exception:
-            pass
-
-    secgrp_client = admin_manager.security_groups_client
-    _, secgrp = secgrp_client.list_security_groups({"all_tenants": True})
-    secgrp_del = [grp for grp in secgrp if grp['name'] != 'default']
-    LOG.info("Cleanup::remove %s Security Group" % len(secgrp_del))
-    for g in secgrp_del:
-        try:
-            secgrp_client.delete_security_group(g['id'])
-        except Exception:
-            pass
+def _wait_for_deletion(resource, list_ids, ids, timeout, interval):
+    """Wait until none of the ids is listed any more.
 
-    _, floating_ips = admin_manager.floating_ips_client.list_floating_ips()
-    LOG.info("Cleanup::remove %s floating ips" % len(floating_ips))
-    for f in floating_ips:
+    One list call checks all the resources, instead of a call per resource.
+    """
+    remaining = set(ids)
+    start = time.time()
+    while remaining:
         try:
-            admin_manager.floating_ips_client.delete_floating_ip(f['id'])
-        except Exception:
-            pass
-
-    _, users = admin_manager.identity_client.get_users()
-    LOG.info("Cleanup::remove %s users" % len(users))
-    for user in users:
-        if user['name'].startswith("stress_user"):
-            admin_manager.identity_client.delete_user(user['id'])
-
-    _, tenants = admin_manager.identity_client.list_tenants()
-    LOG.info("Cleanup::remove %s tenants" % len(tenants))
-    for tenant in tenants:
-        if tenant['name'].startswith("stress_tenant"):
-            admin_manager.identity_client.delete_tenant(tenant['id'])
+            remaining &= list_ids()
+        except Exception as exc:
+            LOG.debug("Cleanup::listing %s failed: %s" % (resource, exc))
+        if not remaining:
+            return
+        if time.time() - start >= timeout:
+            LOG.warning("Cleanup::%s %s still not deleted after %ss" %
+                        (len(remaining), resource, timeout))
+            return
+        time.sleep(interval)
+
+
+def _run_stage(*steps):
+    """Run independent cleanup steps concurrently."""
+    outcomes = parallel.run_concurrently([(step.__name__, step, None, None)
+                                          for step in steps],
+                                         workers=len(steps))
+    for outcome in outcomes:
+        if outcome.error is not None:
+            LOG.error("Cleanup::%s failed: %s" % (outcome.name,
+                                                  outcome.error))
 
+
+def cleanup():
+    """Delete the resources of all the tenants left over by stress tests.
+
+    Resources are deleted in stages, so that the ones in use are deleted
+    after their users: servers, then keypairs, security groups and floating
+    ips, then the stress users and tenants, then snapshots and at last
+    volumes (volume deletion may block on their snapshots). The resources
+    of a stage are deleted concurrently.
+    """
+    admin_manager = clients.AdminManager()
+    servers_client = admin_manager.servers_client
+    snapshots_client = admin_manager.snapshots_client
+    volumes_client = admin_manager.volumes_client
+    identity_client = admin_manager.identity_client
+
+    def _server_ids():
+        _, body = servers_client.list_servers({"all_tenants": True})
+        return set(s['id'] for s in body['servers'])
+
+    def servers():
+        ids = _server_ids()
+        _delete_all('servers', [{'id': i} for i in ids],
+                    lambda s: servers_client.delete_server(s['id']))
+        _wait_for_deletion('servers', _server_ids, ids,
+                           CONF.compute.build_timeout,
+                           CONF.compute.build_interval)
+
+    def keypairs():
+        _, keypairs = admin_manager.keypairs_client.list_keypairs()
+        _delete_all('keypairs', keypairs,
+                    lambda k: admin_manager.keypairs_client.delete_keypair(
+                        k['name']),
+                    name=lambda k: k['name'])
+
+    def security_groups():
+        secgrp_client = admin_manager.security_groups_client
+        _, secgrp = secgrp_client.list_security_groups({"all_tenants": True})
+        _delete_all('security groups',
+                    [grp for grp in secgrp if grp['name'] != 'default'],
+                    lambda g: secgrp_client.delete_security_group(g['id']))
+
+    def floating_ips():
+        floating_ips_client = admin_manager.floating_ips_client
+        _, floating_ips = floating_ips_client.list_floating_ips()
+        _delete_all('floating ips', floating_ips,
+                    lambda f: floating_ips_client.delete_floating_ip(f['id']))
+
+    def users():
+        _, users = identity_client.get_users()
+        _delete_all('users', [user for user in users
+                              if user['name'].startswith("stress_user")],
+                    lambda u: identity_client.delete_user(u['id']))
+
+    def tenants():
+        _, tenants = identity_client.list_tenants()
+        _delete_all('tenants',
+                    [tenant for tenant in tenants
+                     if tenant['name'].startswith("stress_tenant")],
+                    lambda t: identity_client.delete_tenant(t['id']))
+
+    def _snapshot_ids():
+        _, snaps = snapshots_client.list_snapshots({"all_tenants": True})
+        return set(v['id'] for v in snaps)
+
+    def _delete_snapshot(snap):
+        snapshots_client.wait_for_snapshot_status(snap['id'], 'available')
+        snapshots_client.delete_snapshot(snap['id'])
+
+    def snapshots():
+        ids = _snapshot_ids()
+        _delete_all('snapshots', [{'id': i} for i in ids], _delete_snapshot)
+        _wait_for_deletion('snapshots', _snapshot_ids, ids,
+                           CONF.volume.build_timeout,
+                           CONF.volume.build_interval)
+
+    def _volume_ids():
+        _, vols = volumes_client.list_volumes({"all_tenants": True})
+        return set(v['id'] for v in vols)
+
+    def _delete_volume(vol):
+        volumes_client.wait_for_volume_status(vol['id'], 'available')
+        volumes_client.delete_volume(vol['id'])
+
+    def volumes():
+        ids = _volume_ids()
+        _delete_all('volumes', [{'id': i} for i in ids], _delete_volume)
+        _wait_for_deletion('volumes', _volume_ids, ids,
+                           CONF.volume.build_timeout,
+                           CONF.volume.build_interval)
+
+    _run_stage(servers)
+    _run_stage(keypairs, security_groups, floating_ips)
+    _run_stage(users, tenants)
     # We have to delete snapshots first or
     # volume deletion may block
-
-    _, snaps = admin_manager.snapshots_client.\
-        list_snapshots({"all_tenants": True})
-    LOG.info("Cleanup::remove %s snapshots" % len(snaps))
-    for v in snaps:
-        try:
-            admin_manager.snapshots_client.\
-                wait_for_snapshot_status(v['id'], 'available')
-            admin_manager.snapshots_client.delete_snapshot(v['id'])
-        except Exception:
-            pass
-
-    for v in snaps:
-        try:
-            admin_manager.snapshots_client.wait_for_resource_deletion(v['id'])
-        except Exception:
-            pass
-
-    _, vols = admin_manager.volumes_client.list_volumes({"all_tenants": True})
-    LOG.info("Cleanup::remove %s volumes" % len(vols))
-    for v in vols:
-        try:
-            admin_manager.volumes_client.\
-                wait_for_volume_status(v['id'], 'available')
-            admin_manager.volumes_client.delete_volume(v['id'])
-        except Exception:
-            pass
-
-    for v in vols:
-        try:
-            admin_manager.volumes_client.wait_for_resource_deletion(v['id'])
-        except Exception:
-            pass
+    _run_stage(snapshots)
+    _run_stage(volumes)
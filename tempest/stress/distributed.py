@@ -0,0 +1,441 @@
+# Copyright 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Distributed execution of stress tests
+
+A coordinator drives agents running on several load generator hosts. The
+messages are JSON documents, one per line, over TCP:
+
+ * coordinator -> agent: prepare (tests and run parameters), start (after
+   a delay, so that all the agents start their workers together), stop
+ * agent -> coordinator: ready, metrics (statistics totals per action),
+   error (a failed run with stop-on-error, or a broken SLO), done
+
+An error of any agent stops the whole run, like the SIGCHLD handler stops
+all the local processes in stop-on-error mode.
+
+The agents run arbitrary stress actions with the credentials of their host,
+the prepare message must carry the token shared with them.
+"""
+
+import binascii
+import errno
+import hmac
+import json
+import multiprocessing
+import os
+import select
+import signal
+import socket
+import time
+
+import six
+
+from tempest import exceptions
+from tempest.openstack.common import log as logging
+from tempest.stress import driver
+from tempest.stress import metrics
+from tempest.stress import statistics
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_PORT = 8765
+START_DELAY = 2
+# Seconds given to the agents to stop by themselves after the duration
+STOP_MARGIN = 60
+# Seconds waited for the agents to end once stopped, on top of their
+# terminate_timeout
+STOP_GRACE = 10
+# Seconds after which a run limited by a number of runs is stopped
+MAX_RUNS_TIMEOUT = 3600
+
+
+def send_message(sock, message_type, **fields):
+    fields['type'] = message_type
+    sock.sendall((json.dumps(fields) + '\n').encode('utf-8'))
+
+
+class MessageReader(object):
+    """Splits the data received on a socket into messages."""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self._buffer = ''
+        self.closed = False
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def receive(self):
+        """Read the available data, return the complete messages."""
+        try:
+            data = self.sock.recv(65536)
+        except socket.error as exc:
+            if exc.args[0] != errno.ECONNRESET:
+                raise
+            data = None
+        if not data:
+            self.closed = True
+            return []
+        self._buffer += data.decode('utf-8')
+        lines = self._buffer.split('\n')
+        self._buffer = lines.pop()
+        return [json.loads(line) for line in lines if line]
+
+    def wait(self, timeout=None):
+        """Return the messages received within timeout."""
+        if self.closed:
+            return []
+        try:
+            readable, _, _ = select.select([self], [], [], timeout)
+        except select.error as exc:
+            # SIGCHLD of the stress processes interrupts the wait
+            if exc.args[0] != errno.EINTR:
+                raise
+            return []
+        if not readable:
+            return []
+        return self.receive()
+
+    def next_message(self, timeout=None):
+        """Block until a message is received, None if the peer is gone."""
+        deadline = None if timeout is None else time.time() + timeout
+        while not self.closed:
+            remaining = None
+            if deadline is not None:
+                remaining = max(deadline - time.time(), 0)
+            messages = self.wait(remaining)
+            if messages:
+                # NOTE: one message at a time is sent before an answer
+                return messages[0]
+            if deadline is not None and time.time() >= deadline:
+                raise exceptions.TimeoutException(
+                    "No message received within %s seconds" % timeout)
+        return None
+
+
+def new_token():
+    return binascii.hexlify(os.urandom(16))
+
+
+def _token_matches(token, expected):
+    token = six.text_type(token or '').encode('utf-8')
+    return hmac.compare_digest(token,
+                               six.text_type(expected).encode('utf-8'))
+
+
+def _totals_message(processes):
+    return dict((action, totals._asdict()) for action, totals
+                in metrics.action_totals(processes).items())
+
+
+class Agent(object):
+    """Runs the workers of a stress test on behalf of a coordinator.
+
+    :param listener: listening socket the coordinator connects to
+    :param token: secret the coordinator must send in the prepare message
+    """
+
+    def __init__(self, listener, token):
+        if not token:
+            raise exceptions.InvalidConfiguration(
+                "The stress agents require a token")
+        self.listener = listener
+        self.token = token
+
+    def serve(self, once=False):
+        while True:
+            conn, address = self.listener.accept()
+            LOG.info("Coordinator %s:%s connected" % address[:2])
+            try:
+                self._run(conn)
+            except Exception:
+                LOG.exception("Stress run of %s:%s failed" % address[:2])
+            finally:
+                self._close(conn)
+                del driver.processes[:]
+            if once:
+                return
+
+    @staticmethod
+    def _close(conn, timeout=10):
+        # NOTE: wait for the coordinator to close first, closing a socket
+        # with unread data (a late stop) resets the connection and the
+        # coordinator could lose the last messages
+        try:
+            conn.shutdown(socket.SHUT_WR)
+            reader = MessageReader(conn)
+            deadline = time.time() + timeout
+            while not reader.closed and time.time() < deadline:
+                reader.wait(max(deadline - time.time(), 0))
+        except socket.error:
+            pass
+        conn.close()
+
+    def _run(self, conn):
+        reader = MessageReader(conn)
+        prepare = reader.next_message()
+        if prepare is None or prepare['type'] != 'prepare':
+            return
+        if not _token_matches(prepare.get('token'), self.token):
+            LOG.error("Refusing a coordinator with an invalid token")
+            send_message(conn, 'error', reason="Invalid token")
+            send_message(conn, 'done')
+            return
+        stop_on_error = prepare['stop_on_error']
+        try:
+            monitors = driver.prepare_processes(prepare['tests'],
+                                                prepare['max_runs'],
+                                                stop_on_error)
+        except Exception as exc:
+            send_message(conn, 'error', reason="Prepare failed: %s" % exc)
+            send_message(conn, 'done')
+            return
+        send_message(conn, 'ready')
+        start = reader.next_message()
+        if start is None or start['type'] != 'start':
+            return
+        time.sleep(start['delay'])
+
+        if stop_on_error:
+            signal.signal(signal.SIGCHLD, driver.sigchld_handler)
+        driver.start_processes()
+        duration = prepare['duration']
+        end_time = None if duration is None else time.time() + duration
+        try:
+            while True:
+                timeout = prepare['interval']
+                if end_time is not None:
+                    timeout = min(timeout, max(end_time - time.time(), 0))
+                messages = reader.wait(timeout)
+                if reader.closed or any(m['type'] == 'stop'
+                                        for m in messages):
+                    break
+                send_message(conn, 'metrics',
+                             actions=_totals_message(driver.processes))
+                reason = self._error(monitors, stop_on_error)
+                if reason is not None:
+                    send_message(conn, 'error', reason=reason)
+                    break
+                if end_time is not None and time.time() >= end_time:
+                    break
+                if prepare['max_runs'] is not None and not any(
+                        p['process'].is_alive() for p in driver.processes):
+                    break
+        finally:
+            if stop_on_error:
+                signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+            driver.terminate_all_processes(prepare['terminate_timeout'])
+        if not reader.closed:
+            send_message(conn, 'metrics',
+                         actions=_totals_message(driver.processes))
+            send_message(conn, 'done')
+
+    @staticmethod
+    def _error(monitors, stop_on_error):
+        if stop_on_error:
+            for process in driver.processes:
+                if (process['statistic']['fails'] > 0 or
+                        process['process'].exitcode not in (None, 0)):
+                    return "%s failed" % process['action']
+        breaking_points = driver._check_slos(monitors)
+        if breaking_points:
+            return '; '.join(breaking_points)
+        return None
+
+
+def _serve_local(agent):
+    agent.serve(once=True)
+
+
+def start_local_agents(count, token):
+    """Start stand-in agents on the local host.
+
+    :return: the addresses of the agents and their processes
+    """
+    addresses = []
+    agents = []
+    for index in range(count):
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.bind(('127.0.0.1', 0))
+        listener.listen(1)
+        addresses.append(listener.getsockname())
+        # NOTE: not a daemon process, daemon processes can't fork workers
+        process = multiprocessing.Process(target=_serve_local,
+                                          args=(Agent(listener, token),))
+        process.start()
+        listener.close()
+        agents.append(process)
+    return addresses, agents
+
+
+class RemoteStatistic(object):
+    """Statistics totals of an action as last reported by an agent."""
+
+    def __init__(self):
+        self.counters = {'runs': 0, 'fails': 0, 'drops': 0}
+        self.histogram = statistics.merge_histograms([])
+        self.latency_sum = 0
+
+    def __getitem__(self, name):
+        return self.counters[name]
+
+    def update(self, totals):
+        self.counters['runs'] = totals['runs']
+        self.counters['fails'] = totals['fails']
+        self.counters['drops'] = totals.get('drops', 0)
+        self.histogram = totals['histogram']
+        self.latency_sum = totals['latency_sum']
+
+
+class Coordinator(object):
+    """Runs stress tests on agents and aggregates their statistics.
+
+    :param addresses: (host, port) of the agents
+    :param token: secret shared with the agents
+    """
+
+    def __init__(self, addresses, token):
+        self.addresses = addresses
+        self.token = token
+        # Statistics per agent and action, shaped like the driver processes
+        # to reuse the metrics sink and report
+        self.processes = []
+
+    def _statistic(self, agent, action):
+        for process in self.processes:
+            if process['agent'] == agent and process['action'] == action:
+                return process['statistic']
+        process = {'agent': agent, 'action': action,
+                   'statistic': RemoteStatistic()}
+        self.processes.append(process)
+        return process['statistic']
+
+    def _broadcast(self, readers, message_type, **fields):
+        for reader in readers:
+            if not reader.closed:
+                try:
+                    send_message(reader.sock, message_type, **fields)
+                except socket.error:
+                    reader.closed = True
+
+    def run(self, tests, duration, max_runs=None, stop_on_error=False,
+            metrics_file=None, report_file=None, terminate_timeout=20):
+        """Run the tests on all the agents, same semantics as
+        driver.stress_openstack.
+        """
+        interval = int(driver.CONF.stress.log_check_interval)
+        readers = [MessageReader(socket.create_connection(address))
+                   for address in self.addresses]
+        names = ["%s:%s" % tuple(address[:2]) for address in self.addresses]
+        had_errors = False
+        self.breaking_points = []
+        start_time = time.time()
+        try:
+            for reader in readers:
+                send_message(reader.sock, 'prepare', token=self.token,
+                             tests=tests,
+                             duration=None if max_runs else duration,
+                             max_runs=max_runs,
+                             stop_on_error=stop_on_error,
+                             interval=interval,
+                             terminate_timeout=terminate_timeout)
+            for name, reader in zip(names, readers):
+                message = reader.next_message()
+                if message is None or message['type'] != 'ready':
+                    LOG.error("Agent %s is not ready: %s" % (name, message))
+                    self._broadcast(readers, 'stop')
+                    return 1
+            self._broadcast(readers, 'start', delay=START_DELAY)
+            start_time = time.time() + START_DELAY
+            had_errors = self._collect(readers, names, duration, max_runs,
+                                       metrics_file, interval,
+                                       terminate_timeout)
+        finally:
+            for reader in readers:
+                reader.sock.close()
+
+        LOG.info("Statistics (per agent):")
+        for process in self.processes:
+            statistic = process['statistic']
+            if statistic['fails'] > 0:
+                had_errors = True
+            LOG.info(" Agent %s (%s): Run %d actions (%d failed)" %
+                     (process['agent'], process['action'],
+                      statistic['runs'], statistic['fails']))
+        for action, totals in metrics.action_totals(self.processes).items():
+            LOG.info("%s: Run %d actions (%d failed), latency %s" %
+                     (action, totals.runs, totals.fails,
+                      statistics.format_histogram(totals.histogram)))
+        if report_file:
+            metrics.write_report(report_file, self.processes,
+                                 time.time() - start_time,
+                                 self.breaking_points)
+        return 1 if had_errors else 0
+
+    def _collect(self, readers, names, duration, max_runs, metrics_file,
+                 interval, terminate_timeout):
+        sink = metrics.MetricsSink(metrics_file) if metrics_file else None
+        next_snapshot = time.time() + START_DELAY + interval
+        self.breaking_points = []
+        had_errors = False
+        # the agents stop by themselves, this is a safety net against stuck
+        # actions and silent or half-open connections
+        stop_time = (time.time() + START_DELAY +
+                     (MAX_RUNS_TIMEOUT if max_runs else duration) +
+                     terminate_timeout + STOP_MARGIN)
+        stopping = False
+        done = set()
+        while len(done) < len(readers):
+            pending = [r for r in readers if r not in done and not r.closed]
+            if not pending:
+                break
+            # NOTE: checked even if agents keep sending metrics
+            if time.time() >= stop_time:
+                if stopping:
+                    LOG.error("Agents %s did not stop, giving up" %
+                              [names[readers.index(r)] for r in pending])
+                    had_errors = True
+                    break
+                LOG.warning("Agents did not stop in time, stopping them")
+                self._broadcast(readers, 'stop')
+                stopping = True
+                stop_time = time.time() + terminate_timeout + STOP_GRACE
+            readable, _, _ = select.select(pending, [], [],
+                                           max(stop_time - time.time(), 0))
+            for reader in readable:
+                name = names[readers.index(reader)]
+                for message in reader.receive():
+                    if message['type'] == 'metrics':
+                        for action, totals in message['actions'].items():
+                            self._statistic(name, action).update(totals)
+                    elif message['type'] == 'error':
+                        LOG.error("Agent %s: %s" % (name, message['reason']))
+                        self.breaking_points.append(
+                            "%s: %s" % (name, message['reason']))
+                        had_errors = True
+                        self._broadcast(readers, 'stop')
+                    elif message['type'] == 'done':
+                        done.add(reader)
+                if reader.closed:
+                    done.add(reader)
+            if sink is not None and time.time() >= next_snapshot:
+                next_snapshot = time.time() + interval
+                sink.snapshot(self.processes)
+        if sink is not None:
+            sink.snapshot(self.processes)
+            sink.close()
+        return had_errors
@@ -12,6 +12,7 @@
 #    See the License for the specific language governing permissions and
 #    limitations under the License.
 
+import json
 import multiprocessing
 import os
 import signal
@@ -23,11 +24,19 @@ from tempest import auth
 from tempest import clients
 from tempest.common import ssh
 from tempest.common.utils import data_utils
+from tempest.common.utils import parallel
 from tempest import config
 from tempest import exceptions
 from tempest.openstack.common import importutils
 from tempest.openstack.common import log as logging
+from tempest.stress import arrivals
 from tempest.stress import cleanup
+from tempest.stress import log_scanner
+from tempest.stress import metrics
+from tempest.stress import profiles
+from tempest.stress import slo
+from tempest.stress import statistics
+from tempest.stress import stressaction
 
 CONF = config.CONF
 
@@ -64,21 +73,33 @@ def _get_compute_nodes(controller, ssh_user, ssh_key=None):
     return nodes
 
 
-def _has_error_in_logs(logfiles, nodes, ssh_user, ssh_key=None,
-                       stop_on_error=False):
+def _has_error_in_logs(scanner):
     """
-    Detect errors in the nova log files on the controller and compute nodes.
+    Detect new errors in the nova log files on the controller and compute
+    nodes.
     """
-    grep = 'egrep "ERROR|TRACE" %s' % logfiles
-    ret = False
-    for node in nodes:
-        errors = do_ssh(grep, node, ssh_user, ssh_key)
-        if len(errors) > 0:
-            LOG.error('%s: %s' % (node, errors))
-            ret = True
-            if stop_on_error:
-                break
-    return ret
+    errors = scanner.scan()
+    for node, lines in sorted(errors.items()):
+        LOG.error('%s: %s' % (node, '\n'.join(lines)))
+    return bool(errors)
+
+
+def _check_slos(monitors):
+    """
+    Returns the breaking points of the actions whose SLO is broken.
+    """
+    breaking_points = []
+    for monitor in monitors:
+        # NOTE: the load level is read before the check, the runs breaking
+        # the objective were run under it, not under the next step
+        load_level = monitor.load_level()
+        reason = monitor.check()
+        if reason is not None:
+            breaking_point = ("%s broke its SLO (%s) at %s" %
+                              (monitor.action, reason, load_level))
+            LOG.error(breaking_point)
+            breaking_points.append(breaking_point)
+    return breaking_points
 
 
 def sigchld_handler(signalnum, frame):
@@ -104,8 +125,13 @@ def terminate_all_processes(check_interval=20):
                 process['process'].terminate()
             except Exception:
                 pass
-    time.sleep(check_interval)
+    deadline = time.time() + check_interval
+    for process in processes:
+        if 'started' in process:
+            process['process'].join(max(deadline - time.time(), 0))
     for process in processes:
+        if 'started' not in process:
+            continue
         if process['process'].is_alive():
             try:
                 pid = process['process'].pid
@@ -116,45 +142,83 @@ def terminate_all_processes(check_interval=20):
         process['process'].join()
 
 
-def stress_openstack(tests, duration, max_runs=None, stop_on_error=False):
+def _provision_identity(identity_client):
+    username = data_utils.rand_name("stress_user")
+    tenant_name = data_utils.rand_name("stress_tenant")
+    password = "pass"
+    _, tenant = identity_client.create_tenant(name=tenant_name)
+    identity_client.create_user(username,
+                                password,
+                                tenant['id'],
+                                "email")
+    return auth.get_credentials(username=username,
+                                password=password,
+                                tenant_name=tenant_name)
+
+
+def _isolated_credentials(test, threads, admin_manager):
     """
-    Workload driver. Executes an action function against a nova-cluster.
+    Returns the credentials of a tenant per thread. They are read from the
+    isolated_tenants_file of the test (a JSON list of username, password and
+    tenant_name), or the tenants are created concurrently.
     """
-    admin_manager = clients.AdminManager()
+    pool_file = test.get('isolated_tenants_file')
+    if pool_file:
+        with open(pool_file) as f:
+            pool = json.load(f)
+        if len(pool) < threads:
+            raise exceptions.InvalidConfiguration(
+                "%s has %d tenants, %d threads of %s need one each" %
+                (pool_file, len(pool), threads, test['action']))
+        return [auth.get_credentials(**identity)
+                for identity in pool[:threads]]
 
-    ssh_user = CONF.stress.target_ssh_user
-    ssh_key = CONF.stress.target_private_key_path
-    logfiles = CONF.stress.target_logfiles
-    log_check_interval = int(CONF.stress.log_check_interval)
+    start = time.time()
+    outcomes = parallel.run_concurrently(
+        [("stress identity %d" % p_number, _provision_identity,
+          (admin_manager.identity_client,), None)
+         for p_number in moves.xrange(threads)],
+        raise_on_error=True)
+    elapsed = time.time() - start
+    LOG.info("Provisioned %d tenants for %s in %.1fs (%.1f/s)" %
+             (threads, test['action'], elapsed,
+              threads / max(elapsed, 1e-6)))
+    return [outcome.result for outcome in outcomes]
+
+
+def prepare_processes(tests, max_runs=None, stop_on_error=False):
+    """
+    Sets up the actions of the tests and creates their processes, without
+    starting them. Returns the SLO monitors of the tests.
+    """
+    admin_manager = clients.AdminManager()
     default_thread_num = int(CONF.stress.default_thread_number_per_action)
-    if logfiles:
-        controller = CONF.stress.target_controller
-        computes = _get_compute_nodes(controller, ssh_user, ssh_key)
-        for node in computes:
-            do_ssh("rm -f %s" % logfiles, node, ssh_user, ssh_key)
+    monitors = []
     for test in tests:
         if test.get('use_admin', False):
             manager = admin_manager
         else:
             manager = clients.Manager()
-        for p_number in moves.xrange(test.get('threads', default_thread_num)):
-            if test.get('use_isolated_tenants', False):
-                username = data_utils.rand_name("stress_user")
-                tenant_name = data_utils.rand_name("stress_tenant")
-                password = "pass"
-                identity_client = admin_manager.identity_client
-                _, tenant = identity_client.create_tenant(name=tenant_name)
-                identity_client.create_user(username,
-                                            password,
-                                            tenant['id'],
-                                            "email")
-                creds = auth.get_credentials(username=username,
-                                             password=password,
-                                             tenant_name=tenant_name)
-                manager = clients.Manager(credentials=creds)
+        threads = test.get('threads', default_thread_num)
+        threads_per_process = test.get('threads_per_process', 1)
+        test_processes = []
+        group = []
+        isolated_creds = None
+        if test.get('use_isolated_tenants', False):
+            isolated_creds = _isolated_credentials(test, threads,
+                                                   admin_manager)
+        for p_number in moves.xrange(threads):
+            if isolated_creds is not None:
+                manager = clients.Manager(
+                    credentials=isolated_creds[p_number])
 
             test_obj = importutils.import_class(test['action'])
             test_run = test_obj(manager, max_runs, stop_on_error)
+            test_run.arrivals = arrivals.from_descriptor(test, threads,
+                                                         p_number)
+            test_run.concurrency = int(test.get('concurrency', 1))
+            window = profiles.from_descriptor(test, threads, p_number)
+            test_run.start_delay, test_run.stop_after = window
 
             kwargs = test.get('kwargs', {})
             test_run.setUp(**dict(kwargs.iteritems()))
@@ -162,26 +226,88 @@ def stress_openstack(tests, duration, max_runs=None, stop_on_error=False):
             LOG.debug("calling Target Object %s" %
                       test_run.__class__.__name__)
 
-            mp_manager = multiprocessing.Manager()
-            shared_statistic = mp_manager.dict()
-            shared_statistic['runs'] = 0
-            shared_statistic['fails'] = 0
+            group.append({'p_number': p_number,
+                          'action': test_run.action,
+                          'statistic': statistics.SharedStatistic(),
+                          'window': window,
+                          'run': test_run})
+            if len(group) < threads_per_process and p_number < threads - 1:
+                continue
 
-            p = multiprocessing.Process(target=test_run.execute,
-                                        args=(shared_statistic,))
+            runs = [process.pop('run') for process in group]
+            shared_statistics = [process['statistic'] for process in group]
+            if len(runs) == 1:
+                p = multiprocessing.Process(target=runs[0].execute,
+                                            args=(shared_statistics[0],))
+            else:
+                p = multiprocessing.Process(
+                    target=stressaction.execute_cooperatively,
+                    args=(runs, shared_statistics))
+            # NOTE: every action keeps its own entry, the entries of the
+            # actions run by the same process refer to the same process
+            for process in group:
+                process['process'] = p
+            processes.extend(group)
+            test_processes.extend(group)
+            group = []
+        if 'slo' in test and test_processes:
+            monitors.append(slo.SLOMonitor(test_run.action, test['slo'],
+                                           test_processes,
+                                           rate=test.get('rate')))
+    return monitors
 
-            process = {'process': p,
-                       'p_number': p_number,
-                       'action': test_run.action,
-                       'statistic': shared_statistic}
 
-            processes.append(process)
-            p.start()
+def start_processes():
+    """
+    Starts the prepared processes at once.
+    """
+    started = {}
+    for process in processes:
+        if 'started' not in process:
+            p = process['process']
+            if p not in started:
+                p.start()
+                started[p] = time.time()
+            process['started'] = started[p]
+
+
+def stress_openstack(tests, duration, max_runs=None, stop_on_error=False,
+                     metrics_file=None, report_file=None):
+    """
+    Workload driver. Executes an action function against a nova-cluster.
+
+    Statistics snapshots are appended to metrics_file every
+    log_check_interval and a summary to report_file at the end, see
+    tempest.stress.metrics.
+    """
+    ssh_user = CONF.stress.target_ssh_user
+    ssh_key = CONF.stress.target_private_key_path
+    logfiles = CONF.stress.target_logfiles
+    log_check_interval = int(CONF.stress.log_check_interval)
+    check_interval = log_check_interval
+    if logfiles:
+        controller = CONF.stress.target_controller
+        computes = _get_compute_nodes(controller, ssh_user, ssh_key)
+        for node in computes:
+            do_ssh("rm -f %s" % logfiles, node, ssh_user, ssh_key)
+        scanner = log_scanner.LogScanner(computes, logfiles, ssh_user,
+                                         ssh_key)
+    monitors = prepare_processes(tests, max_runs, stop_on_error)
+    if monitors:
+        check_interval = min(check_interval, CONF.stress.slo_check_interval)
+    start_processes()
     if stop_on_error:
         # NOTE(mkoderer): only the parent should register the handler
         signal.signal(signal.SIGCHLD, sigchld_handler)
-    end_time = time.time() + duration
+    start_time = time.time()
+    end_time = start_time + duration
+    next_log_check = start_time + log_check_interval
+    sink = None
+    if metrics_file:
+        sink = metrics.MetricsSink(metrics_file)
+        next_snapshot = start_time + log_check_interval
     had_errors = False
+    breaking_points = []
     try:
         while True:
             if max_runs is None:
@@ -189,7 +315,7 @@ def stress_openstack(tests, duration, max_runs=None, stop_on_error=False):
                 if remaining <= 0:
                     break
             else:
-                remaining = log_check_interval
+                remaining = check_interval
                 all_proc_term = True
                 for process in processes:
                     if process['process'].is_alive():
@@ -198,16 +324,25 @@ def stress_openstack(tests, duration, max_runs=None, stop_on_error=False):
                 if all_proc_term:
                     break
 
-            time.sleep(min(remaining, log_check_interval))
+            time.sleep(min(remaining, check_interval))
             if stop_on_error:
                 if any([True for proc in processes
                         if proc['statistic']['fails'] > 0]):
                     break
 
-            if not logfiles:
+            if sink is not None and time.time() >= next_snapshot:
+                next_snapshot = time.time() + log_check_interval
+                sink.snapshot(processes)
+
+            breaking_points = _check_slos(monitors)
+            if breaking_points:
+                had_errors = True
+                break
+
+            if not logfiles or time.time() < next_log_check:
                 continue
-            if _has_error_in_logs(logfiles, computes, ssh_user, ssh_key,
-                                  stop_on_error):
+            next_log_check = time.time() + log_check_interval
+            if _has_error_in_logs(scanner):
                 had_errors = True
                 break
     except KeyboardInterrupt:
@@ -216,6 +351,12 @@ def stress_openstack(tests, duration, max_runs=None, stop_on_error=False):
     if stop_on_error:
         signal.signal(signal.SIGCHLD, signal.SIG_DFL)
     terminate_all_processes()
+    run_duration = time.time() - start_time
+    if logfiles:
+        scanner.close()
+    if sink is not None:
+        sink.snapshot(processes)
+        sink.close()
 
     sum_fails = 0
     sum_runs = 0
@@ -234,6 +375,23 @@ def stress_openstack(tests, duration, max_runs=None, stop_on_error=False):
     LOG.info("Summary:")
     LOG.info("Run %d actions (%d failed)" %
              (sum_runs, sum_fails))
+    for action in sorted(set(proc['action'] for proc in processes)):
+        action_stats = [proc['statistic'] for proc in processes
+                        if proc['action'] == action]
+        runs = sum(stat['runs'] for stat in action_stats)
+        if not runs:
+            continue
+        latency_sum = sum(stat.latency_sum for stat in action_stats)
+        LOG.info("Latency of %s (mean %.2fs): %s" %
+                 (action, latency_sum / runs,
+                  statistics.format_histogram(
+                      statistics.merge_histograms(action_stats))))
+
+    for breaking_point in breaking_points:
+        LOG.info("Breaking point: %s" % breaking_point)
+    if report_file:
+        metrics.write_report(report_file, processes, run_duration,
+                             breaking_points)
 
     if not had_errors and CONF.stress.full_clean_stack:
         LOG.info("cleaning up")
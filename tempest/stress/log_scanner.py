@@ -0,0 +1,104 @@
+# Copyright 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import pipes
+
+from tempest.common import ssh
+from tempest.common.utils import parallel
+from tempest.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+ERROR_PATTERN = 'ERROR|TRACE'
+
+
+class LogScanner(object):
+    """Reports the new errors of the log files of the cluster nodes.
+
+    The nodes are scanned concurrently over SSH connections kept open
+    between the scans. The size of every log file is recorded, so a scan
+    only reads what was appended since the previous one and an error is
+    reported once. A file smaller than recorded is assumed rotated and
+    read from its beginning.
+
+    :param nodes: hosts to scan
+    :param logfiles: shell pattern of the log files on the nodes
+    """
+
+    def __init__(self, nodes, logfiles, ssh_user, ssh_key=None,
+                 workers=parallel.DEFAULT_WORKERS):
+        self.logfiles = logfiles
+        self.workers = workers
+        self.clients = dict((node, ssh.Client(node, ssh_user,
+                                              key_filename=ssh_key,
+                                              keep_connection=True))
+                            for node in nodes)
+        self.offsets = dict((node, {}) for node in nodes)
+
+    def _sizes(self, node):
+        output = self.clients[node].exec_command(
+            "stat -c '%%s %%n' %s 2>/dev/null; true" % self.logfiles)
+        sizes = {}
+        for line in output.splitlines():
+            size, _, path = line.partition(' ')
+            if path:
+                sizes[path] = int(size)
+        return sizes
+
+    def scan_node(self, node):
+        """Return the error lines appended to the logs of a node."""
+        offsets = self.offsets[node]
+        commands = []
+        sizes = self._sizes(node)
+        for path, size in sorted(sizes.items()):
+            start = offsets.get(path, 0)
+            if size < start:
+                LOG.info("%s:%s was rotated" % (node, path))
+                start = 0
+            if size > start:
+                quoted = pipes.quote(path)
+                commands.append(
+                    "tail -c +%d %s | head -c %d | egrep -H --label=%s '%s'" %
+                    (start + 1, quoted, size - start, quoted, ERROR_PATTERN))
+        errors = []
+        if commands:
+            # NOTE: egrep fails when nothing matches
+            output = self.clients[node].exec_command(
+                '; '.join(commands) + '; true')
+            errors = [line for line in output.splitlines() if line]
+        self.offsets[node] = sizes
+        return errors
+
+    def scan(self):
+        """Scan all the nodes, return the new error lines per node.
+
+        Nodes which can't be scanned are logged and skipped, they are
+        scanned again from the same offsets next time.
+        """
+        outcomes = parallel.run_concurrently(
+            [(node, self.scan_node, (node,), None) for node in self.clients],
+            workers=self.workers)
+        errors = {}
+        for outcome in outcomes:
+            if outcome.error is not None:
+                LOG.error("Scanning the logs of %s failed: %s" %
+                          (outcome.name, outcome.error))
+            elif outcome.result:
+                errors[outcome.name] = outcome.result
+        return errors
+
+    def close(self):
+        for client in self.clients.values():
+            client.close()
@@ -0,0 +1,181 @@
+# Copyright 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Metrics of stress runs
+
+The sink writes a snapshot per action at regular intervals, to a CSV file
+or a JSON lines file, to graph a run over time. The report summarizes a
+whole run as text or HTML. Both are appended to, so that the tests run
+serially by run-tempest-stress end up in the same files.
+"""
+
+import collections
+import csv
+import json
+import os
+import time
+from xml.sax import saxutils
+
+from tempest.stress import statistics
+
+FIELDS = ('timestamp', 'elapsed', 'action', 'runs', 'fails', 'drops',
+          'throughput', 'p50', 'p95', 'p99', 'total_runs', 'total_fails')
+
+Totals = collections.namedtuple('Totals', ['runs', 'fails', 'histogram',
+                                           'latency_sum', 'drops'])
+
+
+def action_totals(processes):
+    """Sum up the statistics of the processes of every action."""
+    by_action = collections.OrderedDict()
+    for process in processes:
+        by_action.setdefault(process['action'], []).append(
+            process['statistic'])
+    totals = collections.OrderedDict()
+    for action, stats in by_action.items():
+        totals[action] = Totals(sum(stat['runs'] for stat in stats),
+                                sum(stat['fails'] for stat in stats),
+                                statistics.merge_histograms(stats),
+                                sum(stat.latency_sum for stat in stats),
+                                sum(stat['drops'] for stat in stats))
+    return totals
+
+
+def _percentile(histogram, fraction):
+    if not sum(histogram):
+        return None
+    value = statistics.quantile(histogram, fraction)
+    # JSON and spreadsheets have no infinity, the last bucket is unbounded
+    return None if value == float('inf') else value
+
+
+class MetricsSink(object):
+    """Writes interval snapshots of the action statistics.
+
+    Files ending with .csv are written as CSV, any other as JSON lines.
+    Percentiles are the upper bounds of the histogram buckets, empty when
+    the interval had no run or the runs were slower than the last bucket.
+    """
+
+    def __init__(self, path):
+        self.is_csv = path.endswith('.csv')
+        write_header = not os.path.exists(path) or not os.path.getsize(path)
+        self._file = open(path, 'a')
+        self._writer = None
+        if self.is_csv:
+            self._writer = csv.DictWriter(self._file, FIELDS)
+            if write_header:
+                self._writer.writerow(dict(zip(FIELDS, FIELDS)))
+        self._start = time.time()
+        self._last = self._start
+        self._previous = {}
+
+    def snapshot(self, processes, now=None):
+        """Write and return the rows of the runs since the last snapshot."""
+        now = now or time.time()
+        interval = max(now - self._last, 1e-6)
+        rows = []
+        for action, totals in action_totals(processes).items():
+            previous = self._previous.get(
+                action, Totals(0, 0, statistics.merge_histograms([]), 0, 0))
+            histogram = [count - before for count, before
+                         in zip(totals.histogram, previous.histogram)]
+            runs = totals.runs - previous.runs
+            rows.append({'timestamp': round(now, 3),
+                         'elapsed': round(now - self._start, 3),
+                         'action': action,
+                         'runs': runs,
+                         'fails': totals.fails - previous.fails,
+                         'drops': totals.drops - previous.drops,
+                         'throughput': round(runs / interval, 3),
+                         'p50': _percentile(histogram, 0.5),
+                         'p95': _percentile(histogram, 0.95),
+                         'p99': _percentile(histogram, 0.99),
+                         'total_runs': totals.runs,
+                         'total_fails': totals.fails})
+            if not self.is_csv:
+                rows[-1]['histogram'] = histogram
+            self._previous[action] = totals
+        self._last = now
+        for row in rows:
+            if self.is_csv:
+                self._writer.writerow(row)
+            else:
+                self._file.write(json.dumps(row, sort_keys=True) + '\n')
+        self._file.flush()
+        return rows
+
+    def close(self):
+        self._file.close()
+
+
+def _report_rows(processes, duration):
+    for action, totals in action_totals(processes).items():
+        runs = totals.runs
+        yield collections.OrderedDict([
+            ('Action', action),
+            ('Runs', runs),
+            ('Failed', totals.fails),
+            ('Dropped', totals.drops),
+            ('Runs/s', "%.2f" % (runs / max(duration, 1e-6))),
+            ('Mean', "%.2fs" % (totals.latency_sum / runs) if runs else '-'),
+            ('p50', _format_bound(totals.histogram, 0.5)),
+            ('p95', _format_bound(totals.histogram, 0.95)),
+            ('p99', _format_bound(totals.histogram, 0.99)),
+            ('Latency histogram',
+             statistics.format_histogram(totals.histogram)),
+        ])
+
+
+def _format_bound(histogram, fraction):
+    if not sum(histogram):
+        return '-'
+    value = statistics.quantile(histogram, fraction)
+    if value == float('inf'):
+        return ">%ss" % statistics.LATENCY_BUCKETS[-1]
+    return "<=%ss" % value
+
+
+def write_report(path, processes, duration, breaking_points=()):
+    """Append the summary of a stress run, as HTML if path ends with .html.
+    """
+    rows = list(_report_rows(processes, duration))
+    title = "Stress run of %ds finished at %s" % (
+        duration, time.strftime('%Y-%m-%d %H:%M:%S'))
+    with open(path, 'a') as report:
+        if path.endswith('.html'):
+            report.write("<h2>%s</h2>\n<table border=\"1\">\n" %
+                         saxutils.escape(title))
+            if rows:
+                report.write("<tr>%s</tr>\n" % ''.join(
+                    "<th>%s</th>" % saxutils.escape(key) for key in rows[0]))
+            for row in rows:
+                report.write("<tr>%s</tr>\n" % ''.join(
+                    "<td>%s</td>" % saxutils.escape(str(value))
+                    for value in row.values()))
+            report.write("</table>\n")
+            for breaking_point in breaking_points:
+                report.write("<p>Breaking point: %s</p>\n" %
+                             saxutils.escape(breaking_point))
+        else:
+            report.write("%s\n%s\n" % (title, '=' * len(title)))
+            for row in rows:
+                for key, value in row.items():
+                    report.write("%-18s %s\n" % (key + ':', value))
+                report.write("\n")
+            for breaking_point in breaking_points:
+                report.write("Breaking point: %s\n" % breaking_point)
+            report.write("\n")
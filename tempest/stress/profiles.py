@@ -0,0 +1,67 @@
+# Copyright 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Load profiles of stress actions
+
+A profile tells when each process of an action starts and stops running,
+relative to the start of the process, so the number of active processes
+(and the rate of open-loop actions, which is shared by the processes)
+changes over the run.
+"""
+
+from tempest import exceptions
+
+PROFILES = ('step', 'linear', 'spike')
+
+
+def from_descriptor(test, threads, p_number):
+    """Return the (start_delay, stop_after) window of a process in seconds.
+
+    stop_after is None if the process runs until the end of the test.
+
+    Profiles of the `profile` field of a stress test description:
+     * step: `threads_per_step` processes more every `step_interval`
+     * linear: processes start evenly spread over `ramp_time`
+     * spike: `base_threads` run all along, the other ones only from
+       `spike_at` during `spike_length`
+    """
+    profile = test.get('profile')
+    if profile is None:
+        return 0, None
+    kind = profile.get('type')
+    try:
+        if kind == 'step':
+            step = p_number // int(profile.get('threads_per_step', 1))
+            return step * float(profile['step_interval']), None
+        if kind == 'linear':
+            return p_number * float(profile['ramp_time']) / threads, None
+        if kind == 'spike':
+            if p_number < int(profile.get('base_threads', 1)):
+                return 0, None
+            spike_at = float(profile['spike_at'])
+            return spike_at, spike_at + float(profile['spike_length'])
+    except KeyError as exc:
+        raise exceptions.InvalidConfiguration(
+            "The %s profile of %s needs %s" % (kind, test['action'], exc))
+    raise exceptions.InvalidConfiguration(
+        "Unknown profile %s of %s, use one of %s" %
+        (kind, test['action'], ', '.join(PROFILES)))
+
+
+def is_active(window, elapsed):
+    start_delay, stop_after = window
+    return start_delay <= elapsed and (stop_after is None or
+                                       elapsed < stop_after)
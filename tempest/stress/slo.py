@@ -0,0 +1,88 @@
+# Copyright 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import time
+
+from tempest import exceptions
+from tempest.stress import profiles
+from tempest.stress import statistics
+
+RULES = ('p95_latency', 'error_rate', 'min_runs')
+
+
+class SLOMonitor(object):
+    """Checks the service level objectives of a stress action.
+
+    Objectives are evaluated on the runs finished since the last check
+    (at least `min_runs` of them), so that a degradation under a higher
+    load is not hidden by the runs of the beginning of the test.
+
+    :param action: name of the action, for the reports
+    :param rules: `slo` field of the stress test description
+    :param processes: driver process entries of the action
+    """
+
+    def __init__(self, action, rules, processes, rate=None):
+        unknown = set(rules) - set(RULES)
+        if unknown:
+            raise exceptions.InvalidConfiguration(
+                "Unknown SLO rules %s of %s, use %s" %
+                (', '.join(sorted(unknown)), action, ', '.join(RULES)))
+        self.action = action
+        self.p95_latency = rules.get('p95_latency')
+        self.error_rate = rules.get('error_rate')
+        self.min_runs = rules.get('min_runs', 10)
+        self.processes = processes
+        self.rate = rate
+        self._runs = 0
+        self._fails = 0
+        self._histogram = statistics.merge_histograms([])
+
+    def load_level(self, now=None):
+        """Describe the current load, the active processes and rate."""
+        now = now or time.time()
+        active = len([p for p in self.processes
+                      if profiles.is_active(p['window'],
+                                            now - p['started'])])
+        level = "%d of %d threads" % (active, len(self.processes))
+        if self.rate is not None:
+            level += " (%.2f runs/s)" % (
+                float(self.rate) * active / len(self.processes))
+        return level
+
+    def check(self):
+        """Return the broken objective since the last check, or None."""
+        stats = [p['statistic'] for p in self.processes]
+        runs = sum(stat['runs'] for stat in stats)
+        if runs - self._runs < self.min_runs:
+            return None
+        fails = sum(stat['fails'] for stat in stats)
+        histogram = statistics.merge_histograms(stats)
+        window_runs = runs - self._runs
+        window_fails = fails - self._fails
+        window_histogram = [count - previous for count, previous
+                            in zip(histogram, self._histogram)]
+        self._runs, self._fails, self._histogram = runs, fails, histogram
+
+        if self.error_rate is not None:
+            error_rate = float(window_fails) / window_runs
+            if error_rate > self.error_rate:
+                return ("error rate %.2f > %s" %
+                        (error_rate, self.error_rate))
+        if self.p95_latency is not None:
+            p95 = statistics.quantile(window_histogram, 0.95)
+            if p95 > self.p95_latency:
+                return "p95 latency <= %ss > %ss" % (p95, self.p95_latency)
+        return None
@@ -0,0 +1,89 @@
+# Copyright 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import bisect
+import multiprocessing
+
+# Upper bounds in seconds of the latency histogram buckets, the last bucket
+# counts the runs slower than the last bound.
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# drops: arrivals of the open-loop mode not run, all the runs allowed in
+# flight were busy
+COUNTERS = ('runs', 'fails', 'drops')
+
+
+class SharedStatistic(object):
+    """Run counters and latency histogram of one stress process.
+
+    The values live in shared memory allocated before the worker process
+    is forked. Only the worker writes them and the driver only reads them,
+    so no lock and no manager process is needed. The threads of an
+    open-loop worker serialize their writes with a lock of the action.
+    """
+
+    def __init__(self):
+        self._counters = multiprocessing.RawArray('l', len(COUNTERS))
+        self._buckets = multiprocessing.RawArray('l',
+                                                 len(LATENCY_BUCKETS) + 1)
+        self._latency_sum = multiprocessing.RawValue('d', 0.0)
+
+    def __getitem__(self, name):
+        return self._counters[COUNTERS.index(name)]
+
+    def __setitem__(self, name, value):
+        self._counters[COUNTERS.index(name)] = value
+
+    def add_latency(self, seconds):
+        self._buckets[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self._latency_sum.value += seconds
+
+    @property
+    def histogram(self):
+        return list(self._buckets)
+
+    @property
+    def latency_sum(self):
+        return self._latency_sum.value
+
+
+def merge_histograms(statistics):
+    """Sum up the latency histograms of several processes."""
+    merged = [0] * (len(LATENCY_BUCKETS) + 1)
+    for statistic in statistics:
+        for index, count in enumerate(statistic.histogram):
+            merged[index] += count
+    return merged
+
+
+def quantile(histogram, fraction):
+    """Upper bound of the bucket holding the given fraction of the runs.
+
+    Runs slower than the last bound make it infinite.
+    """
+    rank = fraction * sum(histogram)
+    count = 0
+    for bound, bucket in zip(LATENCY_BUCKETS, histogram):
+        count += bucket
+        if count >= rank:
+            return bound
+    return float('inf')
+
+
+def format_histogram(histogram):
+    labels = ["<=%ss" % bound for bound in LATENCY_BUCKETS]
+    labels.append(">%ss" % LATENCY_BUCKETS[-1])
+    return ', '.join("%s: %d" % (label, count)
+                     for label, count in zip(labels, histogram) if count)
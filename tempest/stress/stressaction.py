@@ -15,6 +15,8 @@
 import abc
 import signal
 import sys
+import threading
+import time
 
 import six
 
@@ -30,6 +32,16 @@ class StressAction(object):
         self.manager = manager
         self.max_runs = max_runs
         self.stop_on_error = stop_on_error
+        # Schedule of the open-loop mode, see tempest.stress.arrivals
+        self.arrivals = None
+        # Runs in flight at most in the open-loop mode, the arrivals
+        # finding them all busy are dropped
+        self.concurrency = 1
+        self._statistic_lock = threading.Lock()
+        self._stopped = threading.Event()
+        # Window of the load profile, see tempest.stress.profiles
+        self.start_delay = 0
+        self.stop_after = None
 
     def _shutdown_handler(self, signal, frame):
         try:
@@ -65,29 +77,159 @@ class StressAction(object):
         """This is the main execution entry point called
         by the driver.   We register a signal handler to
         allow us to tearDown gracefully, and then exit.
-        We also keep track of how many runs we do.
+        We also keep track of how many runs we do and
+        how long they take.
+
+        Without arrival schedule, the next run starts as soon as the
+        previous one is done. With a schedule, every arrival starts a run
+        in its own thread at the scheduled time, whether the previous runs
+        are done or not, so the offered load doesn't drop when the cloud
+        slows down. At most `concurrency` runs are in flight, the arrivals
+        beyond are counted as drops.
         """
         signal.signal(signal.SIGHUP, self._shutdown_handler)
         signal.signal(signal.SIGTERM, self._shutdown_handler)
+        self._execute(shared_statistic)
 
-        while self.max_runs is None or (shared_statistic['runs'] <
-                                        self.max_runs):
-            self.logger.debug("Trigger new run (run %d)" %
-                              shared_statistic['runs'])
-            try:
-                self.run()
-            except Exception:
-                shared_statistic['fails'] += 1
-                self.logger.exception("Failure in run")
-            finally:
+    def _execute(self, shared_statistic):
+        started = time.time()
+        deadline = None
+        if self.stop_after is not None:
+            deadline = started + self.stop_after
+        if self.start_delay:
+            time.sleep(self.start_delay)
+
+        if self.arrivals is None:
+            while self._keep_running(shared_statistic, deadline):
+                self._run_once(shared_statistic, time.time())
+            return
+
+        slots = threading.Semaphore(self.concurrency)
+        dispatched = shared_statistic['runs']
+        start = time.time()
+        for offset in self.arrivals:
+            if (self._stopped.is_set() or
+                    not self._keep_running(shared_statistic, deadline,
+                                           dispatched)):
+                break
+            intended_start = start + offset
+            delay = intended_start - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            if not slots.acquire(False):
+                with self._statistic_lock:
+                    shared_statistic['drops'] += 1
+                continue
+            dispatched += 1
+            runner = threading.Thread(
+                target=self._run_in_slot,
+                args=(shared_statistic, intended_start, slots))
+            # NOTE: daemon threads, they must not keep an exiting process
+            # alive
+            runner.daemon = True
+            runner.start()
+        # wait for the runs in flight
+        for _ in range(self.concurrency):
+            slots.acquire()
+        if self._stopped.is_set():
+            sys.exit(1)
+
+    def _run_in_slot(self, shared_statistic, intended_start, slots):
+        try:
+            self._run_once(shared_statistic, intended_start)
+        except SystemExit:
+            # stop-on-error, the action has been torn down already
+            self._stopped.set()
+        finally:
+            slots.release()
+
+    def _keep_running(self, shared_statistic, deadline, runs=None):
+        if deadline is not None and time.time() >= deadline:
+            return False
+        if runs is None:
+            runs = shared_statistic['runs']
+        return self.max_runs is None or runs < self.max_runs
+
+    def _run_once(self, shared_statistic, intended_start):
+        self.logger.debug("Trigger new run (run %d)" %
+                          shared_statistic['runs'])
+        failed = False
+        try:
+            self.run()
+        except Exception:
+            failed = True
+            self.logger.exception("Failure in run")
+        finally:
+            with self._statistic_lock:
+                if failed:
+                    shared_statistic['fails'] += 1
+                shared_statistic.add_latency(time.time() - intended_start)
                 shared_statistic['runs'] += 1
-                if self.stop_on_error and (shared_statistic['fails'] > 1):
-                    self.logger.warn("Stop process due to"
-                                     "\"stop-on-error\" argument")
-                    self.tearDown()
-                    sys.exit(1)
+                fails = shared_statistic['fails']
+            if self.stop_on_error and (fails > 1):
+                self.logger.warn("Stop process due to"
+                                 "\"stop-on-error\" argument")
+                self.tearDown()
+                sys.exit(1)
 
     @abc.abstractmethod
     def run(self):
         """This method is where the stress test code runs."""
         return
+
+
+def execute_cooperatively(actions, shared_statistics):
+    """Execute several actions in threads of the calling process.
+
+    This is the entry point of the processes running more than one action
+    instance. The actions spend most of their time waiting for the cloud,
+    so threads let a process run many of them with the memory of one.
+    Every action has its own statistic, each one still has a single writer.
+    The process stops when all the actions are done, or like a single
+    action process on signals and stop-on-error failures.
+    """
+    stopped = []
+
+    def _tear_down_running():
+        for action in actions:
+            if action in stopped:
+                continue
+            try:
+                action.tearDown()
+            except Exception:
+                action.logger.exception("Error while tearDown")
+
+    def _shutdown_handler(signum, frame):
+        _tear_down_running()
+        sys.exit(0)
+
+    signal.signal(signal.SIGHUP, _shutdown_handler)
+    signal.signal(signal.SIGTERM, _shutdown_handler)
+
+    def _execute(action, shared_statistic):
+        try:
+            action._execute(shared_statistic)
+        except SystemExit:
+            # stop-on-error, the action has been torn down already
+            stopped.append(action)
+
+    threads = []
+    for action, shared_statistic in zip(actions, shared_statistics):
+        thread = threading.Thread(target=_execute,
+                                  args=(action, shared_statistic))
+        # NOTE: daemon threads, they must not keep an exiting process alive
+        thread.daemon = True
+        thread.start()
+        threads.append(thread)
+
+    for thread in threads:
+        while thread.is_alive():
+            # NOTE: join with a timeout, the signals are only handled by
+            # the main thread between two waits
+            thread.join(0.5)
+            if stopped:
+                _tear_down_running()
+                sys.exit(1)
+    if stopped:
+        _tear_down_running()
+        sys.exit(1)
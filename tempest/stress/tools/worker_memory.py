@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+
+# Copyright 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Measures the memory used by idle stress actions
+
+Runs the given number of actions sleeping in their run method, one per
+process or with --threads-per-process of them per process, and prints the
+proportional set size of the workers (Linux only), i.e. how many
+concurrent actions fit in a GB of memory.
+
+Each action has its own clients.Manager, as with isolated tenants. The
+clients are the real ones, configured by tempest.conf, only their auth
+provider is replaced and the credentials are not filled in, so that no
+token is requested.
+"""
+
+import argparse
+import time
+
+from tempest import auth
+from tempest import clients
+from tempest import manager
+from tempest.stress import driver
+from tempest.stress import stressaction
+
+
+class FakeAuthProvider(object):
+
+    def __init__(self, credentials):
+        self.credentials = credentials
+
+    def auth_request(self, method, url, headers=None, body=None,
+                     filters=None):
+        return url, headers, body
+
+
+class IdleAction(stressaction.StressAction):
+
+    def setUp(self, **kwargs):
+        self.manager = clients.Manager(credentials=self.manager.credentials)
+
+    def run(self):
+        time.sleep(1)
+
+
+def _pss_kb(pid):
+    with open('/proc/%d/smaps_rollup' % pid) as smaps:
+        for line in smaps:
+            if line.startswith('Pss:'):
+                return int(line.split()[1])
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('-n', '--actions', type=int, default=100)
+    parser.add_argument('--threads-per-process', type=int, default=1)
+    args = parser.parse_args()
+    get_default_credentials = auth.get_default_credentials
+    auth.get_default_credentials = (
+        lambda credential_type, fill_in=True:
+        get_default_credentials(credential_type, fill_in=False))
+    manager.Manager.get_auth_provider = (
+        lambda self, credentials: FakeAuthProvider(credentials))
+    driver.prepare_processes([{'action': __name__ + '.IdleAction',
+                               'threads': args.actions,
+                               'threads_per_process':
+                               args.threads_per_process}])
+    driver.start_processes()
+    time.sleep(3)
+    pids = set(process['process'].pid for process in driver.processes)
+    total_kb = sum(_pss_kb(pid) for pid in pids)
+    print("%d actions in %d processes: %.1f MB, %d actions per GB" %
+          (args.actions, len(pids), total_kb / 1024.0,
+           args.actions * 1024 * 1024 / max(total_kb, 1)))
+    driver.terminate_all_processes(check_interval=5)
+
+
+if __name__ == "__main__":
+    main()
@@ -29,8 +29,9 @@ import testscenarios
 import testtools
 
 from tempest import clients
+from tempest.common import account_pool
+from tempest.common import discovery_cache
 import tempest.common.generator.valid_generator as valid
-from tempest.common import isolated_creds
 from tempest import config
 from tempest import exceptions
 from tempest.openstack.common import importutils
@@ -111,9 +112,29 @@ def get_service_list():
         'telemetry': CONF.service_available.ceilometer,
         'data_processing': CONF.service_available.sahara
     }
+    capabilities = discovery_cache.get_capabilities()
+    if capabilities is not None:
+        for service, available in service_list.items():
+            service_list[service] = (
+                available and capabilities.is_service_available(service))
     return service_list
 
 
+def _add_skip_check(wrapper, check, *args):
+    """Record a skip check of a test to run it before the class setup."""
+    wrapper.skip_checks = (getattr(wrapper, 'skip_checks', ()) +
+                           ((check, args),))
+
+
+def _services_skip_reason(*args):
+    service_list = get_service_list()
+    for service in args:
+        if not service_list[service]:
+            return 'Skipped because the %s service is not available' % (
+                service)
+    return None
+
+
 def services(*args, **kwargs):
     """A decorator used to set an attr for each service used in a test case
 
@@ -132,14 +153,11 @@ def services(*args, **kwargs):
 
         @functools.wraps(f)
         def wrapper(self, *func_args, **func_kwargs):
-            service_list = get_service_list()
-
-            for service in args:
-                if not service_list[service]:
-                    msg = 'Skipped because the %s service is not available' % (
-                        service)
-                    raise testtools.TestCase.skipException(msg)
+            msg = _services_skip_reason(*args)
+            if msg:
+                raise testtools.TestCase.skipException(msg)
             return f(self, *func_args, **func_kwargs)
+        _add_skip_check(wrapper, _services_skip_reason, *args)
         return wrapper
     return decorator
 
@@ -208,19 +226,29 @@ def requires_ext(*args, **kwargs):
     def decorator(func):
         @functools.wraps(func)
         def wrapper(*func_args, **func_kwargs):
-            if not is_extension_enabled(kwargs['extension'],
-                                        kwargs['service']):
-                msg = "Skipped because %s extension: %s is not enabled" % (
-                    kwargs['service'], kwargs['extension'])
+            msg = _extension_skip_reason(kwargs['extension'],
+                                         kwargs['service'])
+            if msg:
                 raise testtools.TestCase.skipException(msg)
             return func(*func_args, **func_kwargs)
+        _add_skip_check(wrapper, _extension_skip_reason, kwargs['extension'],
+                        kwargs['service'])
         return wrapper
     return decorator
 
 
+def _extension_skip_reason(extension_name, service):
+    if not is_extension_enabled(extension_name, service):
+        return "Skipped because %s extension: %s is not enabled" % (
+            service, extension_name)
+    return None
+
+
 def is_extension_enabled(extension_name, service):
     """A function that will check the list of enabled extensions from config
 
+    When the discovery cache is enabled, the extension must also be among
+    the discovered ones.
     """
     config_dict = {
         'compute': CONF.compute_feature_enabled.api_extensions,
@@ -231,11 +259,13 @@ def is_extension_enabled(extension_name, service):
     }
     if len(config_dict[service]) == 0:
         return False
-    if config_dict[service][0] == 'all':
-        return True
-    if extension_name in config_dict[service]:
-        return True
-    return False
+    if (config_dict[service][0] != 'all' and
+            extension_name not in config_dict[service]):
+        return False
+    capabilities = discovery_cache.get_capabilities()
+    if capabilities is not None:
+        return capabilities.is_extension_available(extension_name, service)
+    return True
 
 
 at_exit_set = set()
@@ -273,6 +303,9 @@ class BaseTestCase(BaseDeps):
     _service = None
 
     network_resources = {}
+    # Types of the isolated credentials the class uses, they are created
+    # together when the first ones are needed
+    credential_types = ['primary']
 
     # NOTE(sdague): log_format is defined inline here instead of using the oslo
     # default because going through the config path recouples config to the
@@ -286,6 +319,7 @@ class BaseTestCase(BaseDeps):
         if hasattr(super(BaseTestCase, cls), 'setUpClass'):
             super(BaseTestCase, cls).setUpClass()
         cls.setUpClassCalled = True
+        cls._skip_unsupported_class()
         # No test resource is allocated until here
         try:
             # TODO(andreaf) Split-up resource_setup in stages:
@@ -316,6 +350,29 @@ class BaseTestCase(BaseDeps):
         finally:
             cls.clear_isolated_creds()
 
+    @classmethod
+    def _skip_unsupported_class(cls):
+        """Skip the whole class if none of its tests can run.
+
+        The checks recorded by the skip decorators (services, requires_ext)
+        are run before the class resources are set up.
+        """
+        reason = None
+        for name in dir(cls):
+            if not name.startswith('test'):
+                continue
+            test_method = getattr(cls, name)
+            if not callable(test_method):
+                continue
+            reasons = [check(*args) for check, args in
+                       getattr(test_method, 'skip_checks', ())]
+            reasons = [r for r in reasons if r]
+            if not reasons:
+                return
+            reason = reason or reasons[0]
+        if reason:
+            raise cls.skipException(reason)
+
     @classmethod
     def resource_setup(cls):
         """Class level setup steps for test cases.
@@ -362,11 +419,12 @@ class BaseTestCase(BaseDeps):
         """
         Returns an OpenStack client manager
         """
-        cls.isolated_creds = isolated_creds.IsolatedCreds(
+        cls.isolated_creds = account_pool.get_isolated_creds(
             cls.__name__, network_resources=cls.network_resources)
 
         force_tenant_isolation = getattr(cls, 'force_tenant_isolation', None)
         if CONF.compute.allow_tenant_isolation or force_tenant_isolation:
+            cls.isolated_creds.prepare_credentials(cls.credential_types)
             creds = cls.isolated_creds.get_primary_creds()
             if getattr(cls, '_interface', None):
                 os = clients.Manager(credentials=creds,
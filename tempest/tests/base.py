@@ -12,10 +12,31 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import threading
+
 import mock
 from oslotest import base
 from oslotest import moxstubout
 
+_mock_lock = threading.RLock()
+
+
+class ThreadSafeMock(mock.MagicMock):
+    """MagicMock whose attributes can be created by concurrent threads.
+
+    Creating mock attributes is not thread safe, two threads accessing a
+    new attribute can each get their own child mock and the calls of one
+    of them are lost. Use it for mocks called by the thread pools of the
+    code under test.
+    """
+
+    def __getattr__(self, name):
+        with _mock_lock:
+            return super(ThreadSafeMock, self).__getattr__(name)
+
+    def _get_child_mock(self, **kwargs):
+        return ThreadSafeMock(**kwargs)
+
 
 class TestCase(base.BaseTestCase):
 
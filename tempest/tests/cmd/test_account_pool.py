@@ -0,0 +1,152 @@
+# Copyright 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import shutil
+import tempfile
+
+import mock
+
+from tempest.cmd import account_pool
+from tempest.cmd import cleanup_service
+from tempest.common import account_pool as pool_lib
+from tempest import config
+from tempest.openstack.common.fixture import mockpatch
+from tempest.tests import base
+from tempest.tests import fake_config
+
+
+class TestPoolManager(base.TestCase):
+
+    def setUp(self):
+        super(TestPoolManager, self).setUp()
+        self.useFixture(fake_config.ConfigFixture())
+        self.stubs.Set(config, 'TempestConfigPrivate', fake_config.FakePrivate)
+        self.pool_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.pool_dir)
+        self.pool = pool_lib.CredentialPool(self.pool_dir)
+        self.creator = base.ThreadSafeMock()
+        self.useFixture(mockpatch.PatchObject(
+            account_pool.isolated_creds, 'IsolatedCreds',
+            return_value=self.creator))
+        self.useFixture(mockpatch.PatchObject(cleanup_service, 'init_conf'))
+        self.useFixture(mockpatch.PatchObject(
+            cleanup_service, 'get_tenant_cleanup_services',
+            return_value=['services']))
+        self.run_services = self.useFixture(mockpatch.PatchObject(
+            cleanup_service, 'run_services')).mock
+        self.useFixture(mockpatch.PatchObject(
+            account_pool.clients, 'Manager',
+            return_value=base.ThreadSafeMock()))
+        self.admin_manager = base.ThreadSafeMock()
+        self.useFixture(mockpatch.PatchObject(
+            account_pool.clients, 'AdminManager',
+            return_value=self.admin_manager))
+        self.counter = 0
+        self.creator._create_creds.side_effect = self._create_creds
+        self.creator._create_network_resources.side_effect = (
+            lambda tenant_id: ({'id': tenant_id + '-net', 'name': 'net'},
+                               {'id': tenant_id + '-subnet', 'name': 'sub'},
+                               {'id': tenant_id + '-router', 'name': 'r'}))
+        self.creator.network_admin_client.list_ports.return_value = (
+            None, {'ports': [{'id': 'dhcp-port',
+                              'device_owner': 'network:dhcp'},
+                             {'id': 'server-port',
+                              'device_owner': 'compute:nova'}]})
+        self.identity = self.creator.identity_admin_client
+        self.identity.list_user_roles.return_value = (
+            None, [{'id': 'member-role'}])
+        self.manager = account_pool.PoolManager(self.pool, 2, 1)
+
+    def _create_creds(self, admin=False):
+        self.counter += 1
+        name = 'user%d' % self.counter
+        return mock.Mock(username=name, user_id=name + '-id',
+                         tenant_name=name, tenant_id=name + '-tenant',
+                         password='pass')
+
+    def test_fill(self):
+        self.assertEqual(3, self.manager.fill())
+        self.assertEqual(2, len(self.pool.entries(admin=False)))
+        self.assertEqual(1, len(self.pool.entries(admin=True)))
+        entry = self.pool.acquire(admin=True)[1]
+        self.assertTrue(entry['admin'])
+        tenant_id = entry['credentials']['tenant_id']
+        self.assertEqual(tenant_id + '-net', entry['network']['id'])
+        # the pool is full
+        self.assertEqual(0, self.manager.fill())
+
+    def test_failed_network_creation_deletes_the_user(self):
+        self.creator._create_network_resources.side_effect = Exception()
+        self.manager.sizes = {False: 1, True: 0}
+        self.assertEqual(0, self.manager.fill())
+        self.assertEqual([], self.pool.entries())
+        self.creator._delete_user.assert_called_once_with('user1-id')
+        self.creator._delete_tenant.assert_called_once_with('user1-tenant')
+
+    def test_scrub_keeps_the_set_resources(self):
+        self.manager.sizes = {False: 1, True: 0}
+        self.manager.fill()
+        entry_id, entry = self.pool.acquire()
+        self.assertEqual(0, self.manager.scrub())
+        self.pool.release(entry_id)
+        self.assertEqual(1, self.manager.scrub())
+        kwargs = self.run_services.call_args[1]
+        self.assertEqual('user1-tenant', kwargs['tenant_id'])
+        self.assertEqual(frozenset(['user1-tenant-net', 'user1-tenant-subnet',
+                                    'user1-tenant-router', 'dhcp-port']),
+                         kwargs['preserved_ids'])
+        self.assertEqual(entry_id, self.pool.acquire()[0])
+
+    def test_scrub_resets_identity_and_quotas(self):
+        self.manager.sizes = {False: 1, True: 0}
+        self.manager.fill()
+        entry_id, entry = self.pool.acquire()
+        self.assertEqual(['member-role'], entry['roles'])
+        self.pool.release(entry_id)
+        # a test gave the user another role and took the initial one
+        self.identity.list_user_roles.return_value = (
+            None, [{'id': 'other-role'}])
+        self.assertEqual(1, self.manager.scrub())
+        self.identity.update_tenant.assert_called_once_with(
+            'user1-tenant', name='user1', enabled=True)
+        self.identity.update_user.assert_called_once_with(
+            'user1-id', name='user1', enabled=True)
+        self.identity.update_user_password.assert_called_once_with(
+            'user1-id', 'pass')
+        self.identity.remove_user_role.assert_called_once_with(
+            'user1-tenant', 'user1-id', 'other-role')
+        self.identity.assign_user_role.assert_called_once_with(
+            'user1-tenant', 'user1-id', 'member-role')
+        self.admin_manager.quotas_client.delete_quota_set.\
+            assert_called_once_with('user1-tenant')
+        self.creator.network_admin_client.reset_quotas.\
+            assert_called_once_with('user1-tenant')
+
+    def test_failed_scrub_is_retried(self):
+        self.manager.sizes = {False: 1, True: 0}
+        self.manager.fill()
+        entry_id = self.pool.acquire()[0]
+        self.pool.release(entry_id)
+        self.run_services.side_effect = [Exception(), None]
+        self.assertEqual(0, self.manager.scrub())
+        self.assertIsNone(self.pool.acquire())
+        self.assertEqual(1, self.manager.scrub())
+
+    def test_drain_skips_sets_in_use(self):
+        self.manager.fill()
+        in_use = pool_lib.CredentialPool(self.pool_dir)
+        entry_id = in_use.acquire()[0]
+        self.assertEqual(2, self.manager.drain())
+        self.assertEqual([entry_id], self.pool.entries())
@@ -0,0 +1,75 @@
+# Copyright 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import threading
+
+import mock
+
+from tempest.cmd import cleanup
+from tempest.cmd import cleanup_service
+from tempest import config
+from tempest.openstack.common.fixture import mockpatch
+from tempest.tests import base
+from tempest.tests import fake_config
+
+
+class TestCleanupTenants(base.TestCase):
+
+    def setUp(self):
+        super(TestCleanupTenants, self).setUp()
+        self.useFixture(fake_config.ConfigFixture())
+        self.stubs.Set(config, 'TempestConfigPrivate', fake_config.FakePrivate)
+        self.tenants = [{'id': 'tenant-%d' % i, 'name': 'name-%d' % i}
+                        for i in range(20)]
+        tenant_service = mock.MagicMock()
+        tenant_service.return_value.list.return_value = self.tenants
+        self.useFixture(mockpatch.PatchObject(
+            cleanup_service, 'TenantService', tenant_service))
+        self.useFixture(mockpatch.PatchObject(
+            cleanup_service, 'run_services'))
+        self.useFixture(mockpatch.PatchObject(cleanup.clients, 'Manager'))
+        self.useFixture(mockpatch.PatchObject(cleanup.auth,
+                                              'get_credentials'))
+        self.cleanup = cleanup.Cleanup.__new__(cleanup.Cleanup)
+        self.cleanup.options = mock.Mock(dry_run=True, workers=4,
+                                         delete_concurrency=2,
+                                         preserve_tempest_conf_objects=True)
+        self.cleanup.admin_mgr = mock.MagicMock()
+        self.cleanup.admin_id = 'admin'
+        self.cleanup.admin_role_id = 'admin-role'
+        self.cleanup.admin_role_added = []
+        self.cleanup.journal = None
+        self.cleanup.progress = None
+        self.cleanup._lock = threading.Lock()
+        self.cleanup.dry_run_data = {}
+        self.cleanup.json_data = {}
+        self.cleanup.tenant_services = []
+        self.cleanup.global_services = []
+        self.useFixture(mockpatch.PatchObject(cleanup, 'DRY_RUN_JSON',
+                                              '/dev/null'))
+        self.useFixture(mockpatch.PatchObject(self.cleanup,
+                                              '_remove_admin_role'))
+
+    def test_all_tenants_processed(self):
+        id_cl = self.cleanup.admin_mgr.identity_client
+        id_cl.list_user_roles.return_value = (None, [])
+        self.cleanup._cleanup()
+        tenant_ids = sorted(t['id'] for t in self.tenants)
+        self.assertEqual(tenant_ids,
+                         sorted(self.cleanup.dry_run_data[
+                             '_tenants_to_clean'].keys()))
+        self.assertEqual(tenant_ids, sorted(self.cleanup.admin_role_added))
+        self.assertEqual(len(self.tenants),
+                         self.cleanup._remove_admin_role.call_count)
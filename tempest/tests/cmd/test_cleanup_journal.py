@@ -0,0 +1,103 @@
+# Copyright 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import shutil
+import tempfile
+
+import mock
+
+from tempest.cmd import cleanup_journal
+from tempest.cmd import cleanup_service
+from tempest.tests import base
+
+
+class TestCleanupJournal(base.TestCase):
+
+    def setUp(self):
+        super(TestCleanupJournal, self).setUp()
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        self.path = os.path.join(tmp_dir, 'journal.json')
+        self.key = ('tenant', 'NetworkService')
+        self.items = [{'id': 'net-%d' % i} for i in range(3)]
+
+    def _plan(self, journal):
+        return list(journal.plan(self.key, self.items,
+                                 lambda item: item['id']))
+
+    def test_unknown_key_is_not_pending(self):
+        journal = cleanup_journal.CleanupJournal(self.path)
+        self.assertIsNone(journal.pending(self.key))
+        journal.close()
+
+    def test_resume_pending_items(self):
+        journal = cleanup_journal.CleanupJournal(self.path)
+        self.assertEqual(self.items, self._plan(journal))
+        journal.done(self.key, 'net-1')
+        journal.close()
+        journal = cleanup_journal.CleanupJournal(self.path)
+        self.assertEqual([self.items[0], self.items[2]],
+                         journal.pending(self.key))
+        journal.close(remove=True)
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_interrupted_listing_is_not_resumed(self):
+        journal = cleanup_journal.CleanupJournal(self.path)
+        planned = journal.plan(self.key, self.items, lambda item: item['id'])
+        next(planned)
+        journal.close()
+        journal = cleanup_journal.CleanupJournal(self.path)
+        self.assertIsNone(journal.pending(self.key))
+        journal.close()
+
+    def test_truncated_line_is_skipped(self):
+        journal = cleanup_journal.CleanupJournal(self.path)
+        self._plan(journal)
+        journal.close()
+        with open(self.path, 'a') as f:
+            f.write('{"key": ["tenant", "Netw')
+        journal = cleanup_journal.CleanupJournal(self.path)
+        self.assertEqual(self.items, journal.pending(self.key))
+        journal.close()
+
+    def test_service_resumes_from_journal(self):
+        journal = cleanup_journal.CleanupJournal(self.path)
+        self._plan(journal)
+        journal.done(self.key, 'net-0')
+        manager = base.ThreadSafeMock()
+        client = manager.network_client
+        service = cleanup_service.NetworkService(
+            manager, data={}, is_dry_run=False, saved_state_json=None,
+            is_preserve=False, is_save_state=False, tenant_id='tenant',
+            journal=journal)
+        service.delete()
+        self.assertFalse(client.list_networks.called)
+        self.assertEqual(
+            set(['net-1', 'net-2']),
+            set(c[0][0] for c in client.delete_network.call_args_list))
+        self.assertEqual([], journal.pending(self.key))
+        journal.close()
+
+
+class TestCleanupProgress(base.TestCase):
+
+    def test_report(self):
+        progress = cleanup_journal.CleanupProgress()
+        for i in range(3):
+            progress.count('ServerService')
+        with mock.patch.object(cleanup_journal.LOG, 'info') as info:
+            progress.report()
+        self.assertIn('ServerService: 3 deleted', info.call_args[0][0])
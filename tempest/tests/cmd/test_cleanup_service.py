@@ -0,0 +1,211 @@
+# Copyright 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+from tempest.cmd import cleanup_service
+from tempest import exceptions
+from tempest.openstack.common.fixture import mockpatch
+from tempest.tests import base
+
+
+class TestServiceLevels(base.TestCase):
+
+    def test_network_levels(self):
+        services = [cleanup_service.NetworkService,
+                    cleanup_service.NetworkSubnetService,
+                    cleanup_service.NetworkPortService,
+                    cleanup_service.NetworkRouterService,
+                    cleanup_service.NetworkFloatingIpService]
+        levels = cleanup_service.get_service_levels(services)
+        self.assertEqual([[cleanup_service.NetworkFloatingIpService],
+                          [cleanup_service.NetworkRouterService],
+                          [cleanup_service.NetworkPortService],
+                          [cleanup_service.NetworkSubnetService],
+                          [cleanup_service.NetworkService]], levels)
+
+    def test_independent_services_share_a_level(self):
+        services = [cleanup_service.VolumeService,
+                    cleanup_service.KeyPairService,
+                    cleanup_service.SnapshotService,
+                    cleanup_service.ServerService]
+        levels = cleanup_service.get_service_levels(services)
+        self.assertEqual([[cleanup_service.KeyPairService,
+                           cleanup_service.SnapshotService,
+                           cleanup_service.ServerService],
+                          [cleanup_service.VolumeService]], levels)
+
+    def test_missing_dependencies_are_ignored(self):
+        levels = cleanup_service.get_service_levels(
+            [cleanup_service.NetworkService])
+        self.assertEqual([[cleanup_service.NetworkService]], levels)
+
+
+class TestRunServices(base.TestCase):
+
+    def setUp(self):
+        super(TestRunServices, self).setUp()
+        self.useFixture(mockpatch.PatchObject(
+            cleanup_service, 'DEPENDENCY_RETRY_INTERVAL', 0))
+        self.manager = base.ThreadSafeMock()
+        self.client = self.manager.network_client
+        self.client.list_subnets.return_value = (
+            None, {'subnets': [{'id': 'subnet-1'}, {'id': 'subnet-2'}]})
+        self.client.list_networks.return_value = (
+            None, {'networks': [{'id': 'net-1'}]})
+        self.kwargs = {'data': {}, 'is_dry_run': False,
+                       'saved_state_json': None, 'is_preserve': False,
+                       'is_save_state': False, 'tenant_id': None}
+
+    def test_delete_all(self):
+        cleanup_service.run_services([cleanup_service.NetworkService,
+                                      cleanup_service.NetworkSubnetService],
+                                     self.manager, **self.kwargs)
+        self.assertEqual(
+            set(['subnet-1', 'subnet-2']),
+            set(c[0][0] for c in self.client.delete_subnet.call_args_list))
+        self.client.delete_network.assert_called_once_with('net-1')
+
+    def test_preserved_ids_are_not_deleted(self):
+        self.kwargs['preserved_ids'] = frozenset(['subnet-2', 'net-1'])
+        cleanup_service.run_services([cleanup_service.NetworkService,
+                                      cleanup_service.NetworkSubnetService],
+                                     self.manager, **self.kwargs)
+        self.client.delete_subnet.assert_called_once_with('subnet-1')
+        self.assertFalse(self.client.delete_network.called)
+
+    def test_dependency_conflict_is_retried(self):
+        self.client.delete_network.side_effect = [exceptions.Conflict(),
+                                                  None]
+        cleanup_service.run_services([cleanup_service.NetworkService,
+                                      cleanup_service.NetworkSubnetService],
+                                     self.manager, **self.kwargs)
+        self.assertEqual([mock.call('net-1'), mock.call('net-1')],
+                         self.client.delete_network.call_args_list)
+
+    def test_failed_retry_is_reported(self):
+        self.client.delete_network.side_effect = exceptions.Conflict()
+        service = cleanup_service.NetworkService
+        self.useFixture(mockpatch.PatchObject(
+            service, 'delete_items', side_effect=[[{'id': 'net-1'}],
+                                                  Exception('boom'),
+                                                  Exception('boom'),
+                                                  Exception('boom')]))
+        log = self.useFixture(mockpatch.PatchObject(cleanup_service,
+                                                    'LOG')).mock
+        cleanup_service.run_services([service], self.manager, **self.kwargs)
+        self.assertEqual(4, service.delete_items.call_count)
+        log.error.assert_called_with(
+            "NetworkService could not delete ['net-1']")
+
+    def test_other_errors_are_not_retried(self):
+        self.client.delete_network.side_effect = exceptions.Unauthorized()
+        cleanup_service.run_services([cleanup_service.NetworkService],
+                                     self.manager, **self.kwargs)
+        self.client.delete_network.assert_called_once_with('net-1')
+
+    def test_servers_terminated_before_next_level(self):
+        calls = []
+        servers_client = self.manager.servers_client
+        servers_client.list_servers.return_value = (
+            None, {'servers': [{'id': 'server-1'}]})
+        servers_client.wait_for_server_termination.side_effect = (
+            lambda *args, **kwargs: calls.append('terminated'))
+        secgroups_client = self.manager.security_groups_client
+        secgroups_client.list_security_groups.return_value = (
+            None, [{'id': 'sg-1', 'name': 'sg'}])
+        secgroups_client.delete_security_group.side_effect = (
+            lambda *args: calls.append('secgroup deleted'))
+        cleanup_service.run_services([cleanup_service.SecurityGroupService,
+                                      cleanup_service.ServerService],
+                                     self.manager, **self.kwargs)
+        servers_client.delete_server.assert_called_once_with('server-1')
+        self.assertEqual(['terminated', 'secgroup deleted'], calls)
+
+    def test_dry_run(self):
+        self.kwargs['is_dry_run'] = True
+        cleanup_service.run_services([cleanup_service.NetworkService,
+                                      cleanup_service.NetworkSubnetService],
+                                     self.manager, **self.kwargs)
+        self.assertEqual([{'id': 'net-1'}], self.kwargs['data']['networks'])
+        self.assertEqual(2, len(self.kwargs['data']['subnets']))
+        self.assertFalse(self.client.delete_network.called)
+
+
+class TestListing(base.TestCase):
+
+    def setUp(self):
+        super(TestListing, self).setUp()
+        self.manager = mock.MagicMock()
+        self.kwargs = {'data': {}, 'is_dry_run': False,
+                       'saved_state_json': None, 'is_preserve': False,
+                       'is_save_state': False, 'tenant_id': 'tenant'}
+
+    def test_server_pages(self):
+        servers = [{'id': 'server-%d' % i} for i in range(5)]
+        pages = [servers[:2], servers[2:4], servers[4:]]
+        client = self.manager.servers_client
+        client.list_servers.side_effect = [(None, {'servers': page})
+                                           for page in pages]
+        service = cleanup_service.ServerService(self.manager, **self.kwargs)
+        service.page_size = 2
+        self.assertEqual(servers, list(service.list()))
+        self.assertEqual([mock.call({'limit': 2}),
+                          mock.call({'limit': 2, 'marker': 'server-1'}),
+                          mock.call({'limit': 2, 'marker': 'server-3'})],
+                         client.list_servers.call_args_list)
+
+    def test_marker_deleted_while_listing(self):
+        servers = [{'id': 'server-%d' % i} for i in range(5)]
+        server_ids = [server['id'] for server in servers]
+        deleted = set()
+
+        def _list_servers(params):
+            marker = params.get('marker')
+            if marker in deleted:
+                raise exceptions.NotFound()
+            start = 0 if marker is None else server_ids.index(marker) + 1
+            return None, {'servers': servers[start:start + params['limit']]}
+
+        self.manager.servers_client.list_servers.side_effect = _list_servers
+        service = cleanup_service.ServerService(self.manager, **self.kwargs)
+        service.page_size = 2
+        listed = []
+        for server in service.list():
+            # the items are deleted while the listing goes on
+            deleted.add(server['id'])
+            listed.append(server)
+        self.assertEqual(servers, listed)
+
+    def test_pagination_not_supported(self):
+        ports = [{'id': 'port-%d' % i} for i in range(3)]
+        client = self.manager.network_client
+        client.list_ports.return_value = (None, {'ports': ports})
+        service = cleanup_service.NetworkPortService(self.manager,
+                                                     **self.kwargs)
+        service.page_size = 2
+        self.assertEqual(ports, list(service.list()))
+
+    def test_neutron_filters(self):
+        ports = [{'id': 'port-1', 'tenant_id': 'tenant'},
+                 {'id': 'port-2', 'tenant_id': 'other'}]
+        client = self.manager.network_client
+        client.list_ports.return_value = (None, {'ports': ports})
+        service = cleanup_service.NetworkPortService(self.manager,
+                                                     **self.kwargs)
+        self.assertEqual([ports[0]], list(service.list()))
+        client.list_ports.assert_called_once_with(
+            fields=['id', 'name', 'tenant_id'], tenant_id='tenant',
+            limit=service.page_size)
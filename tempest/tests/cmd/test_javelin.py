@@ -0,0 +1,313 @@
+# Copyright 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+import mock
+
+from tempest.cmd import javelin
+from tempest import exceptions
+from tempest.openstack.common.fixture import mockpatch
+from tempest.tests import base
+
+CLIENT_MODULES = ['identity_client', 'servers_client', 'object_client',
+                  'container_client', 'image_client', 'flavors_client',
+                  'telemetry_client', 'volumes_client',
+                  'security_groups_client']
+
+
+class JavelinTestCase(base.TestCase):
+
+    def setUp(self):
+        super(JavelinTestCase, self).setUp()
+        for module in CLIENT_MODULES:
+            self.useFixture(mockpatch.PatchObject(javelin, module))
+        self.useFixture(mockpatch.Patch(
+            'tempest.auth.KeystoneV2AuthProvider'))
+        self.useFixture(mockpatch.PatchObject(javelin, 'LOG'))
+        self.useFixture(mockpatch.PatchObject(javelin, 'CLIENTS', {}))
+        self.useFixture(mockpatch.PatchObject(javelin, 'USERS', {}))
+        self.useFixture(mockpatch.PatchObject(
+            javelin, 'OPTS', argparse.Namespace(
+                os_username='admin', os_password='secret',
+                os_tenant_name='admin', workers=4)))
+        state_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, state_dir)
+        self.state_path = os.path.join(state_dir, 'state.json')
+        self.useFixture(mockpatch.PatchObject(
+            javelin, 'STATE', javelin.JavelinState(self.state_path)))
+
+
+class TestResourceGraph(base.TestCase):
+
+    def test_dependencies_run_first(self):
+        lock = threading.Lock()
+        done = []
+
+        def _create(kind):
+            with lock:
+                done.append(kind)
+
+        graph = javelin.ResourceGraph()
+        graph.add(('server', 's'), _create, ('server',),
+                  deps=[('image', 'i'), ('user', 'u')])
+        graph.add(('image', 'i'), _create, ('image',), deps=[('user', 'u')])
+        graph.add(('user', 'u'), _create, ('user',),
+                  deps=[('tenant', 'not in the graph')])
+        graph.run()
+        self.assertEqual(['user', 'image', 'server'], done)
+
+    def test_independent_resources_run_concurrently(self):
+        barrier = threading.Event()
+        graph = javelin.ResourceGraph()
+        # the first server can only be created while the second one is
+        graph.add(('server', 'first'), barrier.wait, (5,))
+        graph.add(('server', 'second'), barrier.set)
+        graph.run(workers=2)
+        self.assertTrue(barrier.is_set())
+
+    def test_dependents_of_failures_are_not_run(self):
+        def _fail():
+            raise exceptions.Conflict()
+
+        created = mock.Mock()
+        graph = javelin.ResourceGraph()
+        graph.add(('image', 'i'), _fail)
+        graph.add(('server', 's'), created, deps=[('image', 'i')])
+        graph.add(('volume', 'v'), created)
+        exc = self.assertRaises(exceptions.ConcurrentOperationsFailed,
+                                graph.run)
+        self.assertIn('image i', str(exc))
+        self.assertIn('not run, image i failed', str(exc))
+        created.assert_called_once_with()
+
+
+class TestBuildResourceGraph(base.TestCase):
+
+    def setUp(self):
+        super(TestBuildResourceGraph, self).setUp()
+        self.res = javelin.load_resources(os.path.join(
+            os.path.dirname(javelin.__file__), 'resources.yaml'))
+
+    def test_default_resources(self):
+        levels = javelin.build_resource_graph(self.res)._levels()
+        self.assertEqual([('tenant', 'discuss'), ('tenant', 'javelin')],
+                         sorted(levels[0]))
+        self.assertEqual([('user', 'javelin'), ('user', 'javelin2')],
+                         sorted(levels[1]))
+        self.assertEqual([('image', 'javelin_cirros'),
+                          ('secgroup', 'angon'),
+                          ('swift role', 'javelin'),
+                          ('volume', 'assegai'), ('volume', 'pifpouf')],
+                         sorted(levels[2]))
+        self.assertEqual([('object', 'javelin1'), ('server', 'hoplite'),
+                          ('server', 'peltast')], sorted(levels[3]))
+        self.assertEqual([('attachment', 'assegai'),
+                          ('attachment', 'pifpouf')], sorted(levels[4]))
+
+    def test_destroy_order(self):
+        levels = javelin.build_destroy_graph(self.res)._levels()
+        # javelin2 owns nothing
+        self.assertEqual([('detachment', 'assegai'),
+                          ('detachment', 'pifpouf'),
+                          ('object', 'javelin1'), ('user', 'javelin2')],
+                         sorted(levels[0]))
+        self.assertEqual([('container', 'jc1'), ('server', 'hoplite'),
+                          ('server', 'peltast'), ('tenant', 'discuss'),
+                          ('volume', 'assegai'), ('volume', 'pifpouf')],
+                         sorted(levels[1]))
+        self.assertEqual([('image', 'javelin_cirros'), ('secgroup', 'angon')],
+                         sorted(levels[2]))
+        self.assertEqual([('user', 'javelin')], levels[3])
+        self.assertEqual([('tenant', 'javelin')], levels[4])
+
+
+class TestListings(JavelinTestCase):
+
+    def test_one_listing_per_type(self):
+        client = javelin.keystone_admin()
+        self.assertIs(client, javelin.keystone_admin())
+        client.servers.list_servers.return_value = (
+            None, {'servers': [{'name': 'peltast', 'id': '1'},
+                               {'name': 'hoplite', 'id': '2'}]})
+        self.assertEqual('1', javelin._get_server_by_name(client,
+                                                          'peltast')['id'])
+        self.assertEqual('2', javelin._get_server_by_name(client,
+                                                          'hoplite')['id'])
+        self.assertIsNone(javelin._get_server_by_name(client, 'missing'))
+        self.assertEqual(1, client.servers.list_servers.call_count)
+
+    def test_listing_dropped_after_changes(self):
+        client = javelin.keystone_admin()
+        client.images.image_list.return_value = (None, [])
+        javelin._get_image_by_name(client, 'javelin_cirros')
+        javelin.changed('images')
+        javelin._get_image_by_name(client, 'javelin_cirros')
+        self.assertEqual(2, client.images.image_list.call_count)
+
+    def test_create_user(self):
+        admin = javelin.keystone_admin()
+        admin.identity.list_tenants.return_value = (
+            None, [{'name': 'javelin', 'id': 'tenant-id'}])
+        admin.identity.get_users.side_effect = [
+            (None, []), (None, [{'name': 'javelin', 'id': 'user-id'}])]
+        admin.identity.create_user.return_value = (None, {'id': 'user-id'})
+        user = {'name': 'javelin', 'pass': 'gungnir', 'tenant': 'javelin'}
+        javelin.create_user(user)
+        admin.identity.create_user.assert_called_once_with(
+            'javelin', 'gungnir', 'tenant-id', 'javelin@tenant-id',
+            enabled=True)
+        self.assertEqual('user-id', javelin.USERS['javelin']['id'])
+        self.assertEqual('tenant-id', javelin.USERS['javelin']['tenant_id'])
+        self.assertEqual('user-id', javelin.STATE.get('users', 'javelin'))
+
+
+class TestState(JavelinTestCase):
+
+    def test_saved_on_changes(self):
+        javelin.STATE.record('servers', 'peltast', 'server-id')
+        javelin.STATE.record('servers', 'hoplite', 'other-id')
+        javelin.STATE.forget('servers', 'hoplite')
+        state = javelin.JavelinState(self.state_path)
+        self.assertEqual('server-id', state.get('servers', 'peltast'))
+        self.assertIsNone(state.get('servers', 'hoplite'))
+        with open(self.state_path) as state_file:
+            self.assertEqual({'servers': {'peltast': 'server-id'}},
+                             json.load(state_file))
+
+    def test_existing_resources_are_recorded(self):
+        admin = javelin.keystone_admin()
+        admin.identity.list_tenants.return_value = (
+            None, [{'name': 'javelin', 'id': 'tenant-id'}])
+        javelin.create_tenant('javelin')
+        self.assertFalse(admin.identity.create_tenant.called)
+        self.assertEqual('tenant-id', javelin.STATE.get('tenants', 'javelin'))
+
+    def test_missing_resources_are_created(self):
+        admin = javelin.keystone_admin()
+        admin.identity.list_tenants.return_value = (None, [])
+        admin.identity.create_tenant.return_value = (None, {'id': 'new-id'})
+        javelin.create_tenant('javelin')
+        admin.identity.create_tenant.assert_called_once_with('javelin')
+        self.assertEqual('new-id', javelin.STATE.get('tenants', 'javelin'))
+
+
+class TestDestroy(JavelinTestCase):
+
+    def setUp(self):
+        super(TestDestroy, self).setUp()
+        javelin.USERS['javelin'] = {'name': 'javelin', 'pass': 'gungnir',
+                                    'tenant': 'javelin'}
+        self.client = javelin.client_for_user('javelin')
+        self.server = {'name': 'peltast', 'owner': 'javelin'}
+
+    def test_deleted_by_id(self):
+        javelin.STATE.record('servers', 'peltast', 'server-id')
+        javelin.destroy_server(self.server)
+        self.client.servers.delete_server.assert_called_once_with('server-id')
+        wait = self.client.servers.wait_for_server_termination
+        wait.assert_called_once_with('server-id', ignore_error=True)
+        self.assertFalse(self.client.servers.list_servers.called)
+        self.assertIsNone(javelin.STATE.get('servers', 'peltast'))
+
+    def test_not_in_state(self):
+        self.client.servers.list_servers.return_value = (
+            None, {'servers': [{'name': 'peltast', 'id': 'server-id'}]})
+        javelin.destroy_server(self.server)
+        self.client.servers.delete_server.assert_called_once_with('server-id')
+
+    def test_already_deleted(self):
+        javelin.STATE.record('servers', 'peltast', 'server-id')
+        self.client.servers.delete_server.side_effect = exceptions.NotFound()
+        javelin.destroy_server(self.server)
+        self.assertIsNone(javelin.STATE.get('servers', 'peltast'))
+
+    def test_owner_gone(self):
+        javelin.STATE.record('servers', 'hoplite', 'server-id')
+        javelin.destroy_server({'name': 'hoplite', 'owner': 'javelin2'})
+        self.assertEqual('server-id', javelin.STATE.get('servers', 'hoplite'))
+
+
+class TestVolumes(JavelinTestCase):
+
+    def setUp(self):
+        super(TestVolumes, self).setUp()
+        javelin.USERS['javelin'] = {'name': 'javelin', 'pass': 'gungnir',
+                                    'tenant': 'javelin'}
+        self.client = javelin.client_for_user('javelin')
+        self.attachments = []
+        volumes = self.client.volumes
+        volumes.list_volumes.return_value = (
+            None, [{'display_name': 'assegai', 'id': 'volume-id',
+                    'attachments': []}])
+        volumes.get_volume.side_effect = lambda volume_id: (
+            None, {'id': volume_id, 'attachments': list(self.attachments)})
+        volumes.attach_volume.side_effect = (
+            lambda volume_id, server_id, device: self.attachments.append(
+                {'volume_id': volume_id, 'server_id': server_id}))
+        volumes.get_attachment_from_volume.side_effect = (
+            lambda volume: volume['attachments'][0])
+        self.client.servers.list_servers.return_value = (
+            None, {'servers': [{'name': 'peltast', 'id': 'server-id'}]})
+        self.volume = {'name': 'assegai', 'owner': 'javelin',
+                       'server': 'peltast', 'device': '/dev/vdb', 'gb': 1}
+
+    def test_create_then_check(self):
+        # the listing is cached before the volume is attached
+        self.assertEqual('volume-id', javelin._get_volume_by_name(
+            self.client, 'assegai')['id'])
+        javelin.attach_volume(self.volume)
+        self.client.volumes.wait_for_volume_status.assert_called_once_with(
+            'volume-id', 'in-use')
+        check = javelin.JavelinCheck({}, {'servers': [],
+                                          'volumes': [self.volume]})
+        check.check()
+
+    def test_attached_volume_is_not_attached_again(self):
+        self.attachments.append({'volume_id': 'volume-id',
+                                 'server_id': 'server-id'})
+        javelin.attach_volume(self.volume)
+        self.assertFalse(self.client.volumes.attach_volume.called)
+
+
+class TestSecgroups(JavelinTestCase):
+
+    def setUp(self):
+        super(TestSecgroups, self).setUp()
+        javelin.USERS['javelin'] = {'name': 'javelin', 'pass': 'gungnir',
+                                    'tenant': 'javelin'}
+        self.client = javelin.client_for_user('javelin')
+        self.secgroup = {'name': 'angon', 'owner': 'javelin',
+                         'rules': ['icmp -1 -1 0.0.0.0/0',
+                                   'tcp 22 22 0.0.0.0/0']}
+
+    def test_missing_rules_of_existing_group_are_added(self):
+        secgroups = self.client.secgroups
+        secgroups.list_security_groups.return_value = (
+            None, [{'name': 'angon', 'id': 'secgroup-id'}])
+        secgroups.get_security_group.return_value = (
+            None, {'id': 'secgroup-id',
+                   'rules': [{'ip_protocol': 'icmp', 'from_port': -1,
+                              'to_port': -1,
+                              'ip_range': {'cidr': '0.0.0.0/0'}}]})
+        javelin.create_secgroup(self.secgroup)
+        self.assertFalse(secgroups.create_security_group.called)
+        secgroups.create_security_group_rule.assert_called_once_with(
+            'secgroup-id', 'tcp', '22', '22', cidr='0.0.0.0/0')
@@ -13,12 +13,17 @@
 #    under the License.
 
 import json
+import StringIO
+import threading
+import time
 
+import fixtures
 import mock
 from oslo.config import cfg
 
 from tempest.cmd import verify_tempest_config
 from tempest import config
+from tempest import exceptions
 from tempest.openstack.common.fixture import mockpatch
 from tempest.tests import base
 from tempest.tests import fake_config
@@ -397,3 +402,85 @@ class TestDiscovery(base.TestCase):
         self.assertIn('extensions', results['swift'])
         self.assertEqual(sorted(['not_fake', 'fake1', 'fake2']),
                          sorted(results['swift']['extensions']))
+
+
+class TestRunProbes(base.TestCase):
+
+    def setUp(self):
+        super(TestRunProbes, self).setUp()
+        self.stdout = StringIO.StringIO()
+        self.useFixture(fixtures.MonkeyPatch('sys.stdout', self.stdout))
+
+    def test_output_in_probe_order(self):
+        second_done = threading.Event()
+
+        def _first():
+            # finishes after the second probe
+            second_done.wait(5)
+            verify_tempest_config._print('first')
+            return 1
+
+        def _second():
+            verify_tempest_config._print('second')
+            second_done.set()
+            return 2
+
+        results, failed = verify_tempest_config.run_probes(
+            [('first', _first, ()), ('second', _second, ())])
+        self.assertEqual({'first': 1, 'second': 2}, results)
+        self.assertEqual([], failed)
+        self.assertEqual('first\nsecond\n', self.stdout.getvalue())
+
+    def test_failed_and_timed_out_probes(self):
+        def _fail():
+            raise exceptions.NotFound()
+
+        results, failed = verify_tempest_config.run_probes(
+            [('ok', int, ()), ('fail', _fail, ()),
+             ('slow', time.sleep, (2,))], timeout=0.2)
+        self.assertEqual({'ok': 0}, results)
+        self.assertEqual(['fail', 'slow'], failed)
+        self.assertIn('fail failed', self.stdout.getvalue())
+        self.assertIn('slow failed', self.stdout.getvalue())
+
+    def test_timed_out_probe_does_not_change_written_config(self):
+        self.useFixture(mockpatch.PatchObject(
+            verify_tempest_config, 'CONF_PARSER',
+            verify_tempest_config.moves.configparser.SafeConfigParser()))
+        self.useFixture(mockpatch.PatchObject(
+            verify_tempest_config, 'CONF_PARSER_WRITTEN', False))
+        written = threading.Event()
+        late_change_done = threading.Event()
+
+        def _slow():
+            written.wait(5)
+            verify_tempest_config.change_option('late', 'group', 'value')
+            late_change_done.set()
+
+        results, failed = verify_tempest_config.run_probes(
+            [('slow', _slow, ())], timeout=0.1)
+        self.assertEqual(['slow'], failed)
+        outfile = StringIO.StringIO()
+        verify_tempest_config.write_config(outfile)
+        written.set()
+        late_change_done.wait(5)
+        self.assertFalse(
+            verify_tempest_config.CONF_PARSER.has_section('group'))
+
+    def test_check_service_availability(self):
+        self.useFixture(fake_config.ConfigFixture())
+        self.stubs.Set(config, 'TempestConfigPrivate', fake_config.FakePrivate)
+        fake_os = mock.MagicMock()
+        # the compute service has an endpoint in two regions
+        fake_os.endpoints_client.list_endpoints.return_value = (
+            None, [{'service_id': 'nova-id'}, {'service_id': 'nova-id'},
+                   {'service_id': 'keystone-id'}])
+        types = {'nova-id': config.CONF.compute.catalog_type,
+                 'keystone-id': config.CONF.identity.catalog_type}
+        fake_os.service_client.get_service.side_effect = (
+            lambda service_id: (None, {'type': types[service_id]}))
+        services = verify_tempest_config.check_service_availability(
+            fake_os, False)
+        self.assertEqual(['nova'], services)
+        self.assertEqual(
+            2, fake_os.service_client.get_service.call_count)
@@ -0,0 +1,161 @@
+# Copyright 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import shutil
+import tempfile
+
+import mock
+from oslo.config import cfg
+
+from tempest.common import account_pool
+from tempest.common import isolated_creds
+from tempest import config
+from tempest import exceptions
+from tempest.openstack.common.fixture import mockpatch
+from tempest.tests import base
+from tempest.tests import fake_config
+
+
+def _entry(name, admin=False):
+    return {'admin': admin,
+            'credentials': {'username': name, 'user_id': name + '-id',
+                            'tenant_name': name + '-tenant',
+                            'tenant_id': name + '-tenant-id',
+                            'password': 'pass'},
+            'network': {'id': name + '-net', 'name': name + '-net'},
+            'subnet': {'id': name + '-subnet', 'name': name + '-subnet'},
+            'router': {'id': name + '-router', 'name': name + '-router'}}
+
+
+class TestCredentialPool(base.TestCase):
+
+    def setUp(self):
+        super(TestCredentialPool, self).setUp()
+        self.pool_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.pool_dir)
+        self.pool = account_pool.CredentialPool(self.pool_dir)
+
+    def test_acquire_by_kind(self):
+        user_id = self.pool.add(_entry('user'))
+        admin_id = self.pool.add(_entry('admin', admin=True))
+        self.assertEqual([admin_id], self.pool.entries(admin=True))
+        self.assertEqual((user_id, _entry('user')), self.pool.acquire())
+        self.assertEqual(admin_id, self.pool.acquire(admin=True)[0])
+
+    def test_locked_set_is_not_handed_out(self):
+        entry_id = self.pool.add(_entry('user'))
+        # another process, its lock file is opened separately
+        other = account_pool.CredentialPool(self.pool_dir)
+        self.assertTrue(other.lock(entry_id))
+        self.assertIsNone(self.pool.acquire())
+        other.release(entry_id)
+        self.assertEqual(entry_id, self.pool.acquire()[0])
+
+    def test_released_set_is_scrubbed_before_reuse(self):
+        entry_id = self.pool.add(_entry('user'))
+        self.pool.acquire()
+        # still in use, the scrubber can't claim it
+        scrubber = account_pool.CredentialPool(self.pool_dir)
+        self.assertEqual([], scrubber.claim_used())
+        self.pool.release(entry_id)
+        self.assertIsNone(self.pool.acquire())
+        self.assertEqual([entry_id], scrubber.claim_used())
+        scrubber.recycle(entry_id)
+        self.assertEqual(entry_id, self.pool.acquire()[0])
+
+    def test_remove(self):
+        entry_id = self.pool.add(_entry('user'))
+        self.pool.acquire()
+        self.pool.remove(entry_id)
+        self.assertEqual([], self.pool.entries())
+        self.assertEqual([], self.pool.claim_used())
+
+
+class TestPooledCreds(base.TestCase):
+
+    def setUp(self):
+        super(TestPooledCreds, self).setUp()
+        self.useFixture(fake_config.ConfigFixture())
+        self.stubs.Set(config, 'TempestConfigPrivate', fake_config.FakePrivate)
+        self.pool_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.pool_dir)
+        cfg.CONF.set_default('credential_pool_dir', self.pool_dir,
+                             group='auth')
+        cfg.CONF.set_default('credential_pool_timeout', 0, group='auth')
+        self.useFixture(mockpatch.PatchObject(account_pool,
+                                              'POLL_INTERVAL', 0))
+        self.pool = account_pool.CredentialPool(self.pool_dir)
+
+    def test_primary_creds(self):
+        self.pool.add(_entry('user'))
+        creds = account_pool.PooledCreds('test class')
+        primary = creds.get_primary_creds()
+        self.assertEqual('user', primary.username)
+        self.assertEqual('user-tenant-id', primary.tenant_id)
+        self.assertIs(primary, creds.get_primary_creds())
+        self.assertEqual('user-net', creds.get_primary_network()['id'])
+        self.assertEqual('user-router', creds.get_primary_router()['id'])
+
+    def test_exhausted_pool(self):
+        self.pool.add(_entry('user'))
+        self.pool.hold_daemon_lock()
+        creds = account_pool.PooledCreds('test class')
+        creds.get_primary_creds()
+        self.assertRaises(exceptions.TimeoutException, creds.get_alt_creds)
+
+    def _patch_fallback(self):
+        fallback = mock.Mock(isolated_net_resources={})
+        fallback.get_credentials.side_effect = (
+            lambda credential_type: credential_type + ' creds')
+        self.useFixture(mockpatch.PatchObject(
+            isolated_creds, 'IsolatedCreds', return_value=fallback))
+        return fallback
+
+    def test_no_daemon_falls_back_to_isolated_creds(self):
+        fallback = self._patch_fallback()
+        self.pool.add(_entry('user'))
+        creds = account_pool.PooledCreds('test class')
+        creds.get_primary_creds()
+        self.assertEqual('alt creds', creds.get_alt_creds())
+        creds.clear_isolated_creds()
+        fallback.clear_isolated_creds.assert_called_once_with()
+
+    def test_no_set_of_the_kind_falls_back_to_isolated_creds(self):
+        self._patch_fallback()
+        self.pool.add(_entry('user'))
+        self.pool.hold_daemon_lock()
+        creds = account_pool.PooledCreds('test class')
+        self.assertEqual('admin creds', creds.get_admin_creds())
+        self.assertEqual('user', creds.get_primary_creds().username)
+
+    def test_clear_gives_back_used_sets(self):
+        entry_id = self.pool.add(_entry('user'))
+        creds = account_pool.PooledCreds('test class')
+        creds.get_primary_creds()
+        creds.clear_isolated_creds()
+        self.assertEqual({}, creds.isolated_creds)
+        self.assertEqual([entry_id], self.pool.claim_used())
+
+    def test_get_isolated_creds(self):
+        self.assertIsInstance(account_pool.get_isolated_creds('test class'),
+                              account_pool.PooledCreds)
+        self.useFixture(mockpatch.PatchObject(isolated_creds.IsolatedCreds,
+                                              '_get_admin_clients',
+                                              return_value=(None, None)))
+        network_resources = {'network': False, 'router': False,
+                             'subnet': False, 'dhcp': False}
+        self.assertIsInstance(account_pool.get_isolated_creds(
+            'test class', network_resources=network_resources),
+            isolated_creds.IsolatedCreds)
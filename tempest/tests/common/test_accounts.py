@@ -14,9 +14,9 @@
 
 import hashlib
 import os
+import shutil
 import tempfile
 
-import mock
 from oslo.config import cfg
 from oslotest import mockpatch
 
@@ -37,8 +37,11 @@ class TestAccount(base.TestCase):
         self.useFixture(fake_config.ConfigFixture())
         self.stubs.Set(config, 'TempestConfigPrivate', fake_config.FakePrivate)
         self.temp_dir = tempfile.mkdtemp()
-        cfg.CONF.set_default('lock_path', self.temp_dir)
-        self.addCleanup(os.rmdir, self.temp_dir)
+        # NOTE: the loaded config is cached, overriding the default only
+        # works for the first test loading it
+        self.useFixture(mockpatch.PatchObject(accounts.CONF, 'lock_path',
+                                              self.temp_dir))
+        self.addCleanup(shutil.rmtree, self.temp_dir)
         self.test_accounts = [
             {'username': 'test_user1', 'tenant_name': 'test_tenant1',
              'password': 'p'},
@@ -85,107 +88,66 @@ class TestAccount(base.TestCase):
             self.assertIn(hash, hash_dict.keys())
             self.assertIn(hash_dict[hash], self.test_accounts)
 
-    def test_create_hash_file_previous_file(self):
-        # Emulate the lock existing on the filesystem
-        self.useFixture(mockpatch.Patch('os.path.isfile', return_value=True))
-        with mock.patch('__builtin__.open', mock.mock_open(), create=True):
-            test_account_class = accounts.Accounts('test_name')
-            res = test_account_class._create_hash_file('12345')
-        self.assertFalse(res, "_create_hash_file should return False if the "
-                         "pseudo-lock file already exists")
-
-    def test_create_hash_file_no_previous_file(self):
-        # Emulate the lock not existing on the filesystem
-        self.useFixture(mockpatch.Patch('os.path.isfile', return_value=False))
-        with mock.patch('__builtin__.open', mock.mock_open(), create=True):
-            test_account_class = accounts.Accounts('test_name')
-            res = test_account_class._create_hash_file('12345')
-        self.assertTrue(res, "_create_hash_file should return True if the "
-                        "pseudo-lock doesn't already exist")
-
-    @mock.patch('tempest.openstack.common.lockutils.lock')
-    def test_get_free_hash_no_previous_accounts(self, lock_mock):
-        # Emulate no pre-existing lock
-        self.useFixture(mockpatch.Patch('os.path.isdir', return_value=False))
+    def _lock_all_but(self, hash_list, free_hash=None):
+        # the locks of the accounts in use by another test process
+        other = accounts.AccountLocks(
+            os.path.join(accounts.CONF.lock_path, 'test_accounts'))
+        for _hash in hash_list:
+            if _hash != free_hash:
+                self.assertIsNotNone(other.acquire([_hash]))
+        return other
+
+    def test_get_free_hash_no_previous_accounts(self):
         hash_list = self._get_hash_list(self.test_accounts)
-        mkdir_mock = self.useFixture(mockpatch.Patch('os.mkdir'))
-        self.useFixture(mockpatch.Patch('os.path.isfile', return_value=False))
         test_account_class = accounts.Accounts('test_name')
-        with mock.patch('__builtin__.open', mock.mock_open(),
-                        create=True) as open_mock:
-            test_account_class._get_free_hash(hash_list)
-            lock_path = os.path.join(accounts.CONF.lock_path, 'test_accounts',
-                                     hash_list[0])
-            open_mock.assert_called_once_with(lock_path, 'w')
-        mkdir_path = os.path.join(accounts.CONF.lock_path, 'test_accounts')
-        mkdir_mock.mock.assert_called_once_with(mkdir_path)
-
-    @mock.patch('tempest.openstack.common.lockutils.lock')
-    def test_get_free_hash_no_free_accounts(self, lock_mock):
+        free_hash = test_account_class._get_free_hash(hash_list)
+        self.assertIn(free_hash, hash_list)
+        lock_path = os.path.join(accounts.CONF.lock_path, 'test_accounts',
+                                 free_hash)
+        self.assertTrue(os.path.exists(lock_path))
+
+    def test_get_free_hash_no_free_accounts(self):
         hash_list = self._get_hash_list(self.test_accounts)
-        # Emulate pre-existing lock dir
-        self.useFixture(mockpatch.Patch('os.path.isdir', return_value=True))
-        # Emulate all lcoks in list are in use
-        self.useFixture(mockpatch.Patch('os.path.isfile', return_value=True))
+        # NOTE: the locks are released once their files are collected
+        other = self._lock_all_but(hash_list)
         test_account_class = accounts.Accounts('test_name')
         self.assertRaises(exceptions.InvalidConfiguration,
                           test_account_class._get_free_hash, hash_list)
+        self.assertIsNone(other.acquire(hash_list))
 
-    @mock.patch('tempest.openstack.common.lockutils.lock')
-    def test_get_free_hash_some_in_use_accounts(self, lock_mock):
-        # Emulate no pre-existing lock
-        self.useFixture(mockpatch.Patch('os.path.isdir', return_value=True))
+    def test_get_free_hash_some_in_use_accounts(self):
         hash_list = self._get_hash_list(self.test_accounts)
+        other = self._lock_all_but(hash_list, free_hash=hash_list[3])
         test_account_class = accounts.Accounts('test_name')
+        self.assertEqual(hash_list[3],
+                         test_account_class._get_free_hash(hash_list))
+        self.assertIsNone(other.acquire(hash_list))
 
-        def _fake_is_file(path):
-            # Fake isfile() to return that the path exists unless a specific
-            # hash is in the path
-            if hash_list[3] in path:
-                return False
-            return True
-
-        self.stubs.Set(os.path, 'isfile', _fake_is_file)
-        with mock.patch('__builtin__.open', mock.mock_open(),
-                        create=True) as open_mock:
-            test_account_class._get_free_hash(hash_list)
-            lock_path = os.path.join(accounts.CONF.lock_path, 'test_accounts',
-                                     hash_list[3])
-            open_mock.assert_called_once_with(lock_path, 'w')
-
-    @mock.patch('tempest.openstack.common.lockutils.lock')
-    def test_remove_hash_last_account(self, lock_mock):
+    def test_accounts_are_not_handed_out_twice(self):
         hash_list = self._get_hash_list(self.test_accounts)
-        # Pretend the pseudo-lock is there
-        self.useFixture(mockpatch.Patch('os.path.isfile', return_value=True))
-        # Pretend the lock dir is empty
-        self.useFixture(mockpatch.Patch('os.listdir', return_value=[]))
         test_account_class = accounts.Accounts('test_name')
-        remove_mock = self.useFixture(mockpatch.Patch('os.remove'))
-        rmdir_mock = self.useFixture(mockpatch.Patch('os.rmdir'))
-        test_account_class.remove_hash(hash_list[2])
-        hash_path = os.path.join(accounts.CONF.lock_path, 'test_accounts',
-                                 hash_list[2])
-        lock_path = os.path.join(accounts.CONF.lock_path, 'test_accounts')
-        remove_mock.mock.assert_called_once_with(hash_path)
-        rmdir_mock.mock.assert_called_once_with(lock_path)
-
-    @mock.patch('tempest.openstack.common.lockutils.lock')
-    def test_remove_hash_not_last_account(self, lock_mock):
+        free_hashes = set(test_account_class._get_free_hash(hash_list)
+                          for _ in hash_list)
+        self.assertEqual(set(hash_list), free_hashes)
+        self.assertRaises(exceptions.InvalidConfiguration,
+                          test_account_class._get_free_hash, hash_list)
+
+    def test_remove_hash(self):
+        hash_list = self._get_hash_list(self.test_accounts)
+        test_account_class = accounts.Accounts('test_name')
+        free_hash = test_account_class._get_free_hash(hash_list)
+        other = self._lock_all_but(hash_list, free_hash=free_hash)
+        self.assertIsNone(other.acquire([free_hash]))
+        test_account_class.remove_hash(free_hash)
+        self.assertEqual(free_hash, other.acquire([free_hash]))
+
+    def test_remove_hash_not_held(self):
         hash_list = self._get_hash_list(self.test_accounts)
-        # Pretend the pseudo-lock is there
-        self.useFixture(mockpatch.Patch('os.path.isfile', return_value=True))
-        # Pretend the lock dir is empty
-        self.useFixture(mockpatch.Patch('os.listdir', return_value=[
-            hash_list[1], hash_list[4]]))
         test_account_class = accounts.Accounts('test_name')
-        remove_mock = self.useFixture(mockpatch.Patch('os.remove'))
-        rmdir_mock = self.useFixture(mockpatch.Patch('os.rmdir'))
+        log_mock = self.useFixture(mockpatch.PatchObject(accounts.LOG,
+                                                         'warning')).mock
         test_account_class.remove_hash(hash_list[2])
-        hash_path = os.path.join(accounts.CONF.lock_path, 'test_accounts',
-                                 hash_list[2])
-        remove_mock.mock.assert_called_once_with(hash_path)
-        rmdir_mock.mock.assert_not_called()
+        self.assertTrue(log_mock.called)
 
     def test_is_multi_user(self):
         test_accounts_class = accounts.Accounts('test_name')
@@ -207,7 +169,10 @@ class TestNotLockingAccount(base.TestCase):
         self.useFixture(fake_config.ConfigFixture())
         self.stubs.Set(config, 'TempestConfigPrivate', fake_config.FakePrivate)
         self.temp_dir = tempfile.mkdtemp()
-        cfg.CONF.set_default('lock_path', self.temp_dir)
+        # NOTE: the loaded config is cached, overriding the default only
+        # works for the first test loading it
+        self.useFixture(mockpatch.PatchObject(accounts.CONF, 'lock_path',
+                                              self.temp_dir))
         self.addCleanup(os.rmdir, self.temp_dir)
         self.test_accounts = [
             {'username': 'test_user1', 'tenant_name': 'test_tenant1',
@@ -0,0 +1,136 @@
+# Copyright 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import shutil
+import tempfile
+import time
+
+import mock
+
+from tempest.common import cidr_allocator
+from tempest import exceptions
+from tempest.openstack.common.fixture import mockpatch
+from tempest.tests import base
+
+
+class TestCidrAllocator(base.TestCase):
+
+    def setUp(self):
+        super(TestCidrAllocator, self).setUp()
+        self.list_cidrs = mock.Mock(return_value=['10.0.0.0/28',
+                                                  '10.0.0.32/27'])
+        self.allocator = self._allocator()
+
+    def _allocator(self, state_path=None):
+        return cidr_allocator.CidrAllocator(
+            self.list_cidrs, base_cidr='10.0.0.0/26', mask_bits=28,
+            state_path=state_path)
+
+    def test_used_blocks_are_skipped(self):
+        self.assertEqual('10.0.0.16/28', self.allocator.allocate())
+        self.list_cidrs.return_value.append('10.0.0.16/28')
+        self.assertRaises(exceptions.BuildErrorException,
+                          self.allocator.allocate)
+
+    def test_used_blocks_are_listed_once(self):
+        self.allocator.allocate()
+        self.allocator.release('10.0.0.16/28')
+        self.allocator.allocate()
+        self.list_cidrs.assert_called_once_with()
+
+    def test_round_robin(self):
+        self.list_cidrs.return_value = []
+        first = self.allocator.allocate()
+        self.allocator.release(first)
+        self.assertEqual(['10.0.0.16/28', '10.0.0.32/28', '10.0.0.48/28',
+                          first],
+                         [self.allocator.allocate() for _ in range(4)])
+
+    def test_exhausted_blocks_are_listed_again(self):
+        self.allocator.allocate()
+        # subnets deleted meanwhile by someone else
+        self.list_cidrs.return_value = ['10.0.0.16/28']
+        self.assertEqual('10.0.0.32/28', self.allocator.allocate())
+        self.assertEqual('10.0.0.48/28', self.allocator.allocate())
+        self.assertEqual('10.0.0.0/28', self.allocator.allocate())
+        self.assertEqual(2, self.list_cidrs.call_count)
+
+    def test_refresh_keeps_the_blocks_handed_out(self):
+        self.list_cidrs.return_value = []
+        handed_out = self.allocator.allocate()
+        # a subnet created by something else
+        self.list_cidrs.return_value = ['10.0.0.16/28']
+        self.assertEqual('10.0.0.32/28', self.allocator.allocate(refresh=True))
+        self.assertNotEqual(handed_out, self.allocator.allocate())
+
+
+class TestSharedCidrAllocator(TestCidrAllocator):
+
+    def setUp(self):
+        super(TestSharedCidrAllocator, self).setUp()
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        self.state_path = os.path.join(temp_dir, 'state.json')
+        self.allocator = self._allocator(self.state_path)
+
+    def test_workers_share_the_state(self):
+        self.list_cidrs.return_value = []
+        other_worker = self._allocator(self.state_path)
+        self.assertEqual('10.0.0.0/28', self.allocator.allocate())
+        self.assertEqual('10.0.0.16/28', other_worker.allocate())
+        self.allocator.release('10.0.0.0/28')
+        self.assertEqual(['10.0.0.32/28', '10.0.0.48/28', '10.0.0.0/28'],
+                         [other_worker.allocate() for _ in range(3)])
+        self.list_cidrs.assert_called_once_with()
+
+    def test_expired_state_is_listed_again(self):
+        self.list_cidrs.return_value = []
+        # never given back, e.g. by a run which crashed
+        self.assertEqual('10.0.0.0/28', self.allocator.allocate())
+        other_worker = self._allocator(self.state_path)
+        later = time.time() + cidr_allocator.STATE_TTL + 1
+        with mock.patch('time.time', return_value=later):
+            self.assertEqual('10.0.0.16/28', other_worker.allocate())
+        self.assertEqual(2, self.list_cidrs.call_count)
+        self.assertEqual(['10.0.0.32/28', '10.0.0.48/28', '10.0.0.0/28'],
+                         [self.allocator.allocate() for _ in range(3)])
+
+    def test_missing_state_directory(self):
+        state_dir = os.path.join(os.path.dirname(self.state_path), 'locks')
+        allocator = self._allocator(os.path.join(state_dir, 'state.json'))
+        self.assertEqual('10.0.0.16/28', allocator.allocate())
+        self.assertTrue(os.path.isdir(state_dir))
+
+
+class TestGetAllocator(base.TestCase):
+
+    def setUp(self):
+        super(TestGetAllocator, self).setUp()
+        self.useFixture(mockpatch.PatchObject(cidr_allocator, '_allocator',
+                                              None))
+        self.useFixture(mockpatch.PatchObject(
+            cidr_allocator, 'shared_state_path', return_value=None))
+
+    def test_allocator_shared_by_the_callers(self):
+        first_list = mock.Mock(return_value=['10.0.0.0/28'])
+        second_list = mock.Mock(return_value=['10.0.0.0/28'])
+        allocator = cidr_allocator.get_allocator(first_list)
+        handed_out = allocator.allocate()
+        self.assertIs(allocator, cidr_allocator.get_allocator(second_list))
+        # the blocks in flight are known, the latest listing is used
+        self.assertNotEqual(handed_out, allocator.allocate(refresh=True))
+        first_list.assert_called_once_with()
+        second_list.assert_called_once_with()
@@ -0,0 +1,192 @@
+# Copyright 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import shutil
+import tempfile
+import time
+
+import mock
+
+from tempest.common import api_discovery
+from tempest.common import discovery_cache
+from tempest import config
+from tempest import exceptions
+from tempest.openstack.common.fixture import mockpatch
+from tempest.tests import base
+from tempest.tests import fake_config
+
+
+class TestDiscoveryCache(base.TestCase):
+
+    def setUp(self):
+        super(TestDiscoveryCache, self).setUp()
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+        self.path = os.path.join(self.cache_dir, 'discovery.json')
+        self.cache = discovery_cache.DiscoveryCache(self.path, ttl=60)
+        self.discover = mock.Mock(return_value={'compute': {}})
+
+    def test_discovered_once(self):
+        self.assertEqual({'compute': {}}, self.cache.get('key', self.discover))
+        other_worker = discovery_cache.DiscoveryCache(self.path, ttl=60)
+        self.assertEqual({'compute': {}},
+                         other_worker.get('key', self.discover))
+        self.assertEqual(1, self.discover.call_count)
+
+    def test_keys_are_discovered_separately(self):
+        self.cache.get('key', self.discover)
+        self.cache.get('other', self.discover)
+        self.assertEqual(2, self.discover.call_count)
+
+    def test_expired_entries(self):
+        self.cache.get('stale', self.discover)
+        self.cache.get('key', self.discover)
+        now = time.time() + 120
+        with mock.patch('time.time', return_value=now):
+            self.cache.get('key', self.discover)
+        self.assertEqual(3, self.discover.call_count)
+        # the other expired entries are dropped
+        self.assertEqual(['key'], self.cache._read().keys())
+
+    def test_incomplete_discovery_is_not_cached(self):
+        self.discover.return_value = {'compute': {}, 'volume': None}
+        complete = discovery_cache._is_complete
+        self.assertEqual({'compute': {}, 'volume': None},
+                         self.cache.get('key', self.discover, complete))
+        self.cache.get('key', self.discover, complete)
+        self.assertEqual(2, self.discover.call_count)
+        self.assertEqual({}, self.cache._read())
+
+    def test_invalid_file(self):
+        with open(self.path, 'w') as cache_file:
+            cache_file.write('{"truncated')
+        self.assertEqual({'compute': {}}, self.cache.get('key', self.discover))
+
+
+class TestCapabilities(base.TestCase):
+
+    def setUp(self):
+        super(TestCapabilities, self).setUp()
+        self.useFixture(fake_config.ConfigFixture())
+        self.stubs.Set(config, 'TempestConfigPrivate', fake_config.FakePrivate)
+
+    def test_services(self):
+        capabilities = discovery_cache.Capabilities(
+            ['compute', 'object-store'],
+            {'compute': {'extensions': []}, 'object-store': {}})
+        self.assertEqual(frozenset(['compute', 'object_storage']),
+                         capabilities.services)
+        self.assertTrue(capabilities.is_service_available('compute'))
+        self.assertFalse(capabilities.is_service_available('volume'))
+        self.assertTrue(capabilities.is_service_available('network'))
+
+    def test_failed_probe(self):
+        capabilities = discovery_cache.Capabilities(
+            ['compute', 'volume'], {'compute': {'extensions': ['os-hosts']},
+                                    'volume': None})
+        self.assertTrue(capabilities.is_service_available('volume'))
+        self.assertTrue(capabilities.is_extension_available('backups',
+                                                            'volume'))
+
+    def test_extensions(self):
+        capabilities = discovery_cache.Capabilities(
+            ['compute', 'network'],
+            {'compute': {'extensions': ['os-hosts']},
+             'network': {'extensions': ['router']}})
+        self.assertTrue(capabilities.is_extension_available('os-hosts',
+                                                            'compute'))
+        self.assertFalse(capabilities.is_extension_available('router',
+                                                             'compute'))
+        self.assertTrue(capabilities.is_extension_available('router',
+                                                            'network'))
+        self.assertTrue(capabilities.is_extension_available('backups',
+                                                            'volume'))
+
+    def test_unknown(self):
+        capabilities = discovery_cache.Capabilities(None)
+        self.assertTrue(capabilities.is_service_available('volume'))
+        self.assertTrue(capabilities.is_extension_available('os-hosts',
+                                                            'compute'))
+
+
+class TestGetCapabilities(base.TestCase):
+
+    def setUp(self):
+        super(TestGetCapabilities, self).setUp()
+        self.useFixture(fake_config.ConfigFixture())
+        self.stubs.Set(config, 'TempestConfigPrivate', fake_config.FakePrivate)
+        self.useFixture(mockpatch.PatchObject(discovery_cache,
+                                              '_capabilities', None))
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        config.CONF.set_default('cache_file',
+                                os.path.join(cache_dir, 'discovery.json'),
+                                group='discovery')
+        self.auth_provider = mock.Mock()
+        self.auth_provider.auth_data = ('token', {'serviceCatalog': [
+            {'type': 'compute'}, {'type': 'volume'}, {'type': 'gone'}]})
+        self.auth_provider.base_url.side_effect = [
+            'http://nova', 'http://cinder', exceptions.EndpointNotFound()]
+        self.manager = self.patch('tempest.manager.Manager')
+        self.manager.return_value.auth_provider = self.auth_provider
+
+    def test_disabled(self):
+        config.CONF.set_default('cache_file', None, group='discovery')
+        self.assertIsNone(discovery_cache.get_capabilities())
+
+    def test_loaded_once(self):
+        discover = self.patch(
+            'tempest.common.api_discovery.discover_endpoints',
+            return_value={'compute': {'extensions': ['os-hosts']}})
+        capabilities = discovery_cache.get_capabilities()
+        self.assertIs(capabilities, discovery_cache.get_capabilities())
+        discover.assert_called_once_with(
+            'token', {'compute': 'http://nova', 'volume': 'http://cinder'},
+            workers=config.CONF.discovery.workers, keep_failed=True)
+        self.assertEqual(frozenset(['compute', 'volume']),
+                         capabilities.services)
+
+    def test_failed_probe(self):
+        self.patch('tempest.common.api_discovery.discover_endpoints',
+                   return_value={'compute': {'extensions': ['os-hosts']},
+                                 'volume': None})
+        capabilities = discovery_cache.get_capabilities()
+        self.assertTrue(capabilities.is_service_available('volume'))
+        self.assertFalse(os.path.exists(config.CONF.discovery.cache_file))
+
+    def test_discovery_failure(self):
+        self.manager.side_effect = exceptions.AuthenticationFailure()
+        capabilities = discovery_cache.get_capabilities()
+        self.assertIsNone(capabilities.services)
+
+
+class TestDiscoverEndpoints(base.TestCase):
+
+    def test_failed_services_are_left_out(self):
+        def _probe(name, url, token):
+            if name == 'volume':
+                raise api_discovery.ServiceError()
+            return {'url': url, 'extensions': [], 'versions': ['v2.0']}
+
+        self.useFixture(mockpatch.PatchObject(api_discovery, '_probe',
+                                              side_effect=_probe))
+        endpoints = {'compute': 'http://nova', 'volume': 'http://cinder'}
+        services = api_discovery.discover_endpoints('token', endpoints)
+        self.assertEqual(['compute'], services.keys())
+        self.assertEqual(['v2.0'], services['compute']['versions'])
+        services = api_discovery.discover_endpoints('token', endpoints,
+                                                    keep_failed=True)
+        self.assertIsNone(services['volume'])
@@ -0,0 +1,165 @@
+# Copyright 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import itertools
+import threading
+
+from tempest.common import server_pool
+from tempest import config
+from tempest import exceptions
+from tempest.openstack.common.fixture import mockpatch
+from tempest.tests import base
+from tempest.tests import fake_config
+
+
+class FakeServersClient(object):
+
+    tenant_id = 'tenant'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self.servers = {}
+        self.deleted = []
+        self.fail_boot = False
+
+    def create_server(self, name, image_ref, flavor_ref, **kwargs):
+        with self._lock:
+            server_id = 'server-%d' % next(self._ids)
+            self.servers[server_id] = {'id': server_id, 'status': 'ACTIVE',
+                                       'image': image_ref,
+                                       'flavor': flavor_ref,
+                                       'metadata': {}}
+            if self.fail_boot:
+                self.servers[server_id]['status'] = 'ERROR'
+        return None, {'id': server_id}
+
+    def wait_for_server_status(self, server_id, status):
+        if self.servers[server_id]['status'] != status:
+            raise exceptions.BuildErrorException(server_id=server_id)
+
+    def get_server(self, server_id):
+        try:
+            return None, dict(self.servers[server_id])
+        except KeyError:
+            raise exceptions.NotFound()
+
+    def set_server_metadata(self, server_id, meta):
+        self.servers[server_id]['metadata'] = meta
+
+    def delete_server(self, server_id):
+        with self._lock:
+            if self.servers.pop(server_id, None) is None:
+                raise exceptions.NotFound()
+            self.deleted.append(server_id)
+
+    def wait_for_server_termination(self, server_id):
+        pass
+
+
+class TestServerBroker(base.TestCase):
+
+    def setUp(self):
+        super(TestServerBroker, self).setUp()
+        self.client = FakeServersClient()
+        self.broker = server_pool.ServerBroker(size=2, workers=4)
+        self.addCleanup(self.broker.shutdown)
+
+    def test_servers_are_booted_ahead(self):
+        server = self.broker.acquire(self.client, 'image', 'flavor')
+        self.assertEqual('ACTIVE', server['status'])
+        self.broker.join()
+        key = server_pool.Signature('tenant', 'image', 'flavor', None)
+        self.assertEqual(1, len(self.broker._ready[key]))
+        self.assertEqual(2, len(self.client.servers))
+
+    def test_released_server_is_recycled(self):
+        server = self.broker.acquire(self.client, 'image', 'flavor')
+        self.client.servers[server['id']]['metadata'] = {'key': 'value'}
+        self.broker.release(server['id'])
+        self.broker.join()
+        self.assertEqual({}, self.client.servers[server['id']]['metadata'])
+        self.assertEqual([], self.client.deleted)
+        acquired = set(self.broker.acquire(self.client, 'image',
+                                           'flavor')['id']
+                       for _ in range(2))
+        self.assertIn(server['id'], acquired)
+        self.assertEqual(2, len(self.client.servers))
+
+    def test_dirty_server_is_replaced(self):
+        server = self.broker.acquire(self.client, 'image', 'flavor')
+        self.broker.release(server['id'], dirty=True)
+        self.broker.join()
+        self.assertEqual([server['id']], self.client.deleted)
+        key = server_pool.Signature('tenant', 'image', 'flavor', None)
+        self.assertEqual(2, len(self.broker._ready[key]))
+
+    def test_server_not_active_is_not_recycled(self):
+        server = self.broker.acquire(self.client, 'image', 'flavor')
+        self.client.servers[server['id']]['status'] = 'ERROR'
+        self.broker.release(server['id'])
+        self.broker.join()
+        self.assertEqual([server['id']], self.client.deleted)
+
+    def test_signatures_are_separate(self):
+        first = self.broker.acquire(self.client, 'image', 'flavor')
+        second = self.broker.acquire(self.client, 'image', 'other')
+        self.assertEqual('flavor', first['flavor'])
+        self.assertEqual('other', second['flavor'])
+
+    def test_extra_server_when_all_in_use(self):
+        servers = [self.broker.acquire(self.client, 'image', 'flavor')
+                   for _ in range(3)]
+        self.assertEqual(3, len(set(s['id'] for s in servers)))
+        for server in servers:
+            self.broker.release(server['id'])
+        self.broker.join()
+        # the pool keeps its size, the extra server is deleted
+        self.assertEqual(1, len(self.client.deleted))
+        self.assertEqual(2, len(self.client.servers))
+
+    def test_boot_failure_is_raised(self):
+        self.client.fail_boot = True
+        self.assertRaises(exceptions.BuildErrorException,
+                          self.broker.acquire, self.client, 'image',
+                          'flavor')
+        self.broker.join()
+        self.assertEqual({}, self.client.servers)
+
+    def test_shutdown_deletes_every_server(self):
+        server = self.broker.acquire(self.client, 'image', 'flavor')
+        self.broker.shutdown()
+        self.assertIn(server['id'], self.client.deleted)
+        self.assertEqual({}, self.client.servers)
+
+
+class TestGetBroker(base.TestCase):
+
+    def setUp(self):
+        super(TestGetBroker, self).setUp()
+        self.useFixture(fake_config.ConfigFixture())
+        self.stubs.Set(config, 'TempestConfigPrivate', fake_config.FakePrivate)
+        self.useFixture(mockpatch.PatchObject(server_pool, '_broker', None))
+        self.useFixture(mockpatch.PatchObject(server_pool.atexit,
+                                              'register'))
+
+    def test_disabled(self):
+        self.assertIsNone(server_pool.get_broker())
+
+    def test_one_broker_per_process(self):
+        config.CONF.set_default('server_pool_size', 3, group='compute')
+        broker = server_pool.get_broker()
+        self.assertEqual(3, broker.size)
+        self.assertIs(broker, server_pool.get_broker())
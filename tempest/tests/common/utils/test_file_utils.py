@@ -13,6 +13,10 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import os
+import shutil
+import tempfile
+
 import mock
 
 from tempest.common.utils import file_utils
@@ -29,3 +33,13 @@ class TestFileUtils(base.TestCase):
     def test_not_effective_read_path(self):
         result = file_utils.have_effective_read_access('fake_path')
         self.assertFalse(result)
+
+    def test_try_lock(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        path = os.path.join(temp_dir, 'lock')
+        lock_file = file_utils.try_lock(path)
+        self.assertIsNotNone(lock_file)
+        self.assertIsNone(file_utils.try_lock(path))
+        lock_file.close()
+        file_utils.try_lock(path).close()
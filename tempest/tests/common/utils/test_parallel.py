@@ -0,0 +1,149 @@
+# Copyright 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import threading
+import time
+
+from tempest.common.utils import parallel
+from tempest import exceptions
+from tempest.tests import base
+
+
+class TestRunConcurrently(base.TestCase):
+
+    def test_no_calls(self):
+        self.assertEqual([], parallel.run_concurrently([]))
+
+    def test_results_in_call_order(self):
+        calls = [('slow', time.sleep, (0.2,), None),
+                 ('add', lambda a, b: a + b, (1,), {'b': 2})]
+        outcomes = parallel.run_concurrently(calls)
+        self.assertEqual(['slow', 'add'], [o.name for o in outcomes])
+        self.assertEqual([None, 3], [o.result for o in outcomes])
+        self.assertEqual([None, None], [o.error for o in outcomes])
+
+    def test_calls_run_concurrently(self):
+        barrier = threading.Event()
+        # the first call can only finish if the second one runs meanwhile
+        calls = [('waiter', barrier.wait, (5,), None),
+                 ('setter', barrier.set, None, None)]
+        parallel.run_concurrently(calls, workers=2, timeout=5,
+                                  raise_on_error=True)
+        self.assertTrue(barrier.is_set())
+
+    def test_workers_bound(self):
+        lock = threading.Lock()
+        running = []
+        peak = []
+
+        def _call():
+            with lock:
+                running.append(1)
+                peak.append(len(running))
+            time.sleep(0.05)
+            with lock:
+                running.pop()
+
+        calls = [(str(i), _call, None, None) for i in range(10)]
+        parallel.run_concurrently(calls, workers=3)
+        self.assertTrue(max(peak) <= 3)
+
+    def test_calls_start_while_generator_is_consumed(self):
+        started = threading.Event()
+
+        def _calls():
+            yield ('first', started.set, None, None)
+            # the first call runs before the generator is exhausted
+            self.assertTrue(started.wait(5))
+            yield ('second', int, None, None)
+
+        outcomes = parallel.run_concurrently(_calls(), raise_on_error=True)
+        self.assertEqual(['first', 'second'], [o.name for o in outcomes])
+
+    def test_errors_are_collected(self):
+        def _fail():
+            raise exceptions.NotFound()
+
+        outcomes = parallel.run_concurrently([('ok', int, None, None),
+                                              ('fail', _fail, None, None)])
+        self.assertIsNone(outcomes[0].error)
+        self.assertIsInstance(outcomes[1].error, exceptions.NotFound)
+
+    def test_shared_deadline(self):
+        calls = [('slow-%d' % i, time.sleep, (2,), None) for i in range(3)]
+        start = time.time()
+        outcomes = parallel.run_concurrently(calls, workers=3, timeout=0.2)
+        self.assertTrue(time.time() - start < 1)
+        for outcome in outcomes:
+            self.assertIsInstance(outcome.error,
+                                  exceptions.TimeoutException)
+
+    def test_raise_on_error_lists_every_failure(self):
+        def _fail(name):
+            raise exceptions.TimeoutException(name)
+
+        calls = [('first', _fail, ('first',), None),
+                 ('ok', int, None, None),
+                 ('second', _fail, ('second',), None)]
+        exc = self.assertRaises(exceptions.ConcurrentOperationsFailed,
+                                parallel.run_concurrently, calls,
+                                raise_on_error=True)
+        self.assertIn('2 of 3', str(exc))
+        self.assertIn('first', str(exc))
+        self.assertIn('second', str(exc))
+
+
+class TestTeardownScheduler(base.TestCase):
+
+    def test_levels_run_in_order(self):
+        lock = threading.Lock()
+        deleted = []
+
+        def _delete(kind, resource_id):
+            time.sleep(0.01)
+            with lock:
+                deleted.append(kind)
+
+        scheduler = parallel.TeardownScheduler(workers=4)
+        scheduler.add(2, 'network', _delete, 'network', 'n1')
+        for i in range(3):
+            scheduler.add(0, 'port %d' % i, _delete, 'port', i)
+        scheduler.add(1, 'subnet', _delete, 'subnet', 's1')
+        outcomes = scheduler.run(raise_on_error=True)
+        self.assertEqual(['port', 'port', 'port', 'subnet', 'network'],
+                         deleted)
+        self.assertEqual(5, len(outcomes))
+
+    def test_not_found_is_ignored(self):
+        def _delete(resource_id):
+            raise exceptions.NotFound()
+
+        scheduler = parallel.TeardownScheduler()
+        scheduler.add(0, 'gone', _delete, 'id')
+        outcomes = scheduler.run(raise_on_error=True)
+        self.assertIsNone(outcomes[0].error)
+
+    def test_failure_does_not_stop_next_levels(self):
+        deleted = []
+
+        def _fail(resource_id):
+            raise exceptions.Conflict()
+
+        scheduler = parallel.TeardownScheduler()
+        scheduler.add(0, 'port', _fail, 'p1')
+        scheduler.add(1, 'subnet', deleted.append, 's1')
+        self.assertRaises(exceptions.ConcurrentOperationsFailed,
+                          scheduler.run, raise_on_error=True)
+        self.assertEqual(['s1'], deleted)
@@ -0,0 +1,63 @@
+# Copyright 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import itertools
+import os
+import tempfile
+
+from tempest import exceptions
+from tempest.stress import arrivals
+from tempest.tests import base
+
+
+def _take(schedule, count):
+    return list(itertools.islice(schedule, count))
+
+
+class TestArrivals(base.TestCase):
+
+    def test_closed_loop(self):
+        self.assertIsNone(arrivals.from_descriptor({'action': 'a'}, 2, 0))
+
+    def test_fixed_rate_split_between_threads(self):
+        schedule = arrivals.from_descriptor({'action': 'a', 'rate': 8}, 4, 0)
+        self.assertEqual([0, 0.5, 1.0], _take(schedule, 3))
+
+    def test_poisson(self):
+        schedule = arrivals.from_descriptor({'action': 'a', 'rate': 100,
+                                             'arrival': 'poisson'}, 1, 0)
+        offsets = _take(schedule, 1000)
+        self.assertEqual(sorted(offsets), offsets)
+        # 1000 arrivals at 100/s take about 10 seconds
+        self.assertTrue(5 < offsets[-1] < 20)
+
+    def test_trace_shared_between_threads(self):
+        fd, path = tempfile.mkstemp()
+        self.addCleanup(os.remove, path)
+        with os.fdopen(fd, 'w') as trace:
+            trace.write("0.5\n0\n\n1.5\n1\n2\n")
+        test = {'action': 'a', 'trace': path}
+        self.assertEqual([0, 1, 2],
+                         list(arrivals.from_descriptor(test, 2, 0)))
+        self.assertEqual([0.5, 1.5],
+                         list(arrivals.from_descriptor(test, 2, 1)))
+
+    def test_invalid_descriptors(self):
+        self.assertRaises(exceptions.InvalidConfiguration,
+                          arrivals.from_descriptor,
+                          {'action': 'a', 'rate': 1, 'arrival': 'burst'}, 1, 0)
+        self.assertRaises(exceptions.InvalidConfiguration,
+                          arrivals.from_descriptor,
+                          {'action': 'a', 'rate': 0}, 1, 0)
@@ -0,0 +1,89 @@
+# Copyright 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import threading
+
+from tempest.openstack.common.fixture import mockpatch
+from tempest.stress import cleanup
+from tempest.tests import base
+from tempest.tests import fake_config
+
+
+class TestStressCleanup(base.TestCase):
+
+    def setUp(self):
+        super(TestStressCleanup, self).setUp()
+        self.useFixture(fake_config.ConfigFixture())
+        self.stubs.Set(cleanup.config, 'TempestConfigPrivate',
+                       fake_config.FakePrivate)
+        self.useFixture(mockpatch.PatchObject(cleanup.time, 'sleep'))
+        self.manager = base.ThreadSafeMock()
+        self.useFixture(mockpatch.PatchObject(
+            cleanup.clients, 'AdminManager', return_value=self.manager))
+        self.lock = threading.Lock()
+        self.calls = []
+        self.servers = set(['s1', 's2', 's3'])
+        self.snapshots = set(['snap1'])
+        self.volumes = set(['v1', 'v2'])
+        m = self.manager
+        m.servers_client.list_servers.side_effect = lambda params: (
+            None, {'servers': [{'id': i} for i in self.servers]})
+        m.servers_client.delete_server.side_effect = self._deleter(
+            'server', self.servers)
+        m.snapshots_client.list_snapshots.side_effect = lambda params: (
+            None, [{'id': i} for i in self.snapshots])
+        m.snapshots_client.delete_snapshot.side_effect = self._deleter(
+            'snapshot', self.snapshots)
+        m.volumes_client.list_volumes.side_effect = lambda params: (
+            None, [{'id': i} for i in self.volumes])
+        m.volumes_client.delete_volume.side_effect = self._deleter(
+            'volume', self.volumes)
+        m.keypairs_client.list_keypairs.return_value = (None, [{'name': 'k'}])
+        m.security_groups_client.list_security_groups.return_value = (
+            None, [{'id': 'g1', 'name': 'default'}, {'id': 'g2', 'name': 'g'}])
+        m.floating_ips_client.list_floating_ips.return_value = (None, [])
+        m.identity_client.get_users.return_value = (
+            None, [{'id': 'u1', 'name': 'stress_user-1'},
+                   {'id': 'u2', 'name': 'admin'}])
+        m.identity_client.list_tenants.return_value = (
+            None, [{'id': 't1', 'name': 'stress_tenant-1'}])
+
+    def _deleter(self, kind, resources):
+        def _delete(resource_id):
+            with self.lock:
+                self.calls.append(kind)
+                resources.discard(resource_id)
+        return _delete
+
+    def test_cleanup(self):
+        cleanup.cleanup()
+        m = self.manager
+        self.assertEqual(set(), self.servers | self.snapshots | self.volumes)
+        # snapshots are deleted before volumes, servers first of all
+        self.assertEqual(['server'] * 3 + ['snapshot'] + ['volume'] * 2,
+                         self.calls)
+        m.keypairs_client.delete_keypair.assert_called_once_with('k')
+        m.security_groups_client.delete_security_group.\
+            assert_called_once_with('g2')
+        m.identity_client.delete_user.assert_called_once_with('u1')
+        m.identity_client.delete_tenant.assert_called_once_with('t1')
+
+    def test_batch_wait(self):
+        cleanup.cleanup()
+        # one list to find the servers, one to check they are all gone
+        self.assertEqual(2, self.manager.servers_client.list_servers.
+                         call_count)
+        self.assertFalse(self.manager.servers_client.
+                         wait_for_server_termination.called)
@@ -0,0 +1,156 @@
+# Copyright 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import socket
+import threading
+
+import mock
+
+from tempest import config
+from tempest import exceptions
+from tempest.openstack.common.fixture import mockpatch
+from tempest.stress import distributed
+from tempest.stress import driver
+from tempest.stress import stressaction
+from tempest.tests import base
+from tempest.tests import fake_config
+
+
+class FakeAction(stressaction.StressAction):
+
+    def run(self):
+        pass
+
+
+class FailingAction(stressaction.StressAction):
+
+    def run(self):
+        raise Exception('FailingAction failed')
+
+
+class TestMessageReader(base.TestCase):
+
+    def test_messages_split_across_reads(self):
+        left, right = socket.socketpair()
+        self.addCleanup(left.close)
+        self.addCleanup(right.close)
+        reader = distributed.MessageReader(right)
+        left.sendall(b'{"type": "ready"}\n{"type": "met')
+        self.assertEqual([{'type': 'ready'}], reader.wait(1))
+        left.sendall(b'rics"}\n')
+        self.assertEqual({'type': 'metrics'}, reader.next_message(1))
+        left.close()
+        self.assertIsNone(reader.next_message(1))
+        self.assertTrue(reader.closed)
+
+
+class TestCollect(base.TestCase):
+
+    def setUp(self):
+        super(TestCollect, self).setUp()
+        self.useFixture(mockpatch.PatchObject(distributed, 'START_DELAY', 0))
+        self.useFixture(mockpatch.PatchObject(distributed, 'STOP_MARGIN', 0))
+        self.useFixture(mockpatch.PatchObject(distributed, 'STOP_GRACE', 0))
+        self.agent, coordinator_side = socket.socketpair()
+        self.addCleanup(self.agent.close)
+        self.addCleanup(coordinator_side.close)
+        self.reader = distributed.MessageReader(coordinator_side)
+        self.agent_reader = distributed.MessageReader(self.agent)
+        self.coordinator = distributed.Coordinator([], 'secret')
+
+    def _collect(self, **kwargs):
+        return self.coordinator._collect([self.reader], ['agent'],
+                                         kwargs.pop('duration', 0),
+                                         kwargs.pop('max_runs', None),
+                                         None, 1, 0)
+
+    def test_agent_sending_metrics_is_stopped(self):
+        # leave the agent the time to answer the stop
+        self.useFixture(mockpatch.PatchObject(distributed, 'STOP_GRACE', 5))
+        stopped = threading.Event()
+
+        def _agent():
+            # a stuck action, the agent still reports its metrics
+            while not stopped.is_set():
+                distributed.send_message(self.agent, 'metrics', actions={})
+                for message in self.agent_reader.wait(0.01):
+                    if message['type'] == 'stop':
+                        stopped.set()
+            distributed.send_message(self.agent, 'done')
+
+        agent = threading.Thread(target=_agent)
+        agent.start()
+        self.assertFalse(self._collect())
+        agent.join(5)
+        self.assertTrue(stopped.is_set())
+
+    def test_silent_agent_with_max_runs(self):
+        self.useFixture(mockpatch.PatchObject(distributed,
+                                              'MAX_RUNS_TIMEOUT', 0))
+        self.assertTrue(self._collect(max_runs=10))
+        self.assertEqual('stop', self.agent_reader.next_message(1)['type'])
+
+
+class TestCoordinator(base.TestCase):
+
+    def setUp(self):
+        super(TestCoordinator, self).setUp()
+        conf = self.useFixture(fake_config.ConfigFixture()).conf
+        conf.set_default('log_check_interval', 1, group='stress')
+        self.stubs.Set(config, 'TempestConfigPrivate',
+                       fake_config.FakePrivate)
+        # the agent processes are forked with the patched clients
+        self.useFixture(mockpatch.PatchObject(driver, 'clients',
+                                              mock.MagicMock()))
+        self.addCleanup(driver.processes.__delitem__, slice(None))
+
+    def _run(self, action, agents=2, **kwargs):
+        addresses, processes = distributed.start_local_agents(agents,
+                                                              'secret')
+        tests = [{'action': __name__ + '.' + action, 'threads': 2}]
+        coordinator = distributed.Coordinator(addresses,
+                                              kwargs.pop('token', 'secret'))
+        try:
+            result = coordinator.run(tests, 30, terminate_timeout=1,
+                                     **kwargs)
+        finally:
+            for process in processes:
+                process.join(10)
+        return coordinator, result
+
+    def test_runs_aggregated(self):
+        coordinator, result = self._run('FakeAction', max_runs=3)
+        self.assertEqual(0, result)
+        self.assertEqual(2, len(coordinator.processes))
+        self.assertEqual(set(['FakeAction']),
+                         set(p['action'] for p in coordinator.processes))
+        # 2 agents, 2 processes each, 3 runs per process
+        self.assertEqual(12, sum(p['statistic']['runs']
+                                 for p in coordinator.processes))
+
+    def test_stop_on_error_stops_every_agent(self):
+        coordinator, result = self._run('FailingAction', stop_on_error=True)
+        self.assertEqual(1, result)
+        self.assertTrue(coordinator.breaking_points)
+
+    def test_invalid_token_is_refused(self):
+        coordinator, result = self._run('FakeAction', agents=1, max_runs=1,
+                                        token='guess')
+        self.assertEqual(1, result)
+        self.assertEqual([], coordinator.processes)
+
+    def test_token_required(self):
+        self.assertRaises(exceptions.InvalidConfiguration,
+                          distributed.Agent, mock.Mock(), None)
@@ -0,0 +1,77 @@
+# Copyright 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import json
+import os
+import tempfile
+
+import mock
+
+from tempest import exceptions
+from tempest.openstack.common.fixture import mockpatch
+from tempest.stress import driver
+from tempest.tests import base
+
+
+class TestIsolatedCredentials(base.TestCase):
+
+    def setUp(self):
+        super(TestIsolatedCredentials, self).setUp()
+        self.get_credentials = self.useFixture(mockpatch.PatchObject(
+            driver.auth, 'get_credentials', side_effect=lambda **kw: kw)).mock
+        self.admin_manager = base.ThreadSafeMock()
+        self.identity_client = self.admin_manager.identity_client
+        self.identity_client.create_tenant.side_effect = (
+            lambda name: (None, {'id': name + '-id'}))
+
+    def test_tenants_created_concurrently(self):
+        with mock.patch.object(driver.parallel, 'run_concurrently',
+                               wraps=driver.parallel.run_concurrently) as run:
+            creds = driver._isolated_credentials({'action': 'a'}, 5,
+                                                 self.admin_manager)
+        self.assertEqual(1, run.call_count)
+        self.assertEqual(5, len(creds))
+        self.assertEqual(5, len(set(c['tenant_name'] for c in creds)))
+        for cred in creds:
+            self.assertTrue(cred['username'].startswith('stress_user'))
+            self.assertTrue(cred['tenant_name'].startswith('stress_tenant'))
+        self.assertEqual(5, self.identity_client.create_user.call_count)
+
+    def test_provisioning_failure(self):
+        self.identity_client.create_tenant.side_effect = (
+            exceptions.Conflict())
+        self.assertRaises(exceptions.ConcurrentOperationsFailed,
+                          driver._isolated_credentials, {'action': 'a'}, 2,
+                          self.admin_manager)
+
+    def _pool_file(self, count):
+        fd, path = tempfile.mkstemp()
+        self.addCleanup(os.remove, path)
+        with os.fdopen(fd, 'w') as f:
+            json.dump([{'username': 'u%d' % i, 'password': 'p',
+                        'tenant_name': 't%d' % i} for i in range(count)], f)
+        return path
+
+    def test_pool_file(self):
+        test = {'action': 'a', 'isolated_tenants_file': self._pool_file(3)}
+        creds = driver._isolated_credentials(test, 2, self.admin_manager)
+        self.assertEqual(['u0', 'u1'], [c['username'] for c in creds])
+        self.assertFalse(self.identity_client.create_tenant.called)
+
+    def test_pool_file_too_small(self):
+        test = {'action': 'a', 'isolated_tenants_file': self._pool_file(1)}
+        self.assertRaises(exceptions.InvalidConfiguration,
+                          driver._isolated_credentials, test, 2,
+                          self.admin_manager)
@@ -0,0 +1,87 @@
+# Copyright 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+from tempest import exceptions
+from tempest.openstack.common.fixture import mockpatch
+from tempest.stress import log_scanner
+from tempest.tests import base
+
+
+class TestLogScanner(base.TestCase):
+
+    def setUp(self):
+        super(TestLogScanner, self).setUp()
+        self.ssh = self.useFixture(mockpatch.PatchObject(
+            log_scanner.ssh, 'Client')).mock
+        self.client = self.ssh.return_value
+        self.scanner = log_scanner.LogScanner(['node'], '/var/log/nova/*',
+                                              'user')
+
+    def _outputs(self, *outputs):
+        self.client.exec_command.side_effect = list(outputs)
+
+    def test_persistent_connections(self):
+        self.ssh.assert_called_once_with('node', 'user', key_filename=None,
+                                         keep_connection=True)
+        self.scanner.close()
+        self.client.close.assert_called_once_with()
+
+    def test_only_new_data_is_read(self):
+        self._outputs("100 /var/log/nova/api.log\n0 /var/log/nova/cpu.log\n",
+                      "/var/log/nova/api.log: ERROR boom\n",
+                      "150 /var/log/nova/api.log\n0 /var/log/nova/cpu.log\n",
+                      "")
+        self.assertEqual({'node': ['/var/log/nova/api.log: ERROR boom']},
+                         self.scanner.scan())
+        self.assertEqual({}, self.scanner.scan())
+        first = self.client.exec_command.call_args_list[1][0][0]
+        self.assertIn("tail -c +1 /var/log/nova/api.log | head -c 100",
+                      first)
+        self.assertNotIn("cpu.log", first)
+        second = self.client.exec_command.call_args_list[3][0][0]
+        self.assertIn("tail -c +101 /var/log/nova/api.log | head -c 50",
+                      second)
+
+    def test_unchanged_logs_are_not_read(self):
+        self._outputs("100 /var/log/nova/api.log\n", "",
+                      "100 /var/log/nova/api.log\n")
+        self.scanner.scan()
+        self.scanner.scan()
+        self.assertEqual(3, self.client.exec_command.call_count)
+
+    def test_rotated_log(self):
+        self._outputs("100 /var/log/nova/api.log\n", "",
+                      "20 /var/log/nova/api.log\n", "")
+        self.scanner.scan()
+        self.scanner.scan()
+        self.assertIn("tail -c +1 /var/log/nova/api.log | head -c 20",
+                      self.client.exec_command.call_args[0][0])
+
+    def test_failed_node_is_skipped(self):
+        self.client.exec_command.side_effect = exceptions.SSHTimeout(
+            host='node', user='user', password=None)
+        self.assertEqual({}, self.scanner.scan())
+        self.assertEqual({}, self.scanner.offsets['node'])
+
+    def test_nodes_scanned_concurrently(self):
+        scanner = log_scanner.LogScanner(['a', 'b'], '/log', 'user')
+        with mock.patch.object(log_scanner.parallel,
+                               'run_concurrently') as run:
+            run.return_value = []
+            scanner.scan()
+        calls = run.call_args[0][0]
+        self.assertEqual(set(['a', 'b']), set(call[0] for call in calls))
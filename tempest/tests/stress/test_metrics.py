@@ -0,0 +1,100 @@
+# Copyright 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import csv
+import json
+import os
+import shutil
+import tempfile
+
+from tempest.stress import metrics
+from tempest.stress import statistics
+from tempest.tests import base
+
+
+class TestMetrics(base.TestCase):
+
+    def setUp(self):
+        super(TestMetrics, self).setUp()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.processes = [{'action': action,
+                           'statistic': statistics.SharedStatistic()}
+                          for action in ('Create', 'Create', 'Delete')]
+
+    def _run(self, process, count, seconds, fails=0):
+        statistic = self.processes[process]['statistic']
+        for i in range(count):
+            statistic['runs'] += 1
+            statistic.add_latency(seconds)
+        statistic['fails'] += fails
+
+    def test_action_totals(self):
+        self._run(0, 2, 0.2)
+        self._run(1, 3, 0.2, fails=1)
+        totals = metrics.action_totals(self.processes)
+        self.assertEqual(['Create', 'Delete'], list(totals))
+        self.assertEqual(5, totals['Create'].runs)
+        self.assertEqual(1, totals['Create'].fails)
+        self.assertEqual(0, totals['Delete'].runs)
+
+    def test_json_snapshots_cover_intervals(self):
+        path = os.path.join(self.tmp_dir, 'metrics.json')
+        sink = metrics.MetricsSink(path)
+        self._run(0, 10, 0.2)
+        sink.snapshot(self.processes, now=sink._start + 10)
+        self._run(0, 10, 4, fails=2)
+        sink.snapshot(self.processes, now=sink._start + 20)
+        sink.close()
+        with open(path) as f:
+            rows = [json.loads(line) for line in f]
+        create = [row for row in rows if row['action'] == 'Create']
+        self.assertEqual([10, 10], [row['runs'] for row in create])
+        self.assertEqual([1.0, 1.0], [row['throughput'] for row in create])
+        self.assertEqual([0.25, 5], [row['p95'] for row in create])
+        self.assertEqual([0, 2], [row['fails'] for row in create])
+        self.assertEqual(20, create[-1]['total_runs'])
+        delete = [row for row in rows if row['action'] == 'Delete']
+        self.assertIsNone(delete[0]['p95'])
+
+    def test_csv_header_written_once(self):
+        path = os.path.join(self.tmp_dir, 'metrics.csv')
+        for i in range(2):
+            sink = metrics.MetricsSink(path)
+            sink.snapshot(self.processes)
+            sink.close()
+        with open(path) as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual(4, len(rows))
+        self.assertEqual(set(metrics.FIELDS), set(rows[0]))
+
+    def test_text_report(self):
+        self._run(2, 4, 0.05, fails=1)
+        path = os.path.join(self.tmp_dir, 'report.txt')
+        metrics.write_report(path, self.processes, 2, ['Delete broke'])
+        with open(path) as f:
+            report = f.read()
+        self.assertIn('Delete', report)
+        self.assertIn('Runs/s:            2.00', report)
+        self.assertIn('Breaking point: Delete broke', report)
+
+    def test_html_report(self):
+        self._run(0, 1, 500)
+        path = os.path.join(self.tmp_dir, 'report.html')
+        metrics.write_report(path, self.processes, 10)
+        with open(path) as f:
+            report = f.read()
+        self.assertIn('<td>Create</td>', report)
+        self.assertIn('<td>&gt;300s</td>', report)
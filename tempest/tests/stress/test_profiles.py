@@ -0,0 +1,55 @@
+# Copyright 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from tempest import exceptions
+from tempest.stress import profiles
+from tempest.tests import base
+
+
+class TestProfiles(base.TestCase):
+
+    def _windows(self, profile, threads):
+        test = {'action': 'a', 'profile': profile}
+        return [profiles.from_descriptor(test, threads, p_number)
+                for p_number in range(threads)]
+
+    def test_no_profile(self):
+        self.assertEqual((0, None),
+                         profiles.from_descriptor({'action': 'a'}, 4, 3))
+
+    def test_step(self):
+        windows = self._windows({'type': 'step', 'threads_per_step': 2,
+                                 'step_interval': 30}, 5)
+        self.assertEqual([0, 0, 30, 30, 60], [w[0] for w in windows])
+        self.assertEqual(set([None]), set(w[1] for w in windows))
+
+    def test_linear(self):
+        windows = self._windows({'type': 'linear', 'ramp_time': 100}, 4)
+        self.assertEqual([0, 25, 50, 75], [w[0] for w in windows])
+
+    def test_spike(self):
+        windows = self._windows({'type': 'spike', 'base_threads': 2,
+                                 'spike_at': 60, 'spike_length': 30}, 3)
+        self.assertEqual([(0, None), (0, None), (60, 90)], windows)
+        self.assertEqual([True, True, False],
+                         [profiles.is_active(w, 95) for w in windows])
+        self.assertEqual([True, True, True],
+                         [profiles.is_active(w, 60) for w in windows])
+
+    def test_invalid_profiles(self):
+        self.assertRaises(exceptions.InvalidConfiguration,
+                          self._windows, {'type': 'sawtooth'}, 2)
+        self.assertRaises(exceptions.InvalidConfiguration,
+                          self._windows, {'type': 'step'}, 2)
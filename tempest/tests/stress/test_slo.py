@@ -0,0 +1,72 @@
+# Copyright 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from tempest import exceptions
+from tempest.stress import slo
+from tempest.stress import statistics
+from tempest.tests import base
+
+
+class TestSLOMonitor(base.TestCase):
+
+    def setUp(self):
+        super(TestSLOMonitor, self).setUp()
+        self.processes = []
+        for window in ((0, None), (1000, None)):
+            self.processes.append({'statistic': statistics.SharedStatistic(),
+                                   'window': window,
+                                   'started': 0})
+
+    def _run(self, count, seconds, fails=0):
+        statistic = self.processes[0]['statistic']
+        for i in range(count):
+            statistic['runs'] += 1
+            statistic.add_latency(seconds)
+        statistic['fails'] += fails
+
+    def test_unknown_rule(self):
+        self.assertRaises(exceptions.InvalidConfiguration, slo.SLOMonitor,
+                          'action', {'p99_latency': 1}, self.processes)
+
+    def test_not_enough_runs(self):
+        monitor = slo.SLOMonitor('action', {'error_rate': 0.1},
+                                 self.processes)
+        self._run(5, 0.1, fails=5)
+        self.assertIsNone(monitor.check())
+
+    def test_error_rate(self):
+        monitor = slo.SLOMonitor('action', {'error_rate': 0.1},
+                                 self.processes)
+        self._run(10, 0.1, fails=1)
+        self.assertIsNone(monitor.check())
+        self._run(10, 0.1, fails=2)
+        self.assertIn('error rate 0.20', monitor.check())
+
+    def test_p95_latency_on_recent_runs(self):
+        monitor = slo.SLOMonitor('action', {'p95_latency': 1},
+                                 self.processes)
+        self._run(100, 0.2)
+        self.assertIsNone(monitor.check())
+        # the slow runs break the objective although the cumulated p95
+        # is still below the threshold
+        self._run(10, 4)
+        self.assertIn('p95 latency <= 5s', monitor.check())
+
+    def test_load_level(self):
+        monitor = slo.SLOMonitor('action', {}, self.processes, rate=4)
+        self.assertEqual('1 of 2 threads (2.00 runs/s)',
+                         monitor.load_level(now=10))
+        self.assertEqual('2 of 2 threads (4.00 runs/s)',
+                         monitor.load_level(now=2000))
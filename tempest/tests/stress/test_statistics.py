@@ -0,0 +1,70 @@
+# Copyright 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import multiprocessing
+
+from tempest.stress import statistics
+from tempest.tests import base
+
+
+def _work(statistic):
+    for i in range(10):
+        statistic['runs'] += 1
+        statistic.add_latency(0.3)
+    statistic['fails'] += 1
+
+
+class TestSharedStatistic(base.TestCase):
+
+    def test_counters_start_at_zero(self):
+        statistic = statistics.SharedStatistic()
+        self.assertEqual(0, statistic['runs'])
+        self.assertEqual(0, statistic['fails'])
+        self.assertEqual(0, sum(statistic.histogram))
+
+    def test_unknown_counter(self):
+        statistic = statistics.SharedStatistic()
+        self.assertRaises(ValueError, statistic.__getitem__, 'unknown')
+
+    def test_latency_buckets(self):
+        statistic = statistics.SharedStatistic()
+        for seconds in (0.05, 0.1, 0.3, 1000):
+            statistic.add_latency(seconds)
+        histogram = statistic.histogram
+        self.assertEqual(2, histogram[0])
+        self.assertEqual(1, histogram[2])
+        self.assertEqual(1, histogram[-1])
+        self.assertAlmostEqual(1000.45, statistic.latency_sum)
+
+    def test_updates_visible_from_parent(self):
+        statistic = statistics.SharedStatistic()
+        process = multiprocessing.Process(target=_work, args=(statistic,))
+        process.start()
+        process.join()
+        self.assertEqual(10, statistic['runs'])
+        self.assertEqual(1, statistic['fails'])
+        self.assertEqual(10, statistic.histogram[2])
+
+    def test_merge_and_format(self):
+        first = statistics.SharedStatistic()
+        second = statistics.SharedStatistic()
+        first.add_latency(0.05)
+        second.add_latency(0.05)
+        second.add_latency(500)
+        merged = statistics.merge_histograms([first, second])
+        self.assertEqual(2, merged[0])
+        self.assertEqual(1, merged[-1])
+        self.assertEqual("<=0.1s: 2, >300s: 1",
+                         statistics.format_histogram(merged))
@@ -13,6 +13,10 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import threading
+import time
+
+from tempest.stress import statistics
 import tempest.stress.stressaction as stressaction
 import tempest.test
 
@@ -37,7 +41,10 @@ class FakeStressActionFailing(stressaction.StressAction):
 
 class TestStressAction(tempest.test.BaseTestCase):
     def _bulid_stats_dict(self, runs=0, fails=0):
-        return {'runs': runs, 'fails': fails}
+        stats = statistics.SharedStatistic()
+        stats['runs'] = runs
+        stats['fails'] = fails
+        return stats
 
     def testStressTestRun(self):
         stressAction = FakeStressAction(manager=None, max_runs=1)
@@ -46,6 +53,7 @@ class TestStressAction(tempest.test.BaseTestCase):
         self.assertTrue(stressAction.run_called)
         self.assertEqual(stats['runs'], 1)
         self.assertEqual(stats['fails'], 0)
+        self.assertEqual(1, sum(stats.histogram))
 
     def testStressMaxTestRuns(self):
         stressAction = FakeStressAction(manager=None, max_runs=500)
@@ -61,3 +69,73 @@ class TestStressAction(tempest.test.BaseTestCase):
         stressAction.execute(stats)
         self.assertEqual(stats['runs'], 1)
         self.assertEqual(stats['fails'], 1)
+
+    def testStressOpenLoop(self):
+        stressAction = FakeStressAction(manager=None, max_runs=3)
+        stressAction.concurrency = 4
+        stressAction.arrivals = iter([0, 0.01, 0.02, 0.03])
+        stats = self._bulid_stats_dict()
+        stressAction.execute(stats)
+        self.assertEqual(stats['runs'], 3)
+
+    def testStressOpenLoopDoesNotWaitForRuns(self):
+        release = threading.Event()
+
+        class SlowAction(stressaction.StressAction):
+            def run(self):
+                release.wait(5)
+
+        stressAction = SlowAction(manager=None)
+        stressAction.concurrency = 2
+        stressAction.arrivals = iter([0, 0, 0, 0])
+        stats = self._bulid_stats_dict()
+        runner = threading.Thread(target=stressAction._execute, args=(stats,))
+        runner.start()
+        # the arrivals beyond the runs in flight are dropped, not delayed
+        deadline = time.time() + 5
+        while stats['drops'] < 2 and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(0, stats['runs'])
+        release.set()
+        runner.join(5)
+        self.assertEqual(2, stats['runs'])
+        self.assertEqual(2, stats['drops'])
+
+    def testStressOpenLoopLatencyFromSchedule(self):
+        stressAction = FakeStressAction(manager=None)
+        stressAction.concurrency = 2
+        # the second run was scheduled 10 seconds before the worker started
+        stressAction.arrivals = iter([0, -10])
+        stats = self._bulid_stats_dict()
+        stressAction.execute(stats)
+        self.assertEqual(stats['runs'], 2)
+        self.assertTrue(stats.latency_sum >= 10)
+
+    def testStressProfileWindow(self):
+        stressAction = FakeStressAction(manager=None)
+        stressAction.start_delay = 0.01
+        stressAction.stop_after = 0.05
+        stats = self._bulid_stats_dict()
+        start = time.time()
+        stressAction.execute(stats)
+        self.assertTrue(time.time() - start >= 0.05)
+        self.assertTrue(stats['runs'] > 0)
+
+    def testStressCooperative(self):
+        actions = [FakeStressAction(manager=None, max_runs=2)
+                   for i in range(3)]
+        stats = [self._bulid_stats_dict() for action in actions]
+        stressaction.execute_cooperatively(actions, stats)
+        self.assertEqual([2, 2, 2], [stat['runs'] for stat in stats])
+        self.assertTrue(all(action.run_called for action in actions))
+
+    def testStressCooperativeStopOnError(self):
+        actions = [FakeStressActionFailing(manager=None, max_runs=5,
+                                           stop_on_error=True),
+                   FakeStressAction(manager=None)]
+        stats = [self._bulid_stats_dict() for action in actions]
+        exc = self.assertRaises(SystemExit,
+                                stressaction.execute_cooperatively,
+                                actions, stats)
+        self.assertEqual(1, exc.code)
+        self.assertEqual(2, stats[0]['fails'])
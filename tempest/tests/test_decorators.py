@@ -18,6 +18,7 @@ from oslo.config import cfg
 from oslotest import mockpatch
 import testtools
 
+from tempest.common import discovery_cache
 from tempest import config
 from tempest import exceptions
 from tempest import test
@@ -256,6 +257,62 @@ class TestRequiresExtDecorator(BaseDecoratorsTest):
                           service='bad_service')
 
 
+class TestSkipUnsupportedClass(BaseDecoratorsTest):
+    def setUp(self):
+        super(TestSkipUnsupportedClass, self).setUp()
+        cfg.CONF.set_default('api_extensions', ['enabled_ext', 'another_ext'],
+                             'compute-feature-enabled')
+        self.capabilities = discovery_cache.Capabilities(
+            ['compute'], {'compute': {'extensions': ['enabled_ext']}})
+        self.useFixture(mockpatch.Patch(
+            'tempest.common.discovery_cache.get_capabilities',
+            return_value=self.capabilities))
+
+    def _setup_class(self, **decorators):
+        class TestFoo(test.BaseTestCase):
+            resource_setup = mock.Mock()
+
+            @test.services(*decorators.get('services', ['compute']))
+            def test_bar(self):
+                return 0
+
+            @test.requires_ext(extension=decorators.get('extension',
+                                                        'enabled_ext'),
+                               service='compute')
+            def test_baz(self):
+                return 0
+
+        self.addCleanup(TestFoo.tearDownClass)
+        TestFoo.setUpClass()
+        return TestFoo
+
+    def test_supported_class_is_set_up(self):
+        test_class = self._setup_class()
+        test_class.resource_setup.assert_called_once_with()
+
+    def test_class_is_set_up_if_some_tests_can_run(self):
+        test_class = self._setup_class(services=['volume'])
+        test_class.resource_setup.assert_called_once_with()
+
+    def test_unsupported_class_is_skipped_before_setup(self):
+        self.assertRaises(testtools.TestCase.skipException,
+                          self._setup_class, services=['volume'],
+                          extension='another_ext')
+
+    def test_discovered_extensions(self):
+        self.assertTrue(test.is_extension_enabled('enabled_ext', 'compute'))
+        # enabled in the configuration but not discovered
+        self.assertFalse(test.is_extension_enabled('another_ext', 'compute'))
+        # not discovered for the service, the configuration (all) decides
+        self.assertTrue(test.is_extension_enabled('random_ext', 'volume'))
+
+    def test_discovered_services(self):
+        service_list = test.get_service_list()
+        self.assertTrue(service_list['compute'])
+        self.assertFalse(service_list['volume'])
+        self.assertTrue(service_list['network'])
+
+
 class TestSimpleNegativeDecorator(BaseDecoratorsTest):
     @test.SimpleNegativeAutoTest
     class FakeNegativeJSONTest(test.NegativeAutoTest):
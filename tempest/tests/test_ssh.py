@@ -77,6 +77,21 @@ class TestSshClient(base.TestCase):
         self.assertEqual(expected_connect, client_mock.connect.mock_calls)
         self.assertEqual(0, s_mock.call_count)
 
+    def test_keep_connection(self):
+        client = ssh.Client('localhost', 'root', keep_connection=True)
+        connection = mock.MagicMock()
+        connection.get_transport.return_value.is_active.return_value = True
+        with mock.patch.object(client, '_get_ssh_connection',
+                               return_value=connection) as get_connection:
+            self.assertIs(connection, client._get_command_connection())
+            self.assertIs(connection, client._get_command_connection())
+            self.assertEqual(1, get_connection.call_count)
+            connection.get_transport.return_value.is_active.return_value = (
+                False)
+            client._get_command_connection()
+            self.assertEqual(2, get_connection.call_count)
+            connection.close.assert_called_once_with()
+
     def test_get_ssh_connection_two_attemps(self):
         c_mock, aa_mock, client_mock = self._set_ssh_connection_mocks()
 
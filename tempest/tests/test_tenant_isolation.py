@@ -12,9 +12,13 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import shutil
+import tempfile
+
 import mock
 from oslo.config import cfg
 
+from tempest.common import cidr_allocator
 from tempest.common import http
 from tempest.common import isolated_creds
 from tempest import config
@@ -41,6 +45,19 @@ class TestTenantIsolation(base.TestCase):
                        fake_identity._fake_v2_response)
         cfg.CONF.set_default('operator_role', 'FakeRole',
                              group='object-storage')
+        self.useFixture(mockpatch.PatchObject(isolated_creds, '_role_ids',
+                                              {}))
+        self.useFixture(mockpatch.PatchObject(cidr_allocator,
+                                              '_allocator', None))
+        lock_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, lock_path)
+        # NOTE: the loaded configuration keeps the lock_path of the test
+        # which loaded it, a default set now would not be seen
+        self.useFixture(mockpatch.PatchObject(config.CONF, 'lock_path',
+                                              lock_path))
+        self.useFixture(mockpatch.PatchObject(
+            isolated_creds.IsolatedCreds, '_list_subnet_cidrs',
+            return_value=[]))
 
     def test_tempest_client(self):
         iso_creds = isolated_creds.IsolatedCreds('test class')
@@ -163,6 +180,55 @@ class TestTenantIsolation(base.TestCase):
         self.assertEqual(admin_creds.tenant_id, '1234')
         self.assertEqual(admin_creds.user_id, '1234')
 
+    @mock.patch('tempest.common.rest_client.RestClient')
+    def test_role_ids_are_cached(self, MockRestClient):
+        cfg.CONF.set_default('neutron', False, 'service_available')
+        self._mock_assign_user_role()
+        roles_fix = self._mock_list_role()
+        self._mock_tenant_create('1234', 'fake_prim_tenant')
+        self._mock_user_create('1234', 'fake_prim_user')
+        for name in ('first class', 'second class'):
+            iso_creds = isolated_creds.IsolatedCreds(name,
+                                                     password='fake_password')
+            iso_creds.get_primary_creds()
+            iso_creds.get_alt_creds()
+        roles_fix.mock.assert_called_once_with()
+
+    @mock.patch('tempest.common.rest_client.RestClient')
+    def test_unknown_role_refreshes_the_cache(self, MockRestClient):
+        cfg.CONF.set_default('neutron', False, 'service_available')
+        iso_creds = isolated_creds.IsolatedCreds('test class',
+                                                 password='fake_password')
+        self._mock_assign_user_role()
+        self._mock_list_role()
+        self._mock_tenant_create('1234', 'fake_prim_tenant')
+        self._mock_user_create('1234', 'fake_prim_user')
+        iso_creds.get_primary_creds()
+        roles_fix = self._mock_list_roles('1234', 'admin')
+        with mock.patch.object(json_iden_client.IdentityClientJSON,
+                               'assign_user_role') as user_mock:
+            iso_creds.get_admin_creds()
+        roles_fix.mock.assert_called_once_with()
+        user_mock.assert_called_with('1234', '1234', '1234')
+        self.assertRaises(exceptions.NotFound, iso_creds._get_role_id,
+                          'missing')
+
+    @mock.patch('tempest.common.rest_client.RestClient')
+    def test_stale_role_id(self, MockRestClient):
+        iso_creds = isolated_creds.IsolatedCreds('test class',
+                                                 password='fake_password')
+        isolated_creds._role_ids['FakeRole'] = 'stale'
+        self._mock_list_role()
+        with mock.patch.object(json_iden_client.IdentityClientJSON,
+                               'assign_user_role',
+                               side_effect=[exceptions.NotFound(),
+                                            None]) as user_mock:
+            iso_creds._assign_user_role({'id': 't'}, {'id': 'u'},
+                                        'FakeRole')
+        self.assertEqual([mock.call('t', 'u', 'stale'),
+                          mock.call('t', 'u', '1')],
+                         user_mock.call_args_list)
+
     @mock.patch('tempest.common.rest_client.RestClient')
     def test_all_cred_cleanup(self, MockRestClient):
         cfg.CONF.set_default('neutron', False, 'service_available')
@@ -249,6 +315,81 @@ class TestTenantIsolation(base.TestCase):
         self.assertEqual(router['id'], '1234')
         self.assertEqual(router['name'], 'fake_router')
 
+    @mock.patch('tempest.common.rest_client.RestClient')
+    def test_subnet_cidr_in_use(self, MockRestClient):
+        iso_creds = isolated_creds.IsolatedCreds('test class',
+                                                 password='fake_password')
+        overlap = exceptions.BadRequest('overlaps with another subnet')
+        subnet_fix = self._mock_subnet_create(iso_creds, '1234', 'subnet')
+        subnet_fix.mock.side_effect = [
+            overlap, ({'status': 200}, {'subnet': {'id': '1234'}})]
+        iso_creds._create_subnet('subnet', 'tenant', 'network')
+        cidrs = [c[1]['cidr'] for c in subnet_fix.mock.call_args_list]
+        self.assertEqual(2, len(set(cidrs)))
+        # the block found in use is not handed out again
+        subnet_fix.mock.side_effect = None
+        iso_creds._create_subnet('subnet', 'tenant', 'network')
+        self.assertNotIn(subnet_fix.mock.call_args[1]['cidr'], cidrs)
+
+    @mock.patch('tempest.common.rest_client.RestClient')
+    def test_subnet_cidr_released_on_error(self, MockRestClient):
+        iso_creds = isolated_creds.IsolatedCreds('test class',
+                                                 password='fake_password')
+        subnet_fix = self._mock_subnet_create(iso_creds, '1234', 'subnet')
+        subnet_fix.mock.side_effect = exceptions.ServerFault()
+        release = self.patch(
+            'tempest.common.cidr_allocator.CidrAllocator.release')
+        self.assertRaises(exceptions.ServerFault, iso_creds._create_subnet,
+                          'subnet', 'tenant', 'network')
+        release.assert_called_once_with(
+            subnet_fix.mock.call_args[1]['cidr'])
+
+    @mock.patch('tempest.common.rest_client.RestClient')
+    def test_prepare_credentials(self, MockRestClient):
+        cfg.CONF.set_default('neutron', False, 'service_available')
+        iso_creds = isolated_creds.IsolatedCreds('test class',
+                                                 password='fake_password')
+        self._mock_assign_user_role()
+        self._mock_list_roles('1234', 'admin')
+        self._mock_tenant_create('1234', 'fake_tenant')
+        user_fix = self._mock_user_create('1234', 'fake_user')
+        iso_creds.prepare_credentials(['primary', 'admin', 'alt'])
+        self.assertEqual(3, user_fix.mock.call_count)
+        self.assertEqual(set(['primary', 'admin', 'alt']),
+                         set(iso_creds.isolated_creds))
+        iso_creds.prepare_credentials(['primary'])
+        self.assertEqual(3, user_fix.mock.call_count)
+
+    @mock.patch('tempest.common.rest_client.RestClient')
+    def test_network_teardown_order(self, MockRestClient):
+        iso_creds = isolated_creds.IsolatedCreds('test class',
+                                                 password='fake_password')
+        deleted = []
+
+        def _delete(kind):
+            def _record(*args):
+                deleted.append(kind)
+            return _record
+
+        client = iso_creds.network_admin_client
+        for method, kind in (('remove_router_interface_with_subnet_id',
+                              'interface'),
+                             ('delete_router', 'router'),
+                             ('delete_subnet', 'subnet'),
+                             ('delete_network', 'network')):
+            self.useFixture(mockpatch.PatchObject(client, method,
+                                                  side_effect=_delete(kind)))
+        for cred in ('primary', 'alt'):
+            iso_creds.isolated_net_resources[cred] = (
+                {'id': cred + '-net', 'name': cred},
+                {'id': cred + '-subnet', 'name': cred, 'cidr': '10.0.0.0/28'},
+                {'id': cred + '-router', 'name': cred})
+        iso_creds._clear_isolated_net_resources()
+        self.assertEqual(['interface'] * 2, deleted[:2])
+        self.assertEqual(['router', 'router', 'subnet', 'subnet'],
+                         sorted(deleted[2:6]))
+        self.assertEqual(['network'] * 2, deleted[6:])
+
     @mock.patch('tempest.common.rest_client.RestClient')
     def test_network_cleanup(self, MockRestClient):
         def side_effect(**args):
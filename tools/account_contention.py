@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+
+# Copyright 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Contention benchmark of the test accounts allocation
+
+Starts --workers processes taking and giving back accounts among
+--accounts ones for --duration seconds, like the test classes of a
+parallel run do, and prints the allocation throughput and latency.
+--global-lock serializes the allocations and releases on the external
+lock they used to take, for comparison.
+"""
+
+import argparse
+import contextlib
+import hashlib
+import multiprocessing
+import shutil
+import tempfile
+import time
+
+from tempest.common import accounts
+from tempest.openstack.common import lockutils
+
+
+@contextlib.contextmanager
+def _no_lock():
+    yield
+
+
+def _worker(locks_dir, hashes, duration, hold, global_lock, results):
+    def _lock():
+        if global_lock:
+            return lockutils.lock('test_accounts_io', external=True,
+                                  lock_path=locks_dir)
+        return _no_lock()
+
+    account_locks = accounts.AccountLocks(locks_dir)
+    latencies = []
+    retries = 0
+    deadline = time.time() + duration
+    while time.time() < deadline:
+        start = time.time()
+        while True:
+            with _lock():
+                _hash = account_locks.acquire(hashes)
+            if _hash is not None:
+                break
+            retries += 1
+            time.sleep(0.001)
+        latencies.append(time.time() - start)
+        time.sleep(hold)
+        with _lock():
+            account_locks.release(_hash)
+    results.put((latencies, retries))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--workers', type=int, default=200)
+    parser.add_argument('--accounts', type=int, default=250)
+    parser.add_argument('--duration', type=float, default=10,
+                        help="Seconds each worker runs")
+    parser.add_argument('--hold', type=float, default=0.01,
+                        help="Seconds an account is held once taken")
+    parser.add_argument('--global-lock', action='store_true')
+    args = parser.parse_args()
+
+    hashes = [hashlib.md5(str(i)).hexdigest() for i in range(args.accounts)]
+    locks_dir = tempfile.mkdtemp()
+    results = multiprocessing.Queue()
+    worker_args = (locks_dir, hashes, args.duration, args.hold,
+                   args.global_lock, results)
+    workers = [multiprocessing.Process(target=_worker, args=worker_args)
+               for _ in range(args.workers)]
+    try:
+        for worker in workers:
+            worker.start()
+        latencies = []
+        retries = 0
+        for _ in workers:
+            worker_latencies, worker_retries = results.get()
+            latencies.extend(worker_latencies)
+            retries += worker_retries
+        for worker in workers:
+            worker.join()
+    finally:
+        shutil.rmtree(locks_dir)
+
+    latencies.sort()
+    print("%d workers, %d accounts%s" % (
+        args.workers, args.accounts,
+        ", global lock" if args.global_lock else ""))
+    print("allocations: %d (%.0f/s), retries: %d" % (
+        len(latencies), len(latencies) / args.duration, retries))
+    print("latency ms: mean %.2f, p99 %.2f, max %.2f" % (
+        1000 * sum(latencies) / len(latencies),
+        1000 * latencies[int(len(latencies) * 0.99)],
+        1000 * latencies[-1]))
+
+
+if __name__ == "__main__":
+    main()